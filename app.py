@@ -1,17 +1,35 @@
-from flask import Flask, jsonify, request, send_from_directory
-import pandas as pd
-import joblib
-import requests
+from flask import Flask, Response, abort, g, jsonify, request, send_file
+from werkzeug.security import safe_join
 import numpy as np
+import logging
+import time
 from datetime import datetime, timedelta, date
 from flask_cors import CORS
 import os
+from concurrent.futures import ThreadPoolExecutor
 
+from src import data_preprocessing as dp
+from src import forecasting
+from src.forecast_cache import ForecastCache, cache_key
+from src.locations import LOCATIONS_FILE, load_locations
+from src.metrics import REGISTRY
+from src.model_registry import ModelRegistry
+from src.explain import GLOBAL_SAMPLE_ROWS, ExplanationService, ExplanationStore, horizon_response
+from src.snapshots import SNAPSHOT_MAX_AGE, SnapshotRefresher, SnapshotStore, iso
+from src.responses import (REVALIDATE, cache_control, content_type, etag_for, gzip_json, http_date, is_api_path,
+                           not_modified, precompressed_variant)
+from src.spatial import IDW_MIN_NEIGHBORS, SpatialIndex, blend, grid_neighbors, idw_weights, same_shape, snap
+from src.aggregation import GRANULARITIES, history as aggregate_history
+from src.upstream import HedgedFetcher, open_meteo_hourly_provider, open_meteo_provider, openaq_provider
 
 
 app = Flask(__name__, static_folder='build', static_url_path='')
 CORS(app)
 
+# Per-phase latency of a forecast: upstream fetch, feature building, model predict
+PHASE_METRIC = "aqi_forecast_phase_seconds"
+PHASE_HELP = "Forecast latency by phase"
+
 
 
 
@@ -19,77 +37,121 @@ CORS(app)
 # ----------------------------- #
 # Load trained AQI prediction model
 # ----------------------------- #
-MODEL_PATH = os.path.join(os.path.dirname(__file__), "aqi_feature_store", "rf_aqi_model.pkl")
+MODEL_PATH = os.environ.get(
+    "AQI_MODEL_PATH", os.path.join(os.path.dirname(__file__), "aqi_feature_store", "rf_aqi_model.pkl")
+)
+
+# Loaded on first prediction and hot-reloaded when the file changes
+model_registry = ModelRegistry(
+    MODEL_PATH,
+    check_interval=float(os.environ.get("MODEL_RELOAD_INTERVAL", 5)),
+    compiled=os.environ.get("AQI_MODEL_COMPILED", "0") == "1",
+)
+
+
+# The pipeline writes these relative to the repo root; anchor them to it (absolute env overrides are
+# kept as given) so the app finds its model and features whatever directory it is started from
+FORECASTER_PATH = os.path.join(os.path.dirname(__file__), forecasting.FORECASTER_PATH)
+PROCESSED_STORE = os.path.join(os.path.dirname(__file__), dp.PROCESSED_STORE)
+
+# Multi-horizon forecaster trained by src/forecasting.py; /forecast falls back to the
+# trend model below when it is missing or the location has no fresh stored features
+forecaster_registry = ModelRegistry(
+    FORECASTER_PATH,
+    check_interval=float(os.environ.get("MODEL_RELOAD_INTERVAL", 5)),
+    compiled=os.environ.get("AQI_MODEL_COMPILED", "0") == "1",
+)
+_forecaster_meta = {"version": None, "meta": None}
+
+
+def forecaster_meta():
+    """Feature list and horizons of the current forecaster, re-read when the model file changes."""
+    if not os.path.exists(forecaster_registry.path):
+        return None
+    version = forecaster_registry.version
+    if _forecaster_meta["version"] != version:
+        _forecaster_meta.update(version=version, meta=forecasting.load_meta(forecaster_registry.path))
+    return _forecaster_meta["meta"]
+
+
+try:
+    LOCATIONS = load_locations(os.path.join(os.path.dirname(__file__), LOCATIONS_FILE))
+except (OSError, ValueError) as e:
+    logging.warning(f"❌ Locations not loaded, serving without configured locations: {e}")
+    LOCATIONS = []
+
+
+def configured_location(location_id):
+    return next((loc for loc in LOCATIONS if loc["location_id"] == location_id), None)
 
 
-model = joblib.load(MODEL_PATH)
+_spatial = {"locations": None, "index": None}
+
+
+def locate(lat, lon, location_id=None):
+    """Forecast tile for a request: the nearest configured location within range, else a grid cell (src/spatial.py)."""
+    if _spatial["locations"] is not LOCATIONS:
+        _spatial.update(locations=LOCATIONS, index=SpatialIndex(LOCATIONS))
+    return _spatial["index"].locate(lat, lon, location_id)
+
+
+# ----------------------------- #
+# Forecast cache (per rounded lat/lon and hour)
+# ----------------------------- #
+forecast_cache = ForecastCache(
+    maxsize=int(os.environ.get("FORECAST_CACHE_SIZE", 256)),
+    ttl=int(os.environ.get("FORECAST_CACHE_TTL", 3600)),
+)
 
 
 # ----------------------------- #
 # Fetch past 7 days pollutant data
 # ----------------------------- #
+upstream = HedgedFetcher(
+    [
+        open_meteo_provider(timeout=float(os.environ.get("OPEN_METEO_TIMEOUT", 10))),
+        openaq_provider(timeout=float(os.environ.get("OPENAQ_TIMEOUT", 10))),
+    ],
+    hedge_after=float(os.environ.get("UPSTREAM_HEDGE_AFTER", 1.5)),
+)
+# Raw hourly series for /history (OpenAQ has no hourly history to hedge with)
+history_upstream = HedgedFetcher(
+    [open_meteo_hourly_provider(timeout=float(os.environ.get("OPEN_METEO_TIMEOUT", 10)))],
+    session=upstream.session,
+)
+
+
 def fetch_past_7_days_air_quality(lat=24.8607, lon=67.0011):
     end_date = date.today()
     start_date = end_date - timedelta(days=7)
-    
-    try:
-        url = (
-            f"https://air-quality-api.open-meteo.com/v1/air-quality?"
-            f"latitude={lat}&longitude={lon}"
-            f"&start_date={start_date}&end_date={end_date}"
-            "&hourly=pm10,pm2_5,carbon_monoxide,nitrogen_dioxide,sulphur_dioxide,ozone"
-        )
-        resp = requests.get(url, timeout=10)
-        if resp.status_code == 200:
-            data = resp.json()
-            hourly_data = {key: data["hourly"].get(key, [0]) for key in ["pm10","pm2_5","carbon_monoxide","nitrogen_dioxide","sulphur_dioxide","ozone"]}
-            daily_averages = {key: [] for key in hourly_data.keys()}
-            for i in range(7):
-                for key, values in hourly_data.items():
-                    start_idx = i*24
-                    end_idx = start_idx + 24
-                    day_values = values[start_idx:end_idx] if len(values) >= end_idx else values[start_idx:]
-                    daily_averages[key].append(round(float(np.mean(day_values)), 2) if day_values else 0)
-            return daily_averages
-    except Exception as e:
-        print("Open-Meteo error:", e)
-
-    # Backup: OpenAQ API
-    try:
-        url = (
-            f"https://api.openaq.org/v3/measurements?"
-            f"coordinates={lat},{lon}&radius=10000&limit=1000"
-            f"&date_from={start_date}&date_to={end_date}"
-        )
-        response = requests.get(url, timeout=10)
-        if response.status_code == 200:
-            data = response.json()
-            records = []
-            for rec in data.get("results", []):
-                if rec.get("parameter") in ["pm10","pm25","co","no2","so2","o3"]:
-                    records.append({"parameter": rec.get("parameter"), "value": rec.get("value")})
-            if records:
-                df = pd.DataFrame(records)
-                daily_averages = {}
-                mapping = {"pm10":"pm10","pm25":"pm2_5","co":"carbon_monoxide","no2":"nitrogen_dioxide","so2":"sulphur_dioxide","o3":"ozone"}
-                for key, mapped in mapping.items():
-                    daily_averages[mapped] = [round(float(df[df["parameter"]==key]["value"].mean()), 2)]*7
-                return daily_averages
-    except Exception as e:
-        print("OpenAQ backup error:", e)
-
-    # Fallback: zeros
-    print("❌ Failed to fetch past pollutant data.")
+
+    # Open-Meteo first, OpenAQ as hedged backup
+    daily_averages = upstream.fetch(lat, lon, start_date, end_date)
+    if daily_averages is None:
+        # Raised rather than returned so the zero fallback is never cached or snapshotted
+        raise LookupError("Upstream pollutant history unavailable")
+    return daily_averages
+
+
+def zero_history():
+    """Fallback history when every upstream failed."""
+    logging.warning("❌ Failed to fetch past pollutant data.")
+    REGISTRY.inc("aqi_upstream_fallback_total", help_text="Forecasts served from the zero fallback")
     return {k:[0]*7 for k in ["pm10","pm2_5","carbon_monoxide","nitrogen_dioxide","sulphur_dioxide","ozone"]}
 
 # ----------------------------- #
 # Predict AQI for next 3 days using trend + dust awareness
 # ----------------------------- #
-def predict_future_aqi(daily_averages):
-    pollutants = ["pm10","pm2_5","carbon_monoxide","nitrogen_dioxide","sulphur_dioxide","ozone"]
+POLLUTANTS = ["pm10","pm2_5","carbon_monoxide","nitrogen_dioxide","sulphur_dioxide","ozone"]
+FORECAST_DAYS = 3
+N_MODEL_FEATURES = 15
+
+
+def build_forecast_features(daily_averages):
+    """Returns the (FORECAST_DAYS x 15) model input, the last day's averages and the Day 1 dust factor."""
     trend = {}
     last_day_avg = {}
-    for p in pollutants:
+    for p in POLLUTANTS:
         trend[p] = daily_averages[p][-1] - daily_averages[p][-2] if len(daily_averages[p])>=2 else 0
         last_day_avg[p] = daily_averages[p][-1]
 
@@ -104,15 +166,18 @@ def predict_future_aqi(daily_averages):
     elif pm25 > 35 or pm10 > 70:
         dust_factor = 1.1
 
-    print(f"🌫️ PM2.5={pm25}, PM10={pm10}, Day 1 Dust factor={dust_factor}")
+    logging.debug(f"🌫️ PM2.5={pm25}, PM10={pm10}, Day 1 Dust factor={dust_factor}")
 
-    predictions = []
-    for i in range(1, 4):
-        future_features = np.array([last_day_avg[p] + trend[p]*i for p in pollutants])
-        padded_features = np.pad(future_features, (0, 15 - len(future_features)), 'constant').reshape(1, -1)
+    steps = np.arange(1, FORECAST_DAYS + 1)[:, None]
+    future_features = np.array([last_day_avg[p] for p in POLLUTANTS]) + np.array([trend[p] for p in POLLUTANTS]) * steps
+    padded_features = np.zeros((FORECAST_DAYS, N_MODEL_FEATURES))
+    padded_features[:, :len(POLLUTANTS)] = future_features
+    return padded_features, last_day_avg, dust_factor
 
-        predicted_aqi = model.predict(padded_features)[0]
 
+def format_predictions(raw_predictions, last_day_avg, dust_factor):
+    predictions = []
+    for i, predicted_aqi in enumerate(raw_predictions, start=1):
         # Apply dust factor only for Day 1
         if i == 1:
             predicted_aqi = round(float(predicted_aqi * dust_factor), 2)
@@ -122,47 +187,653 @@ def predict_future_aqi(daily_averages):
         date_str = (datetime.now() + timedelta(days=i)).strftime("%Y-%m-%d")
         predictions.append({"date":date_str, "day":f"Day {i}", "predicted_AQI":predicted_aqi})
 
-    current_pollutants = {p: round(float(last_day_avg[p]),2) for p in pollutants}
+    current_pollutants = {p: round(float(last_day_avg[p]),2) for p in POLLUTANTS}
     return current_pollutants, predictions
 
+
+def predict_future_aqi(daily_averages):
+    with REGISTRY.time(PHASE_METRIC, PHASE_HELP, phase="features"):
+        features, last_day_avg, dust_factor = build_forecast_features(daily_averages)
+    with REGISTRY.time(PHASE_METRIC, PHASE_HELP, phase="predict"):
+        raw = model_registry.predict(features)
+    return format_predictions(raw, last_day_avg, dust_factor)
+
+
+def predict_multi_horizon(location_id):
+    """
+    Forecast from the location's stored features: one predict call covering
+    every hourly horizon. Returns (daily_averages, current_pollutants,
+    predictions, extra), or None when the engine can't serve this location.
+    """
+    meta = forecaster_meta()
+    if location_id is None or meta is None:
+        return None
+    with REGISTRY.time(PHASE_METRIC, PHASE_HELP, phase="features"):
+        # Stored times are the location's local wall clock, not the server's
+        now = forecasting.local_now(configured_location(location_id))
+        latest = forecasting.latest_features(location_id, meta["features"], now=now, store_dir=PROCESSED_STORE)
+        history = None if latest is None else forecasting.daily_history(location_id, now=now, store_dir=PROCESSED_STORE)
+    if history is None:
+        return None
+    feature_row, issued_at = latest
+    feature_row = forecasting.scale_features(meta, feature_row)
+    if feature_row is None:
+        return None
+    with REGISTRY.time(PHASE_METRIC, PHASE_HELP, phase="predict"):
+        hourly = forecasting.forecast_hours(forecaster_registry.predict, meta, feature_row, issued_at)
+    current_pollutants = {p: history[p][-1] for p in POLLUTANTS}
+    extra = {"engine": "multi_horizon", "issued_at": issued_at.isoformat(), "hourly_predictions": hourly}
+    return history, current_pollutants, forecasting.daily_from_hourly(hourly), extra
+
+
+def predict_future_aqi_batch(histories):
+    """Scores N histories with a single model.predict call on an (N*3)x15 matrix."""
+    if not histories:
+        return []
+    with REGISTRY.time(PHASE_METRIC, PHASE_HELP, phase="features"):
+        built = [build_forecast_features(h) for h in histories]
+    with REGISTRY.time(PHASE_METRIC, PHASE_HELP, phase="predict"):
+        raw = model_registry.predict(np.vstack([features for features, _, _ in built]))
+    return [
+        format_predictions(raw[i*FORECAST_DAYS:(i+1)*FORECAST_DAYS], last_day_avg, dust_factor)
+        for i, (_, last_day_avg, dust_factor) in enumerate(built)
+    ]
+
 # ----------------------------- #
 # Main Forecast Endpoint (returns current + past + predictions)
 # ----------------------------- #
 
+def static_file_response(relative_path):
+    """A file from build/, precompressed when the client accepts it; hashed assets are cached as immutable."""
+    full_path = safe_join(app.static_folder, relative_path)
+    if full_path is None or not os.path.isfile(full_path):
+        abort(404)
+    path, encoding = precompressed_variant(full_path, request.headers.get("Accept-Encoding"))
+    response = send_file(path, mimetype=content_type(full_path), conditional=True, etag=True)
+    if encoding is not None:
+        response.headers["Content-Encoding"] = encoding
+    response.vary.add("Accept-Encoding")
+    response.headers["Cache-Control"] = cache_control(relative_path)
+    return response
+
+
+def serve_static(filename):
+    return static_file_response(filename)
+
+
+# Flask's own static view, replaced so build/ goes through static_file_response
+app.view_functions["static"] = serve_static
+
+
 @app.route('/')
 def serve_react_app():
-    return send_from_directory(app.static_folder, 'index.html')
+    return static_file_response('index.html')
 
 # for any other path (like /dashboard, /about, etc.)
 @app.errorhandler(404)
 def not_found(e):
-    return send_from_directory(app.static_folder, 'index.html')
+    # Unknown API routes and missing files (/static/js/old.js) are real 404s, not the React app
+    if is_api_path(request.path):
+        return jsonify({"error": "Not found"}), 404
+    if os.path.splitext(request.path)[1]:
+        return "Not found", 404
+    return static_file_response('index.html')
 
 
 
-@app.route("/forecast", methods=["GET"])
-def forecast():
-    city = request.args.get("city","Karachi")
-    lat = float(request.args.get("lat",24.8607))
-    lon = float(request.args.get("lon",67.0011))
+LEGACY = {"engine": "legacy"}
 
-    daily_averages = fetch_past_7_days_air_quality(lat, lon)
-    current_pollutants, predictions = predict_future_aqi(daily_averages)
 
-    return jsonify({
+def forecast_response(city, daily_averages, current_pollutants, predictions, extra=LEGACY):
+    response = {
         "city": city,
         "pollutants": current_pollutants,
         "pollutants_history": daily_averages,
         "predictions": predictions,
         "note": "Day 1 prediction adjusted for realistic dust conditions"
-    })
+    }
+    if extra.get("engine") == "multi_horizon":
+        response["note"] = "Hourly multi-horizon forecast from stored features; daily values are means"
+    elif extra.get("engine") == "interpolated":
+        response["note"] = "Interpolated from forecasts of neighbouring grid tiles"
+    response.update(extra)
+    return response
+
+
+def forecast_tile(args):
+    """(city, Tile) from /forecast query args (Flask or Starlette)."""
+    lat = float(args.get("lat",24.8607))
+    lon = float(args.get("lon",67.0011))
+    return args.get("city","Karachi"), locate(lat, lon, args.get("location_id"))
+
+
+def forecast_query(args):
+    """(city, lat, lon, location_id) of the tile serving the request: forecasts are computed and cached per tile."""
+    city, tile = forecast_tile(args)
+    return city, tile.lat, tile.lon, tile.location_id
+
+
+def interpolated_forecast(tile):
+    """
+    Forecast for a grid tile that is not cached yet, blended by inverse
+    distance (to the requested point) from cached neighbouring tiles. None
+    unless at least IDW_MIN_NEIGHBORS neighbours are cached; interpolations
+    are never cached themselves, so they are always built from computed tiles.
+    """
+    if not IDW_MIN_NEIGHBORS or tile.location_id is not None:
+        return None
+    if forecast_cache.peek(cache_key(tile.lat, tile.lon) + (None,)) is not None:
+        return None
+    hits = []
+    for lat, lon in grid_neighbors(tile.lat, tile.lon):
+        result = forecast_cache.peek(cache_key(lat, lon) + (None,))
+        if result is None or result[3].get("engine") != "legacy":
+            continue
+        if hits and not same_shape(result[:3], hits[0][1][:3]):
+            continue
+        hits.append(((lat, lon), result))
+    if len(hits) < IDW_MIN_NEIGHBORS:
+        return None
+    weights = idw_weights(tile.point, [center for center, _ in hits])
+    blended = [blend([result[i] for _, result in hits], weights) for i in range(3)]
+    REGISTRY.inc("aqi_forecast_interpolated_total", help_text="Forecasts interpolated from neighbouring tiles")
+    extra = {"engine": "interpolated", "interpolated_from": [{"lat": lat, "lon": lon} for (lat, lon), _ in hits]}
+    return (*blended, extra)
+
+
+def compute_forecast(lat, lon, location_id=None):
+    """(daily_averages, current_pollutants, predictions, extra) computed live for one location."""
+    engine = predict_multi_horizon(location_id)
+    if engine is not None:
+        return engine
+    with REGISTRY.time(PHASE_METRIC, PHASE_HELP, phase="upstream"):
+        daily_averages = fetch_past_7_days_air_quality(lat, lon)
+    current_pollutants, predictions = predict_future_aqi(daily_averages)
+    return daily_averages, current_pollutants, predictions, LEGACY
+
+
+def fallback_forecast():
+    """The zero-history forecast served, uncached, when every upstream failed."""
+    daily_averages = zero_history()
+    current_pollutants, predictions = predict_future_aqi(daily_averages)
+    return daily_averages, current_pollutants, predictions, {**LEGACY, "fallback": True}
+
+
+def cached_forecast(lat, lon, location_id=None):
+    """The cached or freshly computed forecast for a tile, or the uncached fallback."""
+    try:
+        return forecast_cache.get_or_compute(
+            cache_key(lat, lon) + (location_id,), lambda: compute_forecast(lat, lon, location_id)
+        )
+    except LookupError:
+        return fallback_forecast()
+
 
 # ----------------------------- #
-# Run Flask App
+# Forecast snapshots for configured locations, refreshed off the request path
+# ----------------------------- #
+# Anchored to the app, not the CWD; the SQLite file is only opened on first use
+snapshot_store = SnapshotStore(os.environ.get(
+    "AQI_SNAPSHOT_STORE", os.path.join(os.path.dirname(__file__), "data", "online", "snapshots.db")
+))
+snapshot_refresher = SnapshotRefresher(
+    lambda loc: list(compute_forecast(loc["lat"], loc["lon"], loc["location_id"])), LOCATIONS, snapshot_store,
+    after_refresh=lambda results: refresh_explanations(results),
+)
+# Enable in one process per host (or run `python app.py --refresh-only` alongside); the store is shared
+if os.environ.get("SNAPSHOT_REFRESH", "0") == "1":
+    snapshot_refresher.start()
+
+
+def snapshot_response(city, location_id):
+    """The /forecast body from the location's snapshot, with its as_of time, or None if there is no fresh one."""
+    if location_id is None:
+        return None
+    snapshot = snapshot_store.get(location_id)
+    return snapshot_body(city, snapshot) if snapshot is not None else None
+
+
+def snapshot_body(city, snapshot):
+    as_of, payload = snapshot
+    REGISTRY.inc("aqi_forecast_snapshot_hits_total", help_text="Forecasts served from a precomputed snapshot")
+    return {**forecast_response(city, *payload), "as_of": iso(as_of)}
+
+
+# ----------------------------- #
+# Conditional and compact /forecast responses
+# ----------------------------- #
+# ?compact=1 drops pollutants_history; FORECAST_COMPACT=1 makes that the default (?history=1 to get it back)
+FORECAST_COMPACT = os.environ.get("FORECAST_COMPACT", "0") == "1"
+
+
+def compact_requested(args):
+    if args.get("history") == "1":
+        return False
+    return args.get("compact", "1" if FORECAST_COMPACT else "0") == "1"
+
+
+def compact_body(body, compact):
+    return {k: v for k, v in body.items() if k != "pollutants_history"} if compact else body
+
+
+def forecast_snapshot(tile):
+    """The fresh snapshot serving this tile, or None (only configured locations have snapshots)."""
+    return snapshot_store.get(tile.location_id) if tile.location_id is not None else None
+
+
+def forecast_validators(etag, as_of=None):
+    """
+    Response headers for a /forecast body. Snapshot bodies are keyed on the
+    snapshot's as_of and carry Last-Modified, so they revalidate before anything
+    is computed. Live and interpolated bodies can change within the cache hour
+    (short TTLs, newly cached neighbour tiles), so their ETag hashes the body.
+    """
+    headers = {"ETag": f'W/"{etag}"', "Cache-Control": REVALIDATE}
+    if as_of is not None:
+        headers["Last-Modified"] = http_date(as_of)
+    return headers
+
+
+def is_not_modified(headers, etag, as_of=None):
+    if_modified_since = headers.get("If-Modified-Since") if as_of is not None else None
+    if not_modified(headers.get("If-None-Match"), if_modified_since, etag, as_of):
+        REGISTRY.inc("aqi_forecast_not_modified_total", help_text="Forecast requests answered with 304")
+        return True
+    return False
+
+
+# ----------------------------- #
+# Forecast explanations (TreeSHAP): precomputed with the snapshots, on demand otherwise
 # ----------------------------- #
+explanations = ExplanationService(ExplanationStore(os.environ.get(
+    "AQI_EXPLAIN_STORE", os.path.join(os.path.dirname(__file__), "data", "online", "explanations.db")
+)))
+EXPLAIN_TOP = 10
+
+
+def forecast_inputs(lat, lon, location_id=None, result=None):
+    """
+    The model inputs behind the forecast /forecast serves for a location, in
+    the form src.explain takes. `result` is that forecast (a snapshot payload),
+    else the cached or freshly computed one; the legacy model's inputs are
+    rebuilt from its history.
+    """
+    if result is None:
+        result = cached_forecast(lat, lon, location_id)
+    meta = forecaster_meta()
+    if result[3].get("engine") == "multi_horizon" and meta is not None:
+        now = forecasting.local_now(configured_location(location_id))
+        latest = forecasting.latest_features(location_id, meta["features"], now=now, store_dir=PROCESSED_STORE)
+        model_x = forecasting.scale_features(meta, latest[0]) if latest is not None else None
+        if model_x is not None:
+            row, issued_at = latest
+            return {"engine": "multi_horizon", "registry": forecaster_registry, "features": meta["features"],
+                    "horizons": meta["horizons"], "x": row, "model_x": model_x, "issued_at": issued_at.isoformat()}
+    features, _, _ = build_forecast_features(result[0])
+    names = getattr(model_registry.model, "feature_names_in_", None)
+    names = list(names) if names is not None else POLLUTANTS + [f"padding_{i}" for i in range(len(POLLUTANTS), N_MODEL_FEATURES)]
+    # One model row per forecast day; explanations are of the raw model output (before the Day 1 dust factor)
+    return {"engine": "legacy", "registry": model_registry, "features": names,
+            "horizons": [24 * d for d in range(1, FORECAST_DAYS + 1)], "x": features, "model_x": features,
+            "issued_at": None}
+
+
+def explain_sample():
+    """Background rows of the configured locations' history for the forecaster's global importances."""
+    meta = forecaster_meta()
+    X = forecasting.feature_sample([loc["location_id"] for loc in LOCATIONS], meta["features"], GLOBAL_SAMPLE_ROWS,
+                                   store_dir=PROCESSED_STORE)
+    scaled = forecasting.scale_features(meta, X) if len(X) else X
+    return scaled if scaled is not None else X[:0]
+
+
+def refresh_explanations(results):
+    """Snapshot refresher hook: explains every freshly refreshed forecast in one batch."""
+    by_id = {loc["location_id"]: loc for loc in LOCATIONS}
+    inputs = {}
+    for location_id, payload in results.items():
+        loc = by_id.get(location_id)
+        if loc is None:
+            continue
+        try:
+            inputs[location_id] = forecast_inputs(loc["lat"], loc["lon"], location_id, result=payload)
+        except (OSError, ValueError) as e:
+            logging.warning(f"❌ [{location_id}] no explainable forecast: {e}")
+    sample = {forecaster_registry.path: explain_sample} if forecaster_meta() is not None else None
+    explanations.refresh(inputs, sample=sample)
+
+
+def explain_query(args):
+    """(city, lat, lon, location_id, horizon, top) from /forecast/explain query args; ValueError carries the 400 message."""
+    try:
+        city, lat, lon, location_id = forecast_query(args)
+        horizon = int(args.get("horizon", 24))
+        top = int(args.get("top", EXPLAIN_TOP))
+    except ValueError:
+        raise ValueError("lat, lon, horizon and top must be numeric")
+    if not 1 <= horizon <= forecasting.MAX_HORIZON or top < 1:
+        raise ValueError(f"horizon must be 1-{forecasting.MAX_HORIZON} and top positive")
+    return city, lat, lon, location_id, horizon, top
+
+
+def stored_explanation(city, location_id, horizon, top=EXPLAIN_TOP):
+    """The /forecast/explain body from the precomputed store, or None unless it is fresh and of the served model."""
+    if location_id is None:
+        return None
+    stored = explanations.store.get(location_id, horizon, max_age=SNAPSHOT_MAX_AGE)
+    if stored is None:
+        return None
+    as_of, expl = stored
+    registry = forecaster_registry if expl["engine"] == "multi_horizon" else model_registry
+    if expl["model_version"] != registry.version:
+        return None
+    return {"city": city, "location_id": location_id, "source": "precomputed", "as_of": iso(as_of),
+            **horizon_response(expl, horizon, top)}
+
+
+def live_explanation(city, lat, lon, location_id, horizon, top=EXPLAIN_TOP, result=None):
+    """The /forecast/explain body computed on demand (LRU-cached, approximate past the latency budget)."""
+    inputs = forecast_inputs(lat, lon, location_id, result)
+    key = (inputs["engine"], location_id, inputs["issued_at"]) + cache_key(lat, lon)
+    expl = explanations.explain(key, inputs)
+    return {"city": city, "location_id": location_id, "source": "on_demand", **horizon_response(expl, horizon, top)}
+
+
+def explain_forecast(city, lat, lon, location_id, horizon, top=EXPLAIN_TOP):
+    return stored_explanation(city, location_id, horizon, top) or live_explanation(city, lat, lon, location_id, horizon, top)
+
+
+def current_global_importance(horizon=None):
+    """Global SHAP importances of the model /forecast serves, or None while they are not computed yet."""
+    registry = forecaster_registry if forecaster_meta() is not None else model_registry
+    try:
+        return explanations.global_importance(registry, horizon)
+    except OSError:
+        return None
+
+
+@app.route("/forecast/explain", methods=["GET"])
+def forecast_explain():
+    """?lat=&lon=|location_id=&horizon=24&top=10: the top SHAP contributions to one horizon of the forecast."""
+    try:
+        query = explain_query(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify(explain_forecast(*query))
+
+
+@app.route("/forecast/explain/global", methods=["GET"])
+def forecast_explain_global():
+    result = current_global_importance(request.args.get("horizon", type=int))
+    if result is None:
+        return jsonify({"error": "Global importances for the current model are not computed yet"}), 503
+    return jsonify(result)
+
+
+@app.route("/feature_importance.json", methods=["GET"])
+def feature_importance():
+    """The dashboard's importance chart: live global importances once computed, else the static file from shap.ipynb."""
+    result = current_global_importance()
+    if result is None:
+        return static_file_response("feature_importance.json")
+    return jsonify(result["importance"])
+
+
+@app.route("/forecast/explain/stats", methods=["GET"])
+def forecast_explain_stats():
+    return jsonify(explanations.stats())
+
+
+@app.route("/forecast", methods=["GET"])
+def forecast():
+    city, tile = forecast_tile(request.args)
+    compact = compact_requested(request.args)
+    snapshot = forecast_snapshot(tile)
+    if snapshot is not None:
+        as_of = snapshot[0]
+        etag = etag_for(city, tile, compact, as_of)
+        if is_not_modified(request.headers, etag, as_of):
+            return Response(status=304, headers=forecast_validators(etag, as_of))
+        return jsonify(compact_body(snapshot_body(city, snapshot), compact)), 200, forecast_validators(etag, as_of)
+
+    lat, lon, location_id = tile.lat, tile.lon, tile.location_id
+    result = interpolated_forecast(tile) or cached_forecast(lat, lon, location_id)
+    body = compact_body(forecast_response(city, *result), compact)
+    etag = etag_for(body)
+    if is_not_modified(request.headers, etag):
+        return Response(status=304, headers=forecast_validators(etag))
+    return jsonify(body), 200, forecast_validators(etag)
+
+BATCH_MAX_LOCATIONS = int(os.environ.get("FORECAST_BATCH_MAX", 100))
+BATCH_FETCH_WORKERS = int(os.environ.get("FORECAST_BATCH_WORKERS", 16))
+
+
+def batch_query(payload):
+    """(cities, tiles) from a /forecast/batch body (Flask or Starlette); ValueError carries the 400 message."""
+    locations = (payload or {}).get("locations") if isinstance(payload, dict) else None
+    if not isinstance(locations, list) or not locations:
+        raise ValueError("Body must contain a non-empty 'locations' list")
+    if len(locations) > BATCH_MAX_LOCATIONS:
+        raise ValueError(f"At most {BATCH_MAX_LOCATIONS} locations per batch")
+    try:
+        parsed = [(loc.get("city", "Karachi"), float(loc["lat"]), float(loc["lon"])) for loc in locations]
+    except (AttributeError, KeyError, TypeError, ValueError):
+        raise ValueError("Each location needs numeric 'lat' and 'lon'")
+    return [city for city, _, _ in parsed], [locate(lat, lon) for _, lat, lon in parsed]
+
+
+def tile_key(tile):
+    return cache_key(tile.lat, tile.lon) + (tile.location_id,)
+
+
+def batch_lookup(cities, tiles):
+    """
+    First half of a batch, taking the same path as /forecast: the body of every
+    location served by a snapshot, an interpolation, the cache or the
+    multi-horizon engine (None elsewhere), plus {key: tile} of the tiles that
+    still need upstream history.
+    """
+    bodies, missing = [], {}
+    for city, tile in zip(cities, tiles):
+        snapshot = forecast_snapshot(tile)
+        if snapshot is not None:
+            bodies.append(snapshot_body(city, snapshot))
+            continue
+        key = tile_key(tile)
+        result = interpolated_forecast(tile) or forecast_cache.get(key)
+        if result is None and tile.location_id is not None and key not in missing:
+            result = predict_multi_horizon(tile.location_id)
+            if result is not None:
+                forecast_cache.set(key, result)
+        if result is None:
+            missing[key] = tile
+        bodies.append(forecast_response(city, *result) if result is not None else None)
+    return bodies, missing
+
+
+def batch_complete(cities, tiles, bodies, missing, histories):
+    """
+    Second half: scores the fetched histories of `missing` (None where every
+    upstream failed) with one predict call, caches the real ones and fills in
+    the remaining bodies.
+    """
+    failed = [history is None for history in histories]
+    histories = [zero_history() if fail else history for fail, history in zip(failed, histories)]
+    computed = {}
+    for key, fail, history, (current_pollutants, predictions) in zip(
+            missing, failed, histories, predict_future_aqi_batch(histories)):
+        computed[key] = (history, current_pollutants, predictions, {**LEGACY, "fallback": True} if fail else LEGACY)
+        if not fail:
+            forecast_cache.set(key, computed[key])
+    return [body if body is not None else forecast_response(city, *computed[tile_key(tile)])
+            for city, tile, body in zip(cities, tiles, bodies)]
+
+
+def batch_history(tile):
+    try:
+        return fetch_past_7_days_air_quality(tile.lat, tile.lon)
+    except LookupError:
+        return None
+
+
+@app.route("/forecast/batch", methods=["POST"])
+def forecast_batch():
+    """
+    Body: {"locations": [{"city": "Karachi", "lat": 24.86, "lon": 67.0}, ...]}
+    Returns {"results": [...]} with one /forecast-shaped entry per location, in order.
+    """
+    try:
+        cities, tiles = batch_query(request.get_json(silent=True))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    bodies, missing = batch_lookup(cities, tiles)
+    histories = []
+    if missing:
+        with REGISTRY.time(PHASE_METRIC, PHASE_HELP, phase="upstream"), \
+                ThreadPoolExecutor(max_workers=min(BATCH_FETCH_WORKERS, len(missing))) as pool:
+            histories = list(pool.map(batch_history, missing.values()))
+    return jsonify({"results": batch_complete(cities, tiles, bodies, missing, histories)})
+
+
+HISTORY_MAX_DAYS = 92   # Open-Meteo air-quality archive limit
+history_cache = ForecastCache(
+    maxsize=int(os.environ.get("HISTORY_CACHE_SIZE", 256)),
+    ttl=int(os.environ.get("FORECAST_CACHE_TTL", 3600)),
+)
+
+
+def history_query(args):
+    """Validated (lat, lon, days, granularity) from /history query args; ValueError carries the 400 message."""
+    try:
+        lat = float(args.get("lat", 24.8607))
+        lon = float(args.get("lon", 67.0011))
+        days = int(args.get("days", 7))
+    except ValueError:
+        raise ValueError("lat, lon and days must be numeric")
+    granularity = args.get("granularity", "daily")
+    if not 1 <= days <= HISTORY_MAX_DAYS or granularity not in GRANULARITIES:
+        raise ValueError(f"days must be 1-{HISTORY_MAX_DAYS} and granularity one of {sorted(GRANULARITIES)}")
+    # History is fetched and cached per grid cell, like forecasts
+    lat, lon = snap(lat, lon)
+    return lat, lon, days, granularity
+
+
+def history_window(days):
+    """(start_date, end_date) of a /history request: `days` calendar days ending today."""
+    end_date = date.today()
+    return end_date - timedelta(days=days - 1), end_date
+
+
+@app.route("/history", methods=["GET"])
+def pollutant_history():
+    """
+    Pollutant history for charts: ?lat=&lon=&days=7|30|90&granularity=daily|6h.
+    Buckets are local calendar days (or 6h blocks) ending today; gaps are null.
+    """
+    try:
+        lat, lon, days, granularity = history_query(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    def compute():
+        start_date, end_date = history_window(days)
+        with REGISTRY.time(PHASE_METRIC, PHASE_HELP, phase="upstream"):
+            hourly = history_upstream.fetch(lat, lon, start_date, end_date)
+        if hourly is None:
+            # Raised rather than returned so the failure is not cached
+            raise LookupError("Upstream history unavailable")
+        return aggregate_history(hourly, POLLUTANTS, start_date, days, granularity)
+
+    try:
+        result = history_cache.get_or_compute(cache_key(lat, lon) + (days, granularity), compute)
+    except LookupError as e:
+        return jsonify({"error": str(e)}), 502
+    return jsonify({"lat": lat, "lon": lon, "days": days, **result})
+
+
+@app.route("/forecast/cache/stats", methods=["GET"])
+def forecast_cache_stats():
+    return jsonify(forecast_cache.stats())
+
+
+@app.route("/forecast/snapshots/stats", methods=["GET"])
+def snapshot_stats():
+    return jsonify({"store": snapshot_store.stats(), "refresher": snapshot_refresher.stats()})
+
+
+@app.route("/model/stats", methods=["GET"])
+def model_stats():
+    return jsonify(model_registry.stats())
+
+
+@app.route("/upstream/stats", methods=["GET"])
+def upstream_stats():
+    return jsonify(upstream.stats())
+
+
+# ----------------------------- #
+# Instrumentation
+# ----------------------------- #
+@app.before_request
+def start_timer():
+    g.request_start = time.perf_counter()
+
+
+@app.after_request
+def record_request(response):
+    start = g.get("request_start")
+    if start is not None:
+        route = request.url_rule.rule if request.url_rule is not None else "unmatched"
+        REGISTRY.observe("aqi_http_request_seconds", time.perf_counter() - start, "HTTP request latency",
+                         route=route, method=request.method, status=response.status_code)
+    return response
+
+
+@app.after_request
+def compress_json(response):
+    """gzip for JSON bodies (forecasts with hourly predictions and history run to several KB)."""
+    if response.mimetype != "application/json" or response.status_code != 200 or response.direct_passthrough \
+            or "Content-Encoding" in response.headers:
+        return response
+    data, encoding = gzip_json(response.get_data(), request.headers.get("Accept-Encoding"))
+    if encoding is not None:
+        response.set_data(data)
+        response.headers["Content-Encoding"] = encoding
+    response.vary.add("Accept-Encoding")
+    return response
+
+
+@app.route("/metrics", methods=["GET"])
+def metrics():
+    return Response(render_metrics(), mimetype="text/plain; version=0.0.4")
+
+
+def render_metrics(fetcher=None):
+    """Prometheus text exposition of request/phase histograms plus cache, model and upstream gauges."""
+    fetcher = fetcher or upstream
+    for name, value in forecast_cache.stats().items():
+        if isinstance(value, (int, float)):
+            REGISTRY.set(f"aqi_forecast_cache_{name}", value, "Forecast cache statistic")
+    model = model_registry.stats()
+    REGISTRY.set("aqi_model_loaded", int(model["loaded"]), "1 once the model has been loaded")
+    REGISTRY.set("aqi_model_reloads", model["reloads"], "Hot reloads since start")
+    if model["rss_mb"] is not None:
+        REGISTRY.set("aqi_process_rss_mb", model["rss_mb"], "Resident set size of this worker")
+    for name, provider in fetcher.stats().items():
+        REGISTRY.set("aqi_upstream_breaker_open", int(provider["breaker"] == "open"),
+                     "1 while the provider's circuit breaker is open", provider=name)
+    return REGISTRY.render()
+
 # ----------------------------- #
 # Run Flask App
 # ----------------------------- #
 if __name__ == "__main__":
-    port = int(os.environ.get("PORT", 8080))  # Railway provides PORT env var
-    app.run(host="0.0.0.0", port=port)
+    import argparse
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--refresh-only", action="store_true", help="only run the snapshot refresher")
+    args = parser.parse_args()
+    if args.refresh_only:
+        snapshot_refresher.run_forever()
+    else:
+        port = int(os.environ.get("PORT", 8080))  # Railway provides PORT env var
+        app.run(host="0.0.0.0", port=port)
@@ -1,2 +1,2 @@
-from .entity import sensor
+from .entity import location
 from .feature_view import karachi_air_features
@@ -1,13 +1,21 @@
-from feast import FeatureStore
+import os
+import sys
 
-store = FeatureStore(repo_path=".")
-df = store.get_online_features(
+import pandas as pd
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+sys.path.append(ROOT)
+from src.online_store import ONLINE_STORE_PATH, OnlineStore
+
+# ✅ Reads the local online store filled by the pipeline (location_id, e.g. "karachi")
+store = OnlineStore(os.path.join(ROOT, ONLINE_STORE_PATH))
+df = pd.DataFrame(store.get_online_features(
+    ["karachi"],
     features=[
         "karachi_air_features:pm10",
         "karachi_air_features:pm2_5",
         "karachi_air_features:aqi",
     ],
-    entity_rows=[{"sensor_id": "KHI_SENSOR_1"}]
-).to_df()
+))
 
 print(df.head())
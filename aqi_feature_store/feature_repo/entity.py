@@ -1,9 +1,9 @@
 from feast import Entity, ValueType
 
-# Define a simple entity for each record (matches the column name sensor_id)
-sensor = Entity(
-    name="sensor_id",             # ✅ same as the join key & column name
-    join_keys=["sensor_id"],      # ✅ this stays the same
-    description="Unique identifier for AQI sensor record",
+# One entity per pipeline location (matches the location_id column and partition of the processed store)
+location = Entity(
+    name="location_id",           # ✅ same as the join key & column name
+    join_keys=["location_id"],
+    description="Location slug from config/locations.json, e.g. karachi",
     value_type=ValueType.STRING
 )
@@ -1,18 +1,18 @@
 from datetime import timedelta
 from feast import FeatureView, Field, FileSource
 from feast.types import Float32
-from entity import sensor  # ✅ use the defined entity
+from entity import location  # ✅ use the defined entity
 
-# ✅ Source file (unscaled 6-month data)
+# ✅ Source: processed Parquet store (partitioned by city/year/month) written by the pipeline
 aqi_source = FileSource(
-    path=r"C:\Users\HP\Desktop\AQI predictor\aqi_feature_store\feature_repo\data\processed_unscaled.parquet",
+    path="../data/processed/store",
     timestamp_field="time"
 )
 
 # ✅ Feature View definition
 karachi_air_features = FeatureView(
     name="karachi_air_features",
-    entities=[sensor],
+    entities=[location],
     ttl=timedelta(days=7),
     schema=[
         Field(name="pm10", dtype=Float32),
@@ -6,9 +6,9 @@ if __name__ == "__main__":
     store = FeatureStore(repo_path=".")
 
     # ✅ Create entity rows that match your Entity definition
-    # sensor_id must be STRING and match the one in your parquet file ("KHI_SENSOR_1")
+    # location_id must be STRING and match a location in config/locations.json (e.g. "karachi")
     entity_df = pd.DataFrame({
-        "sensor_id": ["KHI_SENSOR_1"]
+        "location_id": ["karachi"]
     })
 
     # ✅ Retrieve features from the online store
@@ -0,0 +1,305 @@
+"""
+Async (ASGI) serving mode for the forecast API.
+
+Same /forecast, /forecast/batch and /history logic and response schema as app.py, but upstream
+HTTP goes through a non-blocking httpx client, so a slow provider ties up a
+socket instead of a worker thread. Model predictions and feature-store reads
+stay synchronous and run on a small bounded thread pool.
+
+    pip install -r requirements-asgi.txt
+    uvicorn asgi:app --host 0.0.0.0 --port 8080
+"""
+import asyncio
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from datetime import date, timedelta
+from functools import partial
+
+from starlette.applications import Starlette
+from starlette.middleware import Middleware
+from starlette.datastructures import Headers
+from starlette.middleware.cors import CORSMiddleware
+from starlette.middleware.gzip import GZipMiddleware
+from starlette.responses import FileResponse, JSONResponse, PlainTextResponse, Response
+from starlette.routing import Mount, Route
+from starlette.staticfiles import NotModifiedResponse, StaticFiles
+
+import app as flask_app
+from src.forecast_cache import cache_key
+from src.metrics import REGISTRY
+from src.responses import (MIN_COMPRESS_BYTES, REVALIDATE, cache_control, content_type, etag_for, is_api_path,
+                           precompressed_variant)
+from src.upstream import AsyncHedgedFetcher, open_meteo_hourly_provider, open_meteo_provider, openaq_provider
+
+BUILD_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "build")
+PHASE_METRIC, PHASE_HELP = flask_app.PHASE_METRIC, flask_app.PHASE_HELP
+
+# predict() and feature-store reads are CPU/disk bound; a few threads keep them off the event loop
+PREDICT_WORKERS = int(os.environ.get("ASGI_PREDICT_WORKERS", min(4, os.cpu_count() or 1)))
+UPSTREAM_CONNECTIONS = int(os.environ.get("ASGI_UPSTREAM_CONNECTIONS", 1000))
+
+predict_pool = ThreadPoolExecutor(max_workers=PREDICT_WORKERS, thread_name_prefix="predict")
+
+upstream = AsyncHedgedFetcher(
+    [
+        open_meteo_provider(timeout=float(os.environ.get("OPEN_METEO_TIMEOUT", 10))),
+        openaq_provider(timeout=float(os.environ.get("OPENAQ_TIMEOUT", 10))),
+    ],
+    hedge_after=float(os.environ.get("UPSTREAM_HEDGE_AFTER", 1.5)),
+    max_connections=UPSTREAM_CONNECTIONS,
+)
+history_upstream = AsyncHedgedFetcher(
+    [open_meteo_hourly_provider(timeout=float(os.environ.get("OPEN_METEO_TIMEOUT", 10)))],
+    max_connections=UPSTREAM_CONNECTIONS,
+)
+
+
+async def run_blocking(fn, *args):
+    return await asyncio.get_running_loop().run_in_executor(predict_pool, partial(fn, *args))
+
+
+async def fetch_past_7_days_air_quality(lat, lon):
+    end_date = date.today()
+    daily_averages = await upstream.fetch(lat, lon, end_date - timedelta(days=7), end_date)
+    if daily_averages is None:
+        raise LookupError("Upstream pollutant history unavailable")
+    return daily_averages
+
+
+# ----------------------------- #
+# Routes
+# ----------------------------- #
+async def forecast_result(lat, lon, location_id):
+    """(daily_averages, current_pollutants, predictions, extra) through the shared forecast cache, or the uncached fallback."""
+    async def compute():
+        engine = await run_blocking(flask_app.predict_multi_horizon, location_id)
+        if engine is not None:
+            return engine
+        with REGISTRY.time(PHASE_METRIC, PHASE_HELP, phase="upstream"):
+            daily_averages = await fetch_past_7_days_air_quality(lat, lon)
+        current_pollutants, predictions = await run_blocking(flask_app.predict_future_aqi, daily_averages)
+        return daily_averages, current_pollutants, predictions, flask_app.LEGACY
+
+    key = cache_key(lat, lon) + (location_id,)
+    try:
+        return await flask_app.forecast_cache.get_or_compute_async(key, compute)
+    except LookupError:
+        return await run_blocking(flask_app.fallback_forecast)
+
+
+async def forecast(request):
+    city, tile = flask_app.forecast_tile(request.query_params)
+    compact = flask_app.compact_requested(request.query_params)
+    snapshot = await run_blocking(flask_app.forecast_snapshot, tile)
+    if snapshot is not None:
+        as_of = snapshot[0]
+        etag = etag_for(city, tile, compact, as_of)
+        if flask_app.is_not_modified(request.headers, etag, as_of):
+            return Response(status_code=304, headers=flask_app.forecast_validators(etag, as_of))
+        body = flask_app.compact_body(flask_app.snapshot_body(city, snapshot), compact)
+        return JSONResponse(body, headers=flask_app.forecast_validators(etag, as_of))
+
+    result = await run_blocking(flask_app.interpolated_forecast, tile)
+    if result is None:
+        result = await forecast_result(tile.lat, tile.lon, tile.location_id)
+    body = flask_app.compact_body(flask_app.forecast_response(city, *result), compact)
+    etag = etag_for(body)
+    if flask_app.is_not_modified(request.headers, etag):
+        return Response(status_code=304, headers=flask_app.forecast_validators(etag))
+    return JSONResponse(body, headers=flask_app.forecast_validators(etag))
+
+
+async def batch_history(tile):
+    try:
+        return await fetch_past_7_days_air_quality(tile.lat, tile.lon)
+    except LookupError:
+        return None
+
+
+async def forecast_batch(request):
+    """Same body, path and single predict call as app.py's /forecast/batch; the upstream fetches run concurrently."""
+    try:
+        payload = await request.json()
+    except ValueError:
+        payload = None
+    try:
+        cities, tiles = flask_app.batch_query(payload)
+    except ValueError as e:
+        return JSONResponse({"error": str(e)}, status_code=400)
+    bodies, missing = await run_blocking(flask_app.batch_lookup, cities, tiles)
+    histories = []
+    if missing:
+        with REGISTRY.time(PHASE_METRIC, PHASE_HELP, phase="upstream"):
+            histories = await asyncio.gather(*(batch_history(tile) for tile in missing.values()))
+    results = await run_blocking(flask_app.batch_complete, cities, tiles, bodies, missing, histories)
+    return JSONResponse({"results": results})
+
+
+async def forecast_explain(request):
+    try:
+        city, lat, lon, location_id, horizon, top = flask_app.explain_query(request.query_params)
+    except ValueError as e:
+        return JSONResponse({"error": str(e)}, status_code=400)
+    body = await run_blocking(flask_app.stored_explanation, city, location_id, horizon, top)
+    if body is None:
+        result = await forecast_result(lat, lon, location_id)
+        body = await run_blocking(flask_app.live_explanation, city, lat, lon, location_id, horizon, top, result)
+    return JSONResponse(body)
+
+
+async def forecast_explain_global(request):
+    try:
+        horizon = int(request.query_params["horizon"])
+    except (KeyError, ValueError):
+        horizon = None   # like Flask's args.get("horizon", type=int), a bad value is ignored
+    result = await run_blocking(flask_app.current_global_importance, horizon)
+    if result is None:
+        return JSONResponse({"error": "Global importances for the current model are not computed yet"}, status_code=503)
+    return JSONResponse(result)
+
+
+async def feature_importance(request):
+    result = await run_blocking(flask_app.current_global_importance)
+    if result is None:
+        return FileResponse(os.path.join(BUILD_DIR, "feature_importance.json"))
+    return JSONResponse(result["importance"])
+
+
+async def forecast_explain_stats(request):
+    return JSONResponse(flask_app.explanations.stats())
+
+
+async def pollutant_history(request):
+    try:
+        lat, lon, days, granularity = flask_app.history_query(request.query_params)
+    except ValueError as e:
+        return JSONResponse({"error": str(e)}, status_code=400)
+
+    async def compute():
+        start_date, end_date = flask_app.history_window(days)
+        with REGISTRY.time(PHASE_METRIC, PHASE_HELP, phase="upstream"):
+            hourly = await history_upstream.fetch(lat, lon, start_date, end_date)
+        if hourly is None:
+            raise LookupError("Upstream history unavailable")
+        return flask_app.aggregate_history(hourly, flask_app.POLLUTANTS, start_date, days, granularity)
+
+    try:
+        key = cache_key(lat, lon) + (days, granularity)
+        result = await flask_app.history_cache.get_or_compute_async(key, compute)
+    except LookupError as e:
+        return JSONResponse({"error": str(e)}, status_code=502)
+    return JSONResponse({"lat": lat, "lon": lon, "days": days, **result})
+
+
+async def forecast_cache_stats(request):
+    return JSONResponse(flask_app.forecast_cache.stats())
+
+
+async def snapshot_stats(request):
+    return JSONResponse({"store": flask_app.snapshot_store.stats(), "refresher": flask_app.snapshot_refresher.stats()})
+
+
+async def model_stats(request):
+    return JSONResponse(flask_app.model_registry.stats())
+
+
+async def upstream_stats(request):
+    return JSONResponse(upstream.stats())
+
+
+async def metrics(request):
+    return Response(flask_app.render_metrics(upstream), media_type="text/plain; version=0.0.4")
+
+
+async def not_found(request, exc):
+    # Client-side routes (/dashboard, /about, ...) get the React app, as in app.py;
+    # unknown API routes and missing files are real 404s
+    if is_api_path(request.url.path):
+        return JSONResponse({"error": "Not found"}, status_code=404)
+    if os.path.splitext(request.url.path)[1]:
+        return PlainTextResponse("Not found", status_code=404)
+    return FileResponse(os.path.join(BUILD_DIR, "index.html"), headers={"Cache-Control": REVALIDATE})
+
+
+class PrecompressedStaticFiles(StaticFiles):
+    """StaticFiles serving the .br/.gz copy a client accepts, with immutable caching for hashed build/static assets."""
+
+    def file_response(self, full_path, stat_result, scope, status_code=200):
+        request_headers = Headers(scope=scope)
+        path, encoding = precompressed_variant(str(full_path), request_headers.get("accept-encoding"))
+        if encoding is not None:
+            stat_result = os.stat(path)
+        response = FileResponse(path, status_code=status_code, stat_result=stat_result,
+                                media_type=content_type(str(full_path)))
+        if encoding is not None:
+            response.headers["content-encoding"] = encoding
+        response.headers["vary"] = "Accept-Encoding"
+        response.headers["cache-control"] = cache_control(os.path.relpath(full_path, self.directory))
+        if self.is_not_modified(response.headers, request_headers):
+            return NotModifiedResponse(response.headers)
+        return response
+
+
+# ----------------------------- #
+# Instrumentation
+# ----------------------------- #
+class RequestTimer:
+    """ASGI middleware recording aqi_http_request_seconds with the same labels as the Flask hooks."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        start = time.perf_counter()
+        status = {}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = getattr(scope.get("route"), "path", None) or "unmatched"
+            REGISTRY.observe("aqi_http_request_seconds", time.perf_counter() - start, "HTTP request latency",
+                             route=route, method=scope["method"], status=status.get("code", 500))
+
+
+@asynccontextmanager
+async def lifespan(app):
+    yield
+    await upstream.aclose()
+    await history_upstream.aclose()
+
+
+app = Starlette(
+    routes=[
+        Route("/forecast", forecast),
+        Route("/forecast/batch", forecast_batch, methods=["POST"]),
+        Route("/history", pollutant_history),
+        Route("/forecast/explain", forecast_explain),
+        Route("/forecast/explain/global", forecast_explain_global),
+        Route("/forecast/explain/stats", forecast_explain_stats),
+        Route("/feature_importance.json", feature_importance),
+        Route("/forecast/cache/stats", forecast_cache_stats),
+        Route("/forecast/snapshots/stats", snapshot_stats),
+        Route("/model/stats", model_stats),
+        Route("/upstream/stats", upstream_stats),
+        Route("/metrics", metrics),
+        # React build: index.html at / and hashed assets, with ETag/Last-Modified handling from StaticFiles
+        Mount("/", PrecompressedStaticFiles(directory=BUILD_DIR, html=True, check_dir=False)),
+    ],
+    middleware=[
+        Middleware(CORSMiddleware, allow_origins=["*"]),
+        Middleware(RequestTimer),
+        # Dynamic JSON only: precompressed static responses already carry Content-Encoding
+        Middleware(GZipMiddleware, minimum_size=MIN_COMPRESS_BYTES, compresslevel=6),
+    ],
+    exception_handlers={404: not_found},
+    lifespan=lifespan,
+)
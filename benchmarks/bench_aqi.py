@@ -0,0 +1,40 @@
+"""
+Benchmark: vectorized compute_aqi vs. the legacy row-wise loop.
+
+    python -m benchmarks.bench_aqi --rows 1000000
+
+The legacy loop is timed on a sample (--legacy-rows) and extrapolated, since
+running iterrows over a million rows takes minutes.
+"""
+import argparse
+import time
+
+from benchmarks.fixtures import legacy_compute_aqi, make_pollutants
+from src.data_preprocessing import compute_aqi
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--legacy-rows", type=int, default=20_000)
+    args = parser.parse_args()
+
+    df = make_pollutants(args.rows)
+
+    start = time.perf_counter()
+    compute_aqi(df.copy())
+    vectorized = time.perf_counter() - start
+
+    sample = df.head(args.legacy_rows)
+    start = time.perf_counter()
+    legacy_compute_aqi(sample)
+    legacy = (time.perf_counter() - start) * args.rows / len(sample)
+
+    print(f"rows:        {args.rows:,}")
+    print(f"vectorized:  {vectorized:.3f}s")
+    print(f"legacy:      {legacy:.1f}s (extrapolated from {len(sample):,} rows)")
+    print(f"speedup:     {legacy / vectorized:.0f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""
+Load test: /forecast throughput and p50/p95/p99 latency with the upstream
+APIs replaced by the local stub server and a synthetic model.
+
+    python -m benchmarks.bench_forecast [--requests 2000] [--concurrency 16] [--upstream-delay 0.05]
+
+Two scenarios are run: "cold" (every request has new coordinates, so each one
+fetches upstream and predicts) and "warm" (one location, served from the cache).
+"""
+import argparse
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import requests
+from werkzeug.serving import make_server
+
+import app as app_module
+from benchmarks.bench_model import synthetic_model
+from benchmarks.results import save_results
+from benchmarks.upstream_stub import StubUpstream
+from src.model_registry import ModelRegistry
+from src.upstream import HedgedFetcher, open_meteo_provider, openaq_provider
+
+
+def run_load(base_url, paths, concurrency):
+    local = threading.local()
+
+    def hit(path):
+        session = getattr(local, "session", None)
+        if session is None:
+            session = local.session = requests.Session()
+        start = time.perf_counter()
+        response = session.get(base_url + path, timeout=30)
+        return time.perf_counter() - start, response.status_code
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(hit, paths))
+    wall = time.perf_counter() - start
+    latencies = np.array([r[0] for r in results]) * 1000
+    return {
+        "requests": len(paths),
+        "concurrency": concurrency,
+        "errors": sum(1 for _, status in results if status != 200),
+        "throughput_rps": len(paths) / wall,
+        "p50_ms": float(np.percentile(latencies, 50)),
+        "p95_ms": float(np.percentile(latencies, 95)),
+        "p99_ms": float(np.percentile(latencies, 99)),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--upstream-delay", type=float, default=0.05)
+    parser.add_argument("--compiled", action="store_true", help="serve the model through FlatForest")
+    parser.add_argument("--out", default=None, help="results directory")
+    args = parser.parse_args()
+
+    with StubUpstream() as stub, tempfile.TemporaryDirectory() as tmp:
+        stub.routes["/v1/air-quality"]["delay"] = args.upstream_delay
+        model_path = os.path.join(tmp, "model.pkl")
+        synthetic_model(model_path)
+        app_module.model_registry = ModelRegistry(model_path, compiled=args.compiled, check_interval=3600)
+        app_module.upstream = HedgedFetcher([open_meteo_provider(stub.open_meteo_url),
+                                             openaq_provider(stub.openaq_url)])
+        app_module.forecast_cache.clear()
+
+        server = make_server("127.0.0.1", 0, app_module.app, threaded=True)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        base_url = f"http://127.0.0.1:{server.server_port}"
+        try:
+            requests.get(base_url + "/forecast?lat=0&lon=0", timeout=30)   # load the model once
+            # Coordinates 0.01 apart never share a cache key
+            cold = [f"/forecast?lat={10 + (i // 1000) * 0.01:.2f}&lon={20 + (i % 1000) * 0.01:.2f}"
+                    for i in range(args.requests)]
+            results = {
+                "cold": run_load(base_url, cold, args.concurrency),
+                "warm": run_load(base_url, ["/forecast?lat=24.86&lon=67.00"] * args.requests, args.concurrency),
+                "upstream_delay_s": args.upstream_delay,
+                "compiled": args.compiled,
+            }
+        finally:
+            server.shutdown()
+
+    for name in ("cold", "warm"):
+        r = results[name]
+        print(f"📊 {name}: {r['throughput_rps']:.0f} req/s, p50 {r['p50_ms']:.1f}ms, "
+              f"p95 {r['p95_ms']:.1f}ms, p99 {r['p99_ms']:.1f}ms, {r['errors']} errors")
+    save_results("forecast", results, **({"out_dir": args.out} if args.out else {}))
+
+
+if __name__ == "__main__":
+    main()
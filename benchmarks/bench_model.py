@@ -0,0 +1,71 @@
+"""
+Benchmark: model startup, per-process RSS and single-row predict latency for
+the plain joblib model vs. the compiled FlatForest served by ModelRegistry.
+
+    python -m benchmarks.bench_model [--model aqi_feature_store/rf_aqi_model.pkl]
+
+Without --model a 100-tree forest with the served model's 15 features is trained
+and used instead.
+"""
+import argparse
+import os
+import tempfile
+import time
+
+import joblib
+import numpy as np
+from sklearn.ensemble import RandomForestRegressor
+
+from src.model_registry import ModelRegistry, _rss_mb
+
+
+def synthetic_model(path):
+    rng = np.random.default_rng(0)
+    X = rng.uniform(0, 300, (20_000, 15))
+    model = RandomForestRegressor(n_estimators=100, random_state=0, n_jobs=-1).fit(X, X[:, :6].sum(axis=1))
+    joblib.dump(model, path)
+
+
+def measure(path, compiled, requests=2000):
+    rss_before = _rss_mb()
+    registry = ModelRegistry(path, compiled=compiled, check_interval=3600)
+    start = time.perf_counter()
+    registry.get()
+    startup = time.perf_counter() - start
+    rss_after = _rss_mb()
+
+    X = np.random.default_rng(1).uniform(0, 300, (requests, 15))
+    latencies = []
+    for row in X:
+        t = time.perf_counter()
+        registry.predict(row.reshape(1, -1))
+        latencies.append(time.perf_counter() - t)
+    latencies = np.array(latencies) * 1000
+    return {
+        "startup_s": startup,
+        "rss_delta_mb": None if rss_before is None else rss_after - rss_before,
+        "p50_ms": float(np.percentile(latencies, 50)),
+        "p99_ms": float(np.percentile(latencies, 99)),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--model")
+    parser.add_argument("--requests", type=int, default=2000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = args.model
+        if path is None:
+            path = os.path.join(tmp, "model.pkl")
+            synthetic_model(path)
+        for compiled in (False, True):
+            result = measure(path, compiled, args.requests)
+            name = "compiled" if compiled else "sklearn"
+            print(f"{name:9s} startup={result['startup_s']:.3f}s rss+={result['rss_delta_mb']:.1f}MB "
+                  f"p50={result['p50_ms']:.3f}ms p99={result['p99_ms']:.3f}ms")
+
+
+if __name__ == "__main__":
+    main()
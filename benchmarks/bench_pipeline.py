@@ -0,0 +1,130 @@
+"""
+Benchmark: per-stage preprocessing time on synthetic hourly data, and
+ingest_data against the local stub HTTP server.
+
+    python -m benchmarks.bench_pipeline --sizes 10k,1m [--memory] [--ingest-days 180]
+    python -m benchmarks.bench_pipeline --compact-report [--compact-years 5]
+
+Stage timings come from the same stage() instrumentation the pipeline uses.
+10m rows needs several GB of RAM in the in-memory path; add --streaming to
+time preprocess_data_streaming instead.
+"""
+import argparse
+import gc
+import os
+import tempfile
+import time
+
+from benchmarks.datasets import parse_sizes, synthetic_raw
+from benchmarks.results import save_results
+from benchmarks.upstream_stub import StubUpstream, hourly_window_payload
+from src import data_ingestion
+from src import data_preprocessing as dp
+from src.metrics import RunReport
+
+
+def bench_preprocess(rows, streaming=False, memory=False, compact=False):
+    raw = synthetic_raw(rows)
+    processed = None
+    with tempfile.TemporaryDirectory() as tmp:
+        cwd = os.getcwd()
+        os.chdir(tmp)
+        try:
+            with RunReport(f"preprocess_{rows}", trace_memory=memory) as report:
+                if streaming:
+                    from src.streaming_preprocessing import preprocess_data_streaming
+                    chunk_rows = 200_000
+                    preprocess_data_streaming(
+                        lambda: (raw.iloc[i:i + chunk_rows] for i in range(0, len(raw), chunk_rows)))
+                else:
+                    processed = dp.preprocess_data(raw, compact=compact)
+        finally:
+            os.chdir(cwd)
+    summary = report.to_dict()
+    result = {"rows": rows, "streaming": streaming, "compact": compact, "total_s": summary["seconds"],
+              "stages": summary["totals"]}
+    if processed is not None:
+        result["frame_mb"] = round(processed.memory_usage(deep=True).sum() / 1e6, 3)
+    return result
+
+
+def compact_report(rows, memory=True, repeat=3):
+    """Default vs compact dtypes on the same data: frame size, per-stage peak memory and time (best of `repeat`)."""
+    bench_preprocess(1000)   # warm-up: lazy imports and first Parquet write would land on the default run
+    default, compact = (
+        min((bench_preprocess(rows, memory=memory, compact=c) for _ in range(repeat)), key=lambda r: r["total_s"])
+        for c in (False, True)
+    )
+    stages = {
+        name: {"default_s": round(default["stages"][name]["seconds"], 4),
+               "compact_s": round(compact["stages"][name]["seconds"], 4),
+               "default_peak_mb": default["stages"][name]["peak_memory_mb"],
+               "compact_peak_mb": compact["stages"][name]["peak_memory_mb"]}
+        for name in default["stages"]
+    }
+    return {"rows": rows, "default_frame_mb": default["frame_mb"], "compact_frame_mb": compact["frame_mb"],
+            "frame_reduction": round(1 - compact["frame_mb"] / default["frame_mb"], 3),
+            "default_total_s": default["total_s"], "compact_total_s": compact["total_s"], "stages": stages}
+
+
+def bench_ingest(days, delay=0.0):
+    with StubUpstream() as stub, tempfile.TemporaryDirectory() as tmp:
+        stub.routes["/v1/air-quality"] = {"delay": delay, "status": 200, "body": hourly_window_payload, "query_body": True}
+        stub.routes["/v1/archive"]["delay"] = delay
+        original = data_ingestion.OPEN_METEO_AQ_URL, data_ingestion.WEATHER_ARCHIVE_URL
+        data_ingestion.OPEN_METEO_AQ_URL, data_ingestion.WEATHER_ARCHIVE_URL = stub.open_meteo_url, stub.archive_url
+        cwd = os.getcwd()
+        os.chdir(tmp)
+        try:
+            start = time.perf_counter()
+            df = data_ingestion.ingest_data(days=days)
+            seconds = time.perf_counter() - start
+        finally:
+            os.chdir(cwd)
+            data_ingestion.OPEN_METEO_AQ_URL, data_ingestion.WEATHER_ARCHIVE_URL = original
+        return {"days": days, "rows": 0 if df is None else len(df), "seconds": seconds,
+                "requests": sum(stub.calls.values()), "upstream_delay_s": delay}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", default="10k,1m")
+    parser.add_argument("--streaming", action="store_true")
+    parser.add_argument("--memory", action="store_true", help="record tracemalloc peaks (slows stages)")
+    parser.add_argument("--ingest-days", type=int, default=180)
+    parser.add_argument("--upstream-delay", type=float, default=0.05)
+    parser.add_argument("--compact-report", action="store_true", help="compare default and compact dtypes")
+    parser.add_argument("--compact-years", type=int, default=5)
+    parser.add_argument("--out", default=None, help="results directory")
+    args = parser.parse_args()
+
+    if args.compact_report:
+        report = compact_report(args.compact_years * 8760)
+        print(f"📊 {report['rows']} rows: frame {report['default_frame_mb']:.1f} MB -> {report['compact_frame_mb']:.1f} MB "
+              f"({report['frame_reduction']:.0%} smaller), total {report['default_total_s']:.2f}s -> "
+              f"{report['compact_total_s']:.2f}s")
+        for name, s in report["stages"].items():
+            print(f"   {name:<16} {s['default_s']:.3f}s -> {s['compact_s']:.3f}s, "
+                  f"peak {s['default_peak_mb']} MB -> {s['compact_peak_mb']} MB")
+        save_results("compact_dtypes", report, **({"out_dir": args.out} if args.out else {}))
+        return
+
+    results = {"preprocess": {}, "ingest": None}
+    for label, rows in parse_sizes(args.sizes).items():
+        gc.collect()
+        result = bench_preprocess(rows, args.streaming, args.memory)
+        results["preprocess"][label] = result
+        stages = ", ".join(f"{name}={s['seconds']:.2f}s" for name, s in result["stages"].items())
+        print(f"📊 {label:>4} rows: total {result['total_s']:.2f}s ({stages})")
+
+    if args.ingest_days:
+        results["ingest"] = bench_ingest(args.ingest_days, args.upstream_delay)
+        ingest = results["ingest"]
+        print(f"📊 ingest {ingest['days']} days: {ingest['seconds']:.2f}s, {ingest['rows']} rows, "
+              f"{ingest['requests']} requests")
+
+    save_results("pipeline", results, **({"out_dir": args.out} if args.out else {}))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""
+Compares two benchmark result files and flags regressions.
+
+    python -m benchmarks.compare benchmarks/results/old.json benchmarks/results/new.json [--threshold 0.10]
+
+Every numeric leaf present in both files is compared. Times and latencies
+(keys ending in _s, _ms or "seconds") regress when they grow, throughput when
+it shrinks. Exits with status 1 if any metric regressed by more than threshold.
+"""
+import argparse
+import json
+import sys
+
+HIGHER_IS_BETTER = ("throughput_rps", "speedup")
+LOWER_IS_BETTER_SUFFIXES = ("_s", "_ms", "seconds")
+
+
+def flatten(node, prefix=""):
+    if isinstance(node, dict):
+        for key, value in node.items():
+            yield from flatten(value, f"{prefix}.{key}" if prefix else str(key))
+    elif isinstance(node, (int, float)) and not isinstance(node, bool):
+        yield prefix, float(node)
+
+
+def direction(key):
+    leaf = key.rsplit(".", 1)[-1]
+    if leaf in HIGHER_IS_BETTER:
+        return 1
+    if leaf.endswith(LOWER_IS_BETTER_SUFFIXES):
+        return -1
+    return 0   # counts, sizes and settings are shown but never flagged
+
+
+def compare(old, new, threshold=0.10):
+    old_values, new_values = dict(flatten(old["results"])), dict(flatten(new["results"]))
+    rows, regressions = [], []
+    for key in sorted(old_values.keys() & new_values.keys()):
+        before, after = old_values[key], new_values[key]
+        change = (after - before) / before if before else 0.0
+        sign = direction(key)
+        regressed = sign != 0 and -sign * change > threshold
+        rows.append((key, before, after, change, regressed))
+        if regressed:
+            regressions.append(key)
+    return rows, regressions
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("old")
+    parser.add_argument("new")
+    parser.add_argument("--threshold", type=float, default=0.10)
+    args = parser.parse_args()
+
+    with open(args.old) as f:
+        old = json.load(f)
+    with open(args.new) as f:
+        new = json.load(f)
+    rows, regressions = compare(old, new, args.threshold)
+
+    print(f"{old.get('commit')} -> {new.get('commit')}")
+    for key, before, after, change, regressed in rows:
+        flag = "  ❌ REGRESSION" if regressed else ""
+        print(f"{key:<55} {before:>12.4g} {after:>12.4g} {change:>+8.1%}{flag}")
+    if regressions:
+        print(f"\n❌ {len(regressions)} metric(s) regressed by more than {args.threshold:.0%}")
+        sys.exit(1)
+    print("\n✅ No regressions")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,44 @@
+"""
+Synthetic hourly raw datasets shaped like the merged air-quality + weather
+ingestion output, for reproducible benchmarks.
+"""
+import numpy as np
+import pandas as pd
+
+from benchmarks.upstream_stub import POLLUTANTS, WEATHER
+
+SIZES = {"10k": 10_000, "1m": 1_000_000, "10m": 10_000_000}
+
+# (low, high) of a uniform draw per column; a daily cycle is added on top
+RANGES = {
+    "pm10": (10, 200), "pm2_5": (5, 120), "carbon_monoxide": (100, 2000),
+    "nitrogen_dioxide": (5, 80), "sulphur_dioxide": (1, 40), "ozone": (10, 150),
+    "temperature_2m": (15, 40), "relative_humidity_2m": (20, 95), "dew_point_2m": (5, 25),
+    "apparent_temperature": (15, 45), "pressure_msl": (995, 1020), "windspeed_10m": (0, 30),
+    "winddirection_10m": (0, 360),
+}
+
+
+def synthetic_raw(rows, seed=0, missing=0.01):
+    """rows hourly records starting 2020-01-01 with ~`missing` NaNs per column and a few outlier spikes."""
+    rng = np.random.default_rng(seed)
+    hours = np.arange(rows)
+    daily = np.sin(2 * np.pi * (hours % 24) / 24)
+    data = {"time": pd.date_range("2020-01-01", periods=rows, freq="h").strftime("%Y-%m-%dT%H:%M")}
+    for col in POLLUTANTS + WEATHER:
+        low, high = RANGES[col]
+        values = rng.uniform(low, high, rows) + daily * (high - low) * 0.1
+        values[rng.random(rows) < missing] = np.nan
+        spikes = rng.random(rows) < 0.001
+        values[spikes] *= 5
+        data[col] = values
+    return pd.DataFrame(data)
+
+
+def parse_sizes(text):
+    """'10k,1m' -> {'10k': 10000, '1m': 1000000}; plain integers are accepted too."""
+    sizes = {}
+    for item in text.split(","):
+        item = item.strip().lower()
+        sizes[item] = SIZES[item] if item in SIZES else int(item)
+    return sizes
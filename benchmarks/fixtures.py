@@ -0,0 +1,59 @@
+"""
+Reference implementations and inputs shared by the benchmarks and the tests
+that check the optimized code against them.
+"""
+import numpy as np
+import pandas as pd
+
+
+# Row-wise implementation that compute_aqi used before the vectorized engine
+def legacy_compute_aqi(df):
+    def calc_subindex(conc, breakpoints):
+        for (low, high, ilow, ihigh) in breakpoints:
+            if low <= conc <= high:
+                return ((ihigh - ilow) / (high - low)) * (conc - low) + ilow
+        return None
+
+    bp_pm25 = [(0,30,0,50),(31,60,51,100),(61,90,101,200),(91,120,201,300),(121,250,301,400),(251,350,401,500)]
+    bp_pm10 = [(0,50,0,50),(51,100,51,100),(101,250,101,200),(251,350,201,300),(351,430,301,400),(431,600,401,500)]
+    bp_no2  = [(0,40,0,50),(41,80,51,100),(81,180,101,200),(181,280,201,300),(281,400,301,400),(401,1000,401,500)]
+    bp_so2  = [(0,40,0,50),(41,80,51,100),(81,380,101,200),(381,800,201,300),(801,1600,301,400),(1601,2600,401,500)]
+    bp_co   = [(0,1,0,50),(1.1,2,51,100),(2.1,10,101,200),(10.1,17,201,300),(17.1,34,301,400),(34.1,50,401,500)]
+    bp_o3   = [(0,50,0,50),(51,100,51,100),(101,168,101,200),(169,208,201,300),(209,748,301,400),(749,1000,401,500)]
+
+    aqi_values = []
+    for _, row in df.iterrows():
+        subs = []
+        if pd.notna(row.get("pm2_5")):
+            subs.append(calc_subindex(row["pm2_5"], bp_pm25))
+        if pd.notna(row.get("pm10")):
+            subs.append(calc_subindex(row["pm10"], bp_pm10))
+        if pd.notna(row.get("nitrogen_dioxide")):
+            subs.append(calc_subindex(row["nitrogen_dioxide"], bp_no2))
+        if pd.notna(row.get("sulphur_dioxide")):
+            subs.append(calc_subindex(row["sulphur_dioxide"], bp_so2))
+        if pd.notna(row.get("carbon_monoxide")):
+            subs.append(calc_subindex(row["carbon_monoxide"] / 1000, bp_co))
+        if pd.notna(row.get("ozone")):
+            subs.append(calc_subindex(row["ozone"], bp_o3))
+
+        subs = [s for s in subs if s is not None]
+        aqi_values.append(max(subs) if subs else np.nan)
+    return np.array(aqi_values, dtype=float)
+
+
+def make_pollutants(n=5000, seed=0):
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({
+        "pm2_5": rng.uniform(-5, 400, n),
+        "pm10": rng.uniform(-5, 650, n),
+        "nitrogen_dioxide": rng.uniform(0, 1100, n),
+        "sulphur_dioxide": rng.uniform(0, 2700, n),
+        "carbon_monoxide": rng.uniform(0, 55000, n),
+        "ozone": rng.uniform(0, 1100, n),
+    })
+    # Exact band edges, gaps between bands and missing values
+    df.loc[:9, "pm2_5"] = [0, 30, 30.5, 31, 60, 350, 350.1, np.nan, -1, 120.5]
+    df.loc[:9, "carbon_monoxide"] = [1000, 1050, 1100, np.nan, 50000, 50001, 0, 2050, 17050, np.nan]
+    df.loc[df.sample(frac=0.1, random_state=seed).index, "ozone"] = np.nan
+    return df
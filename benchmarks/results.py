@@ -0,0 +1,37 @@
+"""Saving benchmark results as JSON with enough metadata to compare runs across commits."""
+import json
+import os
+import platform
+import subprocess
+from datetime import datetime
+
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), "results")
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def save_results(name, results, out_dir=RESULTS_DIR):
+    """Writes <out_dir>/<name>-<commit>-<timestamp>.json and returns the path."""
+    os.makedirs(out_dir, exist_ok=True)
+    commit = git_commit() or "nogit"
+    stamp = datetime.utcnow().strftime("%Y%m%dT%H%M%S")
+    payload = {
+        "benchmark": name,
+        "commit": commit,
+        "created_at": stamp,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "results": results,
+    }
+    path = os.path.join(out_dir, f"{name}-{commit}-{stamp}.json")
+    with open(path, "w") as f:
+        json.dump(payload, f, indent=2)
+    print(f"💾 Results saved: {path}")
+    return path
@@ -0,0 +1,112 @@
+"""
+Local stand-in for the Open-Meteo and OpenAQ APIs.
+
+Each route's delay and status can be changed while the server runs, and every
+request is counted, so tests and benchmarks can exercise failover and hedging
+without touching the network.
+"""
+import json
+import threading
+import time
+from datetime import date, datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+POLLUTANTS = ["pm10","pm2_5","carbon_monoxide","nitrogen_dioxide","sulphur_dioxide","ozone"]
+WEATHER = ["temperature_2m","relative_humidity_2m","dew_point_2m","apparent_temperature",
+           "pressure_msl","windspeed_10m","winddirection_10m"]
+
+
+def open_meteo_payload(hours=192, value=40.0):
+    """Hourly series starting at midnight seven days ago, like the /forecast request window."""
+    start = datetime.combine(date.today() - timedelta(days=7), datetime.min.time())
+    times = [(start + timedelta(hours=i)).strftime("%Y-%m-%dT%H:%M") for i in range(hours)]
+    return {"hourly": {"time": times, **{p: [value] * hours for p in POLLUTANTS}}}
+
+
+def openaq_payload(value=25.0):
+    return {"results": [{"parameter": p, "value": value} for p in ["pm10","pm25","co","no2","so2","o3"]]}
+
+
+def hourly_window_payload(query, value=40.0):
+    """Open-Meteo style hourly series covering the requested start_date..end_date (inclusive) and &hourly= columns."""
+    start = datetime.strptime(query["start_date"][0], "%Y-%m-%d")
+    end = datetime.strptime(query["end_date"][0], "%Y-%m-%d")
+    hours = ((end - start).days + 1) * 24
+    times = [(start + timedelta(hours=i)).strftime("%Y-%m-%dT%H:%M") for i in range(hours)]
+    columns = query.get("hourly", [",".join(POLLUTANTS)])[0].split(",")
+    return {"hourly": {"time": times, **{c: [value + i % 24 for i in range(hours)] for c in columns}}}
+
+
+class _Server(ThreadingHTTPServer):
+    # The socketserver default backlog of 5 drops connections from concurrent load tests
+    request_queue_size = 1024
+
+
+class StubUpstream:
+    def __init__(self):
+        self.routes = {
+            "/v1/air-quality": {"delay": 0.0, "status": 200, "body": open_meteo_payload},
+            "/v3/measurements": {"delay": 0.0, "status": 200, "body": openaq_payload},
+            "/v1/archive": {"delay": 0.0, "status": 200, "body": hourly_window_payload, "query_body": True},
+        }
+        self.calls = {path: 0 for path in self.routes}
+        self.queries = []
+        self._lock = threading.Lock()
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                parsed = urlparse(self.path)
+                route = stub.routes.get(parsed.path)
+                if route is None:
+                    self.send_response(404)
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+                query = parse_qs(parsed.query)
+                with stub._lock:
+                    stub.calls[parsed.path] += 1
+                    stub.queries.append((parsed.path, query))
+                time.sleep(route["delay"])
+                body = route["body"]
+                if callable(body):
+                    # query_body routes build their payload from the request's query string
+                    args = (query,) if route.get("query_body") else ()
+                    body = body(*args, **route.get("kwargs", {}))
+                body = json.dumps(body).encode()
+                self.send_response(route["status"])
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = _Server(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+    @property
+    def open_meteo_url(self):
+        return self.url + "/v1/air-quality"
+
+    @property
+    def openaq_url(self):
+        return self.url + "/v3/measurements"
+
+    @property
+    def archive_url(self):
+        return self.url + "/v1/archive"
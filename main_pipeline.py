@@ -1,21 +1,88 @@
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import os
+
 from src.data_ingestion import ingest_data
-from src.data_preprocessing import preprocess_data
-from src.feature_store_update import update_feast_store   # 👈 new import
+from src.incremental_features import run_incremental
+from src.feature_store_update import sync_feast, update_feast_store
+from src.locations import load_locations
+from src.metrics import RunReport, stage
+from src.training import train_locations
+
+# Locations processed in parallel; each worker runs the whole per-location pipeline
+MAX_LOCATION_WORKERS = int(os.environ.get("PIPELINE_WORKERS", os.cpu_count() or 1))
+# Peak memory per stage comes from tracemalloc, which slows allocation-heavy stages; set to 0 to skip it
+TRACE_MEMORY = os.environ.get("PIPELINE_TRACE_MEMORY", "1") == "1"
+# Retrain the forecaster after ingestion. One model serves every location, so it is trained on the
+# pooled history of all locations that ran; TRAIN_LOCATION restricts it to one of them
+TRAIN = os.environ.get("PIPELINE_TRAIN", "1") == "1"
+TRAIN_LOCATION = os.environ.get("TRAIN_LOCATION")
+
+
+def run_location(location):
+    """Ingestion, preprocessing and online-store write for one location (runs in a worker process)."""
+    location_id = location["location_id"]
+    print(f"📍 [{location_id}] Starting pipeline...")
+
+    with RunReport(location_id, trace_memory=TRACE_MEMORY) as report:
+        # Step 1: Data Ingestion (only the hours since the last run)
+        with stage("ingest") as record:
+            # Rows fetched and merged this run, not the full history the call returns
+            ingest_data(incremental=True, location=location, record=record)
+
+        # Step 2: Data Preprocessing (full run the first time, then only the new hours)
+        df_cleaned = run_incremental(city=location_id)
+
+        # Step 3: Local online store (Feast is synced once by the parent)
+        with stage("feature_store_update") as record:
+            written = update_feast_store(df_cleaned, location_id=location_id, feast=False)
+            record["rows"] = written
+
+    rows = 0 if df_cleaned is None else len(df_cleaned)
+    print(f"✅ [{location_id}] {rows} new processed rows.")
+    stages = [dict(r, location_id=location_id) for r in report.stages]
+    return {"location_id": location_id, "rows": rows, "online_rows": written,
+            "seconds": report.seconds, "stages": stages}
+
 
-def main():
+def main(locations=None, max_workers=MAX_LOCATION_WORKERS):
     print("🚀 Starting AQI pipeline...")
+    locations = locations if locations is not None else load_locations()
 
-    # Step 1: Data Ingestion
-    df_raw = ingest_data()
+    results, failed = [], []
+    workers = max(1, min(max_workers, len(locations)))
+    with RunReport("pipeline", trace_memory=False) as report:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = {pool.submit(run_location, loc): loc["location_id"] for loc in locations}
+            for future in as_completed(futures):
+                try:
+                    result = future.result()
+                except Exception as e:
+                    # One bad location must not take the others down
+                    print(f"❌ [{futures[future]}] pipeline failed: {e}")
+                    failed.append(futures[future])
+                    continue
+                report.add(result.pop("stages"))
+                results.append(result)
 
-    # Step 2: Data Preprocessing
-    df_cleaned = preprocess_data(df_raw)
+        # Step 4: Update Feast Feature Store (once, after every location has written its partitions)
+        print("📦 Syncing Feast feature store...")
+        with stage("feast_sync"):
+            sync_feast()
 
-    # Step 3: Update Feast Feature Store
-    print("📦 Sending processed data to Feast feature store...")
-    update_feast_store(df_cleaned)
+        # Step 5: Retrain the forecaster (walk-forward CV + warm-started fit, versioned and hot-reloaded)
+        train_on = [TRAIN_LOCATION] if TRAIN_LOCATION else [r["location_id"] for r in results]
+        if TRAIN and train_on and not set(train_on) & set(failed):
+            print(f"🧠 Training forecaster on {', '.join(train_on)}...")
+            with stage("train", location_id=",".join(train_on)):
+                try:
+                    train_locations(train_on)
+                except ValueError as e:
+                    print(f"⚠️ Training skipped: {e}")
 
-    print("✅ Pipeline complete! All steps executed successfully.")
+    summary = {"results": results, "failed": failed, "report": report.write()}
+    print(f"✅ Pipeline complete! {len(results)} location(s) succeeded, {len(failed)} failed "
+          f"in {report.seconds:.1f}s.")
+    return summary
 
 if __name__ == "__main__":
     main()
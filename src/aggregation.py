@@ -0,0 +1,86 @@
+import numpy as np
+
+# Bucket sizes for history charts, in hours
+GRANULARITIES = {"daily": 24, "6h": 6, "hourly": 1}
+
+
+def hourly_to_array(hourly, columns):
+    """
+    Turns an Open-Meteo style {"time": [...], col: [...]} payload into
+    (times as datetime64[h], float array of shape (n_hours, n_columns)) in one
+    pass. Null values and missing columns become NaN; rows with a null time are dropped.
+    """
+    times = np.array(hourly.get("time") or [], dtype="datetime64[m]").astype("datetime64[h]")
+    n = len(times)
+    values = np.full((n, len(columns)), np.nan)
+    for j, col in enumerate(columns):
+        series = hourly.get(col)
+        if series is None:
+            continue
+        series = np.array(series[:n], dtype=float)   # None -> nan
+        values[:len(series), j] = series
+    valid = ~np.isnat(times)
+    return times[valid], values[valid]
+
+
+def aggregate(times, values, start, periods, hours=24):
+    """
+    Null-aware means of `values` over `periods` consecutive buckets of `hours`
+    hours beginning at `start` (a date or datetime). Samples are placed by their
+    timestamp, so missing or extra hours never shift a bucket; samples outside
+    the window are ignored. Returns (bucket start times, array (periods, n_columns))
+    with NaN for buckets without data.
+    """
+    origin = np.datetime64(start, "h")
+    step = np.timedelta64(hours, "h")
+    bucket = ((times - origin) // step).astype(np.int64)
+    inside = (bucket >= 0) & (bucket < periods)
+    bucket, values = bucket[inside], values[inside]
+
+    k = values.shape[1]
+    present = ~np.isnan(values)
+    # One bincount over (bucket, column) pairs for sums and counts
+    flat = (bucket[:, None] * k + np.arange(k)).ravel()
+    sums = np.bincount(flat, weights=np.where(present, values, 0).ravel(), minlength=periods * k)
+    counts = np.bincount(flat, weights=present.ravel(), minlength=periods * k)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        means = (sums / counts).reshape(periods, k)
+    return origin + step * np.arange(periods), means
+
+
+def to_series(columns, means, decimals=2, fill=None):
+    """{col: [...]} of rounded bucket means; empty buckets become `fill` (None serializes as JSON null)."""
+    rounded = np.round(means, decimals)
+    return {
+        col: [fill if np.isnan(v) else float(v) for v in rounded[:, j]]
+        for j, col in enumerate(columns)
+    }
+
+
+def fill_gaps(means, default=0.0):
+    """Carries the last valid bucket forward (then the first one backward) per column; all-empty columns get default."""
+    means = means.copy()
+    for j in range(means.shape[1]):
+        col = means[:, j]
+        valid = ~np.isnan(col)
+        if not valid.any():
+            col[:] = default
+            continue
+        idx = np.where(valid, np.arange(len(col)), 0)
+        np.maximum.accumulate(idx, out=idx)
+        col[:] = col[idx]
+        first = np.argmax(valid)
+        col[:first] = col[first]
+    return means
+
+
+def history(hourly, columns, start, days=7, granularity="daily"):
+    """Chart-ready aggregation of an hourly payload: {"times": [...], "values": {col: [...]}} with nulls for gaps."""
+    hours = GRANULARITIES[granularity]
+    times, values = hourly_to_array(hourly, columns)
+    buckets, means = aggregate(times, values, start, days * 24 // hours, hours)
+    return {
+        "granularity": granularity,
+        "times": [str(t) + ":00" for t in buckets],
+        "values": to_series(columns, means),
+    }
@@ -0,0 +1,71 @@
+import numpy as np
+import pandas as pd
+
+# -------------------------------
+# BREAKPOINT TABLES
+# -------------------------------
+# Columns: (conc_low, conc_high, index_low, index_high). Pollutants are listed in
+# the order the sub-indices are evaluated, which is also the tie-break order for
+# the dominant pollutant.
+BREAKPOINTS = {
+    "pm2_5": [(0,30,0,50),(31,60,51,100),(61,90,101,200),(91,120,201,300),(121,250,301,400),(251,350,401,500)],
+    "pm10": [(0,50,0,50),(51,100,51,100),(101,250,101,200),(251,350,201,300),(351,430,301,400),(431,600,401,500)],
+    "nitrogen_dioxide": [(0,40,0,50),(41,80,51,100),(81,180,101,200),(181,280,201,300),(281,400,301,400),(401,1000,401,500)],
+    "sulphur_dioxide": [(0,40,0,50),(41,80,51,100),(81,380,101,200),(381,800,201,300),(801,1600,301,400),(1601,2600,401,500)],
+    "carbon_monoxide": [(0,1,0,50),(1.1,2,51,100),(2.1,10,101,200),(10.1,17,201,300),(17.1,34,301,400),(34.1,50,401,500)],
+    "ozone": [(0,50,0,50),(51,100,51,100),(101,168,101,200),(169,208,201,300),(209,748,301,400),(749,1000,401,500)],
+}
+
+# Unit conversions applied before the breakpoint lookup (CO arrives in µg/m³, table is mg/m³)
+SCALE = {"carbon_monoxide": 1000}
+
+POLLUTANTS = list(BREAKPOINTS)
+BP_TABLES = {p: np.asarray(bp, dtype=float).T for p, bp in BREAKPOINTS.items()}
+
+
+def subindex(conc, pollutant):
+    """
+    Vectorized sub-index for one pollutant over a whole column.
+    Concentrations outside every breakpoint band (negative, above the table,
+    or in the gaps between bands) and NaNs give NaN.
+    """
+    low, high, ilow, ihigh = BP_TABLES[pollutant]
+    conc = np.asarray(conc, dtype=float)
+    # First band whose upper bound is >= conc; bands are sorted and disjoint
+    idx = np.searchsorted(high, conc, side="left")
+    in_table = idx < len(high)
+    idx = np.minimum(idx, len(high) - 1)
+    lo, hi, il, ih = low[idx], high[idx], ilow[idx], ihigh[idx]
+    valid = in_table & (conc >= lo)
+    with np.errstate(invalid="ignore"):
+        values = ((ih - il) / (hi - lo)) * (conc - lo) + il
+    return np.where(valid, values, np.nan)
+
+
+def subindices(df):
+    """Returns an (n_rows, n_pollutants) sub-index matrix and the pollutant names used."""
+    present = [p for p in POLLUTANTS if p in df.columns]
+    out = np.full((len(df), len(present)), np.nan)
+    for j, p in enumerate(present):
+        conc = pd.to_numeric(df[p], errors="coerce").to_numpy(dtype=float)
+        if p in SCALE:
+            conc = conc / SCALE[p]
+        out[:, j] = subindex(conc, p)
+    return out, present
+
+
+def aqi_and_dominant(df):
+    """
+    AQI (max sub-index across pollutants) plus the pollutant that produced it.
+    Rows with no valid sub-index get NaN AQI and a None dominant pollutant.
+    """
+    subs, present = subindices(df)
+    if not present:
+        return np.full(len(df), np.nan), np.full(len(df), None, dtype=object)
+
+    has_value = ~np.isnan(subs).all(axis=1)
+    filled = np.where(np.isnan(subs), -np.inf, subs)
+    arg = filled.argmax(axis=1)
+    aqi = np.where(has_value, filled[np.arange(len(df)), arg], np.nan)
+    dominant = np.where(has_value, np.asarray(present, dtype=object)[arg], None)
+    return aqi, dominant
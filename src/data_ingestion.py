@@ -1,26 +1,60 @@
-import requests
 import pandas as pd
 from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+import json
 import os
+import time
 
+from src.locations import make_location
+from src.storage import read_partitioned, upsert_partitioned
+from src.upstream import OPEN_METEO_AQ_URL, make_session
+
+# Default location when none is passed; the pipeline passes one per entry in config/locations.json
 CITY = "Karachi"
 LAT, LON = 24.8607, 67.0011
-OUTPUT_FILE = "data/raw/karachi_merged_data.csv"
+LOCATION = make_location(CITY, LAT, LON, timezone="Asia/Karachi")
+RAW_STORE_DIR = "data/raw/store"            # Parquet, partitioned by location/year/month
+WATERMARK_DIR = "data/raw"
+WEATHER_ARCHIVE_URL = os.environ.get("OPEN_METEO_ARCHIVE_URL", "https://archive-api.open-meteo.com/v1/archive")
 DAYS = 180  # 6 months
 
+# Parallel fetching: each source is split into CHUNK_DAYS windows fetched by a bounded pool
+CHUNK_DAYS = 30
+MAX_WORKERS = 4
+CHUNK_RETRIES = 3
+RETRY_BACKOFF = 2.0  # seconds, doubled after every failed attempt
+REQUEST_TIMEOUT = 60
+# Recent hours are provisional (air quality for today is a forecast, the weather archive lags
+# by days and returns nulls), so every incremental run refetches this many days before the watermark
+REFETCH_DAYS = int(os.environ.get("INGEST_REFETCH_DAYS", 3))
+
+session = make_session(pool_size=MAX_WORKERS)
+
+
+def date_window(days=DAYS, start_date=None, end_date=None):
+    end_date = end_date or datetime.utcnow().date()
+    start_date = start_date or end_date - timedelta(days=days)
+    return start_date, end_date
+
+
+def watermark_path(location=LOCATION, watermark_dir=WATERMARK_DIR):
+    return os.path.join(watermark_dir, f"{location['location_id']}_watermark.json")
+
+
+WATERMARK_FILE = watermark_path()
+
 
-def fetch_openmeteo_aqi(days=DAYS):
-    end_date = datetime.utcnow().date()
-    start_date = end_date - timedelta(days=days)
+def fetch_openmeteo_aqi(days=DAYS, start_date=None, end_date=None, location=LOCATION):
+    start_date, end_date = date_window(days, start_date, end_date)
     url = (
-        "https://air-quality-api.open-meteo.com/v1/air-quality?"
-        f"latitude={LAT}&longitude={LON}"
+        f"{OPEN_METEO_AQ_URL}?"
+        f"latitude={location['lat']}&longitude={location['lon']}"
         f"&hourly=pm10,pm2_5,carbon_monoxide,nitrogen_dioxide,sulphur_dioxide,ozone"
         f"&start_date={start_date}&end_date={end_date}"
-        f"&timezone=Asia/Karachi"
+        f"&timezone={location['timezone']}"
     )
-    print(f"📅 Fetching AIR QUALITY data from {start_date} to {end_date}...")
-    response = requests.get(url)
+    print(f"📅 Fetching AIR QUALITY data for {location['name']} from {start_date} to {end_date}...")
+    response = session.get(url, timeout=REQUEST_TIMEOUT)
     if response.status_code != 200:
         raise Exception(f"❌ AQI API request failed: {response.status_code} — {response.text}")
     data = response.json()
@@ -33,19 +67,18 @@ def fetch_openmeteo_aqi(days=DAYS):
     return df_aqi
 
 
-def fetch_weather_data(days=DAYS):
-    end_date = datetime.utcnow().date()
-    start_date = end_date - timedelta(days=days)
+def fetch_weather_data(days=DAYS, start_date=None, end_date=None, location=LOCATION):
+    start_date, end_date = date_window(days, start_date, end_date)
     url = (
-        "https://archive-api.open-meteo.com/v1/archive?"
-        f"latitude={LAT}&longitude={LON}"
+        f"{WEATHER_ARCHIVE_URL}?"
+        f"latitude={location['lat']}&longitude={location['lon']}"
         f"&hourly=temperature_2m,relative_humidity_2m,dew_point_2m,"
         f"apparent_temperature,pressure_msl,windspeed_10m,winddirection_10m"
         f"&start_date={start_date}&end_date={end_date}"
-        f"&timezone=Asia/Karachi"
+        f"&timezone={location['timezone']}"
     )
-    print(f"📅 Fetching WEATHER data from {start_date} to {end_date}...")
-    response = requests.get(url)
+    print(f"📅 Fetching WEATHER data for {location['name']} from {start_date} to {end_date}...")
+    response = session.get(url, timeout=REQUEST_TIMEOUT)
     if response.status_code != 200:
         raise Exception(f"❌ Weather API request failed: {response.status_code} — {response.text}")
     data = response.json()
@@ -58,20 +91,155 @@ def fetch_weather_data(days=DAYS):
     return df_weather
 
 
-def save_to_csv(df, filepath):
-    os.makedirs(os.path.dirname(filepath), exist_ok=True)
-    df.to_csv(filepath, index=False)
-    print(f"💾 Data saved to {filepath}")
+# -------------------------------
+# PARALLEL CHUNKED FETCHING
+# -------------------------------
+def date_chunks(start_date, end_date, chunk_days=CHUNK_DAYS):
+    """Splits [start_date, end_date] into consecutive, non-overlapping inclusive windows."""
+    chunks = []
+    chunk_start = start_date
+    while chunk_start <= end_date:
+        chunk_end = min(chunk_start + timedelta(days=chunk_days - 1), end_date)
+        chunks.append((chunk_start, chunk_end))
+        chunk_start = chunk_end + timedelta(days=1)
+    return chunks
 
 
-def ingest_data(days=DAYS):
+def fetch_with_retry(fetch, start_date, end_date, retries=CHUNK_RETRIES, backoff=RETRY_BACKOFF, location=LOCATION):
+    """Calls fetch for one chunk, retrying with exponential backoff. Returns None if every attempt failed."""
+    for attempt in range(1, retries + 1):
+        try:
+            return fetch(start_date=start_date, end_date=end_date, location=location)
+        except Exception as e:
+            print(f"⚠️ {fetch.__name__} {start_date}→{end_date} attempt {attempt}/{retries} failed: {e}")
+            if attempt < retries:
+                time.sleep(backoff * 2 ** (attempt - 1))
+    print(f"❌ Giving up on {fetch.__name__} {start_date}→{end_date}; continuing with the other chunks.")
+    return None
+
+
+def stitch_chunks(frames):
+    """Concatenates chunk results in time order; None when no chunk returned data."""
+    frames = [f for f in frames if f is not None and not f.empty]
+    if not frames:
+        return None
+    df = pd.concat(frames, ignore_index=True).drop_duplicates(subset="time", keep="last")
+    return df.iloc[pd.to_datetime(df["time"]).argsort(kind="stable")].reset_index(drop=True)
+
+
+def fetch_sources_parallel(start_date, end_date, chunk_days=CHUNK_DAYS, max_workers=MAX_WORKERS,
+                           retries=CHUNK_RETRIES, backoff=RETRY_BACKOFF, failed=None, location=LOCATION):
+    """
+    Fetches air-quality and weather data for every date chunk concurrently.
+    Chunks that still fail after retrying are skipped; pass a list as `failed`
+    to collect their (start_date, end_date) windows.
+    """
+    chunks = date_chunks(start_date, end_date, chunk_days)
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        futures = {
+            fetch: [pool.submit(fetch_with_retry, fetch, s, e, retries, backoff, location) for s, e in chunks]
+            for fetch in (fetch_openmeteo_aqi, fetch_weather_data)
+        }
+        results = {fetch: [f.result() for f in fs] for fetch, fs in futures.items()}
+
+    if failed is not None:
+        for frames in results.values():
+            failed.extend(chunk for chunk, frame in zip(chunks, frames) if frame is None)
+    return stitch_chunks(results[fetch_openmeteo_aqi]), stitch_chunks(results[fetch_weather_data])
+
+
+# -------------------------------
+# INCREMENTAL STORE + WATERMARK
+# -------------------------------
+def read_watermark(path=WATERMARK_FILE):
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return pd.Timestamp(json.load(f)["last_time"])
+
+
+def write_watermark(last_time, path=WATERMARK_FILE):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump({"last_time": pd.Timestamp(last_time).isoformat(), "updated_at": datetime.utcnow().isoformat()}, f)
+    os.replace(tmp, path)  # atomic, so a crashed run never leaves a half-written watermark
+
+
+def append_partitions(df, store_dir=RAW_STORE_DIR, city=LOCATION["location_id"]):
+    """Merges new rows into the monthly partitions they fall in, deduplicating on time (newest wins)."""
+    upsert_partitioned(df, store_dir, city)
+    print(f"💾 {len(df)} rows merged into {store_dir}")
+
+
+def load_raw_history(store_dir=RAW_STORE_DIR, city=LOCATION["location_id"], columns=None, start=None, end=None):
+    return read_partitioned(store_dir, columns=columns, start=start, end=end, city=city)
+
+
+def ingest_incremental(days=DAYS, store_dir=RAW_STORE_DIR, watermark_file=None, end_date=None, location=LOCATION,
+                       refetch_days=REFETCH_DAYS, record=None):
+    """
+    Fetches the hours after the location's stored watermark, plus a
+    `refetch_days` lookback (a full `days` backfill on the first run), upserts
+    them into its monthly partitions and advances the watermark to the last
+    complete observed hour. Re-running with nothing new only rewrites the lookback.
+    Returns the full raw history; the number of rows this run fetched and merged
+    goes to record["rows"] when a stage record is passed.
+    """
+    city = location["location_id"]
+    watermark_file = watermark_file or watermark_path(location)
+    watermark = read_watermark(watermark_file)
+    # The APIs take whole dates; provisional rows since the lookback start are replaced on upsert
+    start_date = watermark.date() - timedelta(days=refetch_days) if watermark is not None else None
+    start_date, end_date = date_window(days, start_date, end_date)
+
+    failed = []
+    df_aqi, df_weather = fetch_sources_parallel(start_date, end_date, failed=failed, location=location)
+    if record is not None:
+        record["rows"] = 0
+    if df_aqi is None or df_weather is None:
+        print("⚠️ Missing one of the datasets, merge skipped.")
+        return load_raw_history(store_dir, city)
+
+    df_new = pd.merge(df_aqi, df_weather, on="time", how="inner")
+    if record is not None:
+        record["rows"] = len(df_new)
+    if df_new.empty:
+        print("✅ No new hours since last run.")
+    else:
+        append_partitions(df_new, store_dir, city)
+        new_times = observed_times(df_new, end_date)
+        if failed:
+            # Hold the watermark before the first failed chunk so the next run refetches the gap
+            new_times = new_times[new_times < pd.Timestamp(min(s for s, _ in failed))]
+        if not new_times.empty and (watermark is None or new_times.max() > watermark):
+            write_watermark(new_times.max(), watermark_file)
+        print(f"✅ Ingested {len(df_new)} hourly rows for {location['name']}.")
+    return load_raw_history(store_dir, city)
+
+
+def observed_times(df, end_date):
+    """
+    Times of the leading run of complete rows before `end_date`: the end date's
+    air quality is still a forecast and the weather archive returns nulls for
+    days it has not caught up on, so the watermark must not pass either.
+    """
+    times = pd.to_datetime(df["time"])
+    complete = df.drop(columns="time").notna().all(axis=1) & (times < pd.Timestamp(end_date))
+    first_gap = (~complete).to_numpy().argmax() if not complete.all() else len(df)
+    return times.iloc[:first_gap]
+
+
+def ingest_data(days=DAYS, incremental=False, location=LOCATION, record=None):
     """Main function to ingest, merge, and save AQI + weather data."""
-    df_aqi = fetch_openmeteo_aqi(days)
-    df_weather = fetch_weather_data(days)
+    if incremental:
+        return ingest_incremental(days, location=location, record=record)
+
+    df_aqi, df_weather = fetch_sources_parallel(*date_window(days), location=location)
     if df_aqi is not None and df_weather is not None:
         df_merged = pd.merge(df_aqi, df_weather, on="time", how="inner")
         print(f"✅ Merged dataset shape: {df_merged.shape}")
-        save_to_csv(df_merged, OUTPUT_FILE)
+        append_partitions(df_merged, city=location["location_id"])
         print("✅ Data ingestion and merging complete!")
         return df_merged
     else:
@@ -1,15 +1,26 @@
 import os
 import pandas as pd
 import numpy as np
-from sklearn.preprocessing import StandardScaler
-import joblib
 import logging
 
+from src.aqi_engine import aqi_and_dominant
+from src.metrics import stage
+from src.storage import city_slug, read_partitioned, write_partitioned
+from src.transform import Transform
+
 # CONFIG
-RAW_DATA_PATH = "data/raw/karachi_merged_data.csv"
-PROCESSED_UNSCALED = "data/processed/processed_karachi_unscaled.csv"
-PROCESSED_SCALED = "data/processed/processed_karachi_scaled.csv"
-SCALER_PATH = "data/models/scaler.joblib"
+CITY = "Karachi"
+RAW_STORE_DIR = "data/raw/store"
+PROCESSED_STORE = "data/processed/store"    # Parquet, partitioned by city/year/month
+# Scaling parameters (column order, mean, scale); the scaled dataset is never materialized
+TRANSFORM_TEMPLATE = "data/models/transform_{city}.json"
+
+
+def transform_path(city=CITY):
+    return TRANSFORM_TEMPLATE.format(city=city_slug(city))
+
+
+TRANSFORM_PATH = transform_path()
 
 LAG_FEATURES = [1, 2, 3]
 ROLL_WINDOWS = [3, 6, 24]
@@ -19,6 +30,15 @@ NUMERIC_FEATURES = [
     "apparent_temperature", "pressure_msl", "surface_pressure",
     "wind_speed_10m", "wind_direction_10m", "wind_gusts_10m"
 ]
+CAP_COLUMNS = NUMERIC_FEATURES + ["aqi"]
+
+# Compact mode keeps measurements as float32 and calendar features as int8/int16 in memory.
+# The processed store always gets the default dtypes, so runs in either mode share one schema.
+COMPACT_DTYPES = os.environ.get("AQI_COMPACT_DTYPES", "0") == "1"
+TIME_FEATURE_DTYPES = {"hour": np.int32, "day": np.int32, "month": np.int32, "year": np.int32,
+                       "weekday": np.int32, "is_weekend": np.int64}
+COMPACT_TIME_FEATURE_DTYPES = {"hour": np.int8, "day": np.int8, "month": np.int8, "year": np.int16,
+                               "weekday": np.int8, "is_weekend": np.int8}
 
 logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
 
@@ -26,40 +46,13 @@ logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(me
 # AQI CALCULATION 
 # -------------------------------
 def compute_aqi(df):
-    def calc_subindex(conc, breakpoints):
-        for (low, high, ilow, ihigh) in breakpoints:
-            if low <= conc <= high:
-                return ((ihigh - ilow) / (high - low)) * (conc - low) + ilow
-        return None
-
-    # Breakpoints
-    bp_pm25 = [(0,30,0,50),(31,60,51,100),(61,90,101,200),(91,120,201,300),(121,250,301,400),(251,350,401,500)]
-    bp_pm10 = [(0,50,0,50),(51,100,51,100),(101,250,101,200),(251,350,201,300),(351,430,301,400),(431,600,401,500)]
-    bp_no2  = [(0,40,0,50),(41,80,51,100),(81,180,101,200),(181,280,201,300),(281,400,301,400),(401,1000,401,500)]
-    bp_so2  = [(0,40,0,50),(41,80,51,100),(81,380,101,200),(381,800,201,300),(801,1600,301,400),(1601,2600,401,500)]
-    bp_co   = [(0,1,0,50),(1.1,2,51,100),(2.1,10,101,200),(10.1,17,201,300),(17.1,34,301,400),(34.1,50,401,500)]
-    bp_o3   = [(0,50,0,50),(51,100,51,100),(101,168,101,200),(169,208,201,300),(209,748,301,400),(749,1000,401,500)]
-
-    aqi_values = []
-    for _, row in df.iterrows():
-        subs = []
-        if pd.notna(row.get("pm2_5")):
-            subs.append(calc_subindex(row["pm2_5"], bp_pm25))
-        if pd.notna(row.get("pm10")):
-            subs.append(calc_subindex(row["pm10"], bp_pm10))
-        if pd.notna(row.get("nitrogen_dioxide")):
-            subs.append(calc_subindex(row["nitrogen_dioxide"], bp_no2))
-        if pd.notna(row.get("sulphur_dioxide")):
-            subs.append(calc_subindex(row["sulphur_dioxide"], bp_so2))
-        if pd.notna(row.get("carbon_monoxide")):
-            subs.append(calc_subindex(row["carbon_monoxide"] / 1000, bp_co))
-        if pd.notna(row.get("ozone")):
-            subs.append(calc_subindex(row["ozone"], bp_o3))
-
-        subs = [s for s in subs if s is not None]
-        aqi_values.append(max(subs) if subs else np.nan)
-
-    df["aqi"] = aqi_values
+    """
+    Adds the AQI column (max pollutant sub-index) and the pollutant that
+    dominated each row. Sub-indices are evaluated column-wise, see src/aqi_engine.py.
+    """
+    aqi, dominant = aqi_and_dominant(df)
+    df["aqi"] = aqi
+    df["dominant_pollutant"] = dominant
     logging.info("✅ AQI column computed successfully.")
     return df
 
@@ -72,30 +65,64 @@ def to_datetime_index(df, ts_col="time"):
     df.set_index(ts_col, inplace=True)
     return df
 
+def compact_dtypes(df):
+    """float64 measurement columns -> float32 (half the memory; ~7 significant digits is plenty for sensor data)."""
+    floats = df.columns[df.dtypes == np.float64]
+    if len(floats):
+        df[floats] = df[floats].astype(np.float32)
+    return df
+
+def store_dtypes(df):
+    """Default dtypes for writing: float32 back to float64, categories back to text, calendar features to their usual int widths."""
+    floats = df.columns[df.dtypes == np.float32]
+    casts = {c: np.float64 for c in floats}
+    casts.update({c: str for c in df.columns if isinstance(df[c].dtype, pd.CategoricalDtype)})
+    casts.update({c: t for c, t in TIME_FEATURE_DTYPES.items() if c in df.columns and df[c].dtype != t})
+    return df.astype(casts) if casts else df
+
 def impute_missing(df):
-    df.replace("", np.nan, inplace=True)
-    df = df.ffill().bfill()
-    df = df.interpolate(method="time", limit_direction="both")
-    for c in df.columns:
-        if df[c].isna().any():
-            df[c].fillna(df[c].median(), inplace=True)
+    """
+    Forward then backward fill over the whole frame. Afterwards only columns with
+    no value at all are still empty (the old interpolate/median passes could
+    never fill anything else), and those stay NaN as before.
+    """
+    text = df.select_dtypes(include=["object", "string"]).columns
+    if len(text):
+        df[text] = df[text].replace("", np.nan)
+    df.ffill(inplace=True)
+    df.bfill(inplace=True)
     return df
 
-def cap_outliers_iqr(df):
-    for col in NUMERIC_FEATURES + ["aqi"]:
-        if col in df.columns:
-            Q1, Q3 = df[col].quantile(0.25), df[col].quantile(0.75)
-            IQR = Q3 - Q1
-            df[col] = df[col].clip(Q1 - 1.5*IQR, Q3 + 1.5*IQR)
+def iqr_bounds(Q1, Q3):
+    IQR = Q3 - Q1
+    return Q1 - 1.5*IQR, Q3 + 1.5*IQR
+
+def cap_outliers_iqr(df, bounds=None):
+    """
+    Clips CAP_COLUMNS to their IQR fences with one quantile and one clip call;
+    `bounds` ({col: (low, high)}) overrides the in-frame quantiles.
+    """
+    cols = [c for c in CAP_COLUMNS if c in df.columns]
+    if not cols:
+        return df
+    if bounds is not None:
+        low = pd.Series({c: bounds[c][0] for c in cols})
+        high = pd.Series({c: bounds[c][1] for c in cols})
+    else:
+        q = df[cols].quantile([0.25, 0.75])
+        low, high = iqr_bounds(q.loc[0.25], q.loc[0.75])
+    # Bounds are float64: keep float32 columns float32, everything else (e.g. integer API columns) becomes float64
+    dtypes = {c: np.float32 if df[c].dtype == np.float32 else np.float64 for c in cols}
+    df[cols] = df[cols].astype(dtypes).clip(low, high, axis=1).astype(dtypes)
     return df
 
-def add_time_features(df):
-    df["hour"] = df.index.hour
-    df["day"] = df.index.day
-    df["month"] = df.index.month
-    df["year"] = df.index.year
-    df["weekday"] = df.index.weekday
-    df["is_weekend"] = df["weekday"].isin([5,6]).astype(int)
+def add_time_features(df, compact=COMPACT_DTYPES):
+    dtypes = COMPACT_TIME_FEATURE_DTYPES if compact else TIME_FEATURE_DTYPES
+    index = df.index
+    for col, values in (("hour", index.hour), ("day", index.day), ("month", index.month),
+                        ("year", index.year), ("weekday", index.weekday)):
+        df[col] = values.astype(dtypes[col])
+    df["is_weekend"] = (df["weekday"] >= 5).astype(dtypes["is_weekend"])
     return df
 
 def add_aqi_change(df):
@@ -115,51 +142,75 @@ def add_lags_and_rolls(df):
 # -------------------------------
 # SAVE OUTPUTS
 # -------------------------------
-def save_outputs(df):
-    os.makedirs(os.path.dirname(PROCESSED_UNSCALED), exist_ok=True)
-    os.makedirs(os.path.dirname(PROCESSED_SCALED), exist_ok=True)
-    os.makedirs(os.path.dirname(SCALER_PATH), exist_ok=True)
+def save_outputs(df, city=CITY):
+    df_reset = store_dtypes(df.reset_index())
+    # Single processed copy: also serves as the Feast offline source (location_id is the entity key)
+    write_partitioned(df_reset.assign(location_id=city_slug(city)), PROCESSED_STORE, city)
+    logging.info(f"💾 Unscaled data saved: {PROCESSED_STORE}")
+
+    transform_file = Transform.fit(df_reset).save(transform_path(city))
+    logging.info(f"📁 Transform saved: {transform_file}")
 
-    df_reset = df.reset_index()
-    df_reset.to_csv(PROCESSED_UNSCALED, index=False)
-    logging.info(f"💾 Unscaled data saved: {PROCESSED_UNSCALED}")
 
-    numeric_cols = [c for c in df_reset.columns if df_reset[c].dtype in [np.float64, np.int64]]
-    scaler = StandardScaler()
-    df_scaled = df_reset.copy()
-    df_scaled[numeric_cols] = scaler.fit_transform(df_scaled[numeric_cols])
-    df_scaled.to_csv(PROCESSED_SCALED, index=False)
-    joblib.dump(scaler, SCALER_PATH)
+def load_processed(columns=None, start=None, end=None, city=CITY):
+    """Reads only the requested columns/date range of the processed store."""
+    return read_partitioned(PROCESSED_STORE, columns=columns, start=start, end=end, city=city)
 
-    logging.info(f"💾 Scaled data saved: {PROCESSED_SCALED}")
-    logging.info(f"📁 Scaler saved: {SCALER_PATH}")
+
+def load_scaled(columns=None, start=None, end=None, city=CITY):
+    """The processed store standardized on the fly with the city's transform artifact."""
+    df = load_processed(columns=columns, start=start, end=end, city=city)
+    if df is None:
+        return None
+    return Transform.load(transform_path(city)).apply(df)
 
 # -------------------------------
 # WRAPPED FUNCTION for pipeline
 # -------------------------------
-def preprocess_data(df):
+def preprocess_data(df, city=CITY, compact=COMPACT_DTYPES):
     """
     Preprocess and feature engineer the input DataFrame.
-    Can be called directly from main_pipeline.py
+    Can be called directly from main_pipeline.py. With compact, the returned
+    frame uses float32/int8 columns (see compact_dtypes); the saved store does not.
     """
     logging.info("🚀 Starting preprocessing + feature engineering pipeline...")
     logging.info(f"Initial data shape: {df.shape}")
 
-    df = to_datetime_index(df, ts_col="time")
-    df = impute_missing(df)
-    df = compute_aqi(df)
-    df = cap_outliers_iqr(df)
-    df = add_time_features(df)
-    df = add_aqi_change(df)
-    df = add_lags_and_rolls(df)
-
-    df.dropna(inplace=True)
-    save_outputs(df)
+    with stage("impute", rows=len(df)):
+        df = to_datetime_index(df, ts_col="time")
+        if compact:
+            df = compact_dtypes(df)
+        df = impute_missing(df)
+    with stage("aqi", rows=len(df)):
+        df = compute_aqi(df)
+        if compact:
+            df["dominant_pollutant"] = df["dominant_pollutant"].astype("category")
+    with stage("outlier_capping", rows=len(df)):
+        df = cap_outliers_iqr(df)
+    with stage("features") as record:
+        df = add_time_features(df, compact)
+        df = add_aqi_change(df)
+        df = add_lags_and_rolls(df)
+        df.dropna(inplace=True)
+        record["rows"] = len(df)
+    with stage("save", rows=len(df)):
+        save_outputs(df, city)
 
     logging.info(f"✅ Preprocessing complete. Final shape: {df.shape}")
     return df
 
 # Standalone mode (run independently)
 if __name__ == "__main__":
-    df_raw = pd.read_csv(RAW_DATA_PATH)
-    preprocess_data(df_raw)
+    import argparse
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--streaming", action="store_true", help="bounded-memory chunked mode")
+    parser.add_argument("--chunk-rows", type=int, default=100_000)
+    parser.add_argument("--city", default=CITY, help="location_id / city partition to process")
+    args = parser.parse_args()
+
+    if args.streaming:
+        from src.streaming_preprocessing import preprocess_data_streaming, raw_store_chunks
+        preprocess_data_streaming(raw_store_chunks(RAW_STORE_DIR, args.city, args.chunk_rows), city=args.city)
+    else:
+        df_raw = read_partitioned(RAW_STORE_DIR, city=args.city)
+        preprocess_data(df_raw, city=args.city)
@@ -0,0 +1,323 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+
+import numpy as np
+
+from src.forecast_cache import ForecastCache
+
+EXPLAIN_STORE_PATH = os.environ.get("AQI_EXPLAIN_STORE", "data/online/explanations.db")
+# On-demand requests wait this long for exact TreeSHAP, then get the fast approximation
+EXPLAIN_BUDGET = float(os.environ.get("EXPLAIN_BUDGET", 0.5))
+EXPLAIN_CACHE_SIZE = int(os.environ.get("EXPLAIN_CACHE_SIZE", 128))
+EXPLAIN_WORKERS = int(os.environ.get("EXPLAIN_WORKERS", 2))
+# Background rows explained per refresh when rebuilding global importances for a new model
+GLOBAL_CHUNK_ROWS = int(os.environ.get("EXPLAIN_GLOBAL_CHUNK", 64))
+GLOBAL_SAMPLE_ROWS = int(os.environ.get("EXPLAIN_GLOBAL_SAMPLE", 2000))
+
+
+# ----------------------------- #
+# TreeSHAP
+# ----------------------------- #
+def explanation(engine, model_version, features, horizons, base, values, x, issued_at=None, method="tree_shap"):
+    """
+    One forecast's attributions: base (n_horizons,), values and x (n_horizons x
+    n_features), with x the unscaled feature values shown to users.
+    base + values.sum(axis=1) is the model output at each horizon.
+    """
+    return {"engine": engine, "model_version": model_version, "issued_at": issued_at, "method": method,
+            "features": list(features), "horizons": [int(h) for h in horizons],
+            "base": np.asarray(base, dtype=np.float32), "values": np.asarray(values, dtype=np.float32),
+            "x": np.asarray(x, dtype=np.float32)}
+
+
+class TreeExplainers:
+    """One shap.TreeExplainer per model registry, rebuilt when the registry's model version changes."""
+
+    def __init__(self):
+        self._explainers = {}   # registry path -> (version, TreeExplainer)
+        self._lock = threading.Lock()
+
+    def get(self, registry):
+        version = registry.version
+        with self._lock:
+            cached = self._explainers.get(registry.path)
+            if cached is None or cached[0] != version:
+                import shap
+                cached = self._explainers[registry.path] = (version, shap.TreeExplainer(registry.model))
+        return cached
+
+    def shap_values(self, registry, X, approximate=False):
+        """(version, base (n_outputs,), values (n_rows x n_features x n_outputs)) for the registry's current model."""
+        version, explainer = self.get(registry)
+        values = np.asarray(explainer.shap_values(np.asarray(X, dtype=float), approximate=approximate,
+                                                  check_additivity=False))
+        if values.ndim == 2:
+            values = values[:, :, None]
+        return version, np.atleast_1d(np.asarray(explainer.expected_value, dtype=float)), values
+
+
+def explain_inputs(explainers, inputs, approximate=False):
+    """
+    Explanations for several forecasts with one TreeSHAP call per model.
+    Each input is {"engine", "registry", "features", "horizons", "x", "model_x",
+    "issued_at"}: x holds the unscaled rows and model_x what the model sees.
+    A single row with one output per horizon (multi-horizon forecaster) and
+    one row per horizon with a single output (legacy daily model) both work.
+    """
+    out = [None] * len(inputs)
+    by_registry = {}
+    for i, item in enumerate(inputs):
+        by_registry.setdefault(item["registry"].path, []).append(i)
+    for indices in by_registry.values():
+        registry = inputs[indices[0]]["registry"]
+        X = np.vstack([inputs[i]["model_x"] for i in indices])
+        version, base, values = explainers.shap_values(registry, X, approximate)
+        start = 0
+        for i in indices:
+            item = inputs[i]
+            rows = len(item["model_x"])
+            block, x = values[start:start + rows], np.asarray(item["x"], dtype=float)
+            start += rows
+            if rows == 1:
+                # (1, features, horizons) -> one attribution row per horizon, same inputs
+                vals, row_base, x = block[0].T, base, np.broadcast_to(x, (len(base), x.shape[1]))
+            else:
+                vals, row_base = block[:, :, 0], np.repeat(base[:1], rows)
+            out[i] = explanation(item["engine"], version, item["features"], item["horizons"], row_base, vals, x,
+                                 item.get("issued_at"), "approximate" if approximate else "tree_shap")
+    return out
+
+
+def horizon_response(expl, horizon, top=10):
+    """JSON body for one horizon: the top contributions by |SHAP| plus the rest summed as "other"."""
+    horizons = expl["horizons"]
+    i = min(range(len(horizons)), key=lambda k: (abs(horizons[k] - horizon), horizons[k]))
+    values, x = expl["values"][i].astype(float), expl["x"][i].astype(float)
+    order = np.argsort(-np.abs(values), kind="stable")
+    base = float(expl["base"][i])
+    return {
+        "engine": expl["engine"],
+        "model_version": expl["model_version"],
+        "issued_at": expl["issued_at"],
+        "method": expl["method"],
+        "horizon_h": horizons[i],
+        "base_value": round(base, 3),
+        "prediction": round(base + float(values.sum()), 2),
+        "contributions": [
+            {"feature": expl["features"][j], "value": round(float(x[j]), 3), "shap": round(float(values[j]), 3)}
+            for j in order[:top]
+        ],
+        "other": round(float(values[order[top:]].sum()), 3),
+    }
+
+
+# ----------------------------- #
+# Precomputed store
+# ----------------------------- #
+class ExplanationStore:
+    """
+    Precomputed explanations in SQLite, one row per (location, horizon) with
+    the SHAP and feature vectors as float32 blobs, plus running mean-|SHAP|
+    sums per model for global importances. Shared by every server process and
+    the refresher, like SnapshotStore.
+    """
+
+    def __init__(self, path=EXPLAIN_STORE_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = None
+
+    def _db(self):
+        """The connection, opened (with the schema) on first use so creating a store touches no files; needs the lock."""
+        if self._conn is None:
+            if os.path.dirname(self.path):
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            with conn:
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS explanations (location_id TEXT, horizon INTEGER, engine TEXT, "
+                    "model_version TEXT, issued_at TEXT, as_of REAL, base REAL, shap BLOB, x BLOB, "
+                    "PRIMARY KEY (location_id, horizon))"
+                )
+                conn.execute("CREATE TABLE IF NOT EXISTS models (model_version TEXT PRIMARY KEY, features TEXT)")
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS global_importance (model_path TEXT PRIMARY KEY, model_version TEXT, "
+                    "features TEXT, horizons TEXT, rows INTEGER, sampled INTEGER, sums BLOB, updated REAL)"
+                )
+            self._conn = conn
+        return self._conn
+
+    def put(self, location_id, expl, as_of=None):
+        as_of = time.time() if as_of is None else as_of
+        rows = [
+            (str(location_id), h, expl["engine"], expl["model_version"], expl["issued_at"], as_of,
+             float(expl["base"][i]), expl["values"][i].tobytes(), expl["x"][i].astype(np.float32).tobytes())
+            for i, h in enumerate(expl["horizons"])
+        ]
+        with self._lock, self._db() as conn:
+            conn.execute("INSERT OR IGNORE INTO models VALUES (?, ?)", (expl["model_version"], json.dumps(expl["features"])))
+            conn.execute("DELETE FROM explanations WHERE location_id = ?", (str(location_id),))
+            conn.executemany("INSERT INTO explanations VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+
+    def get(self, location_id, horizon, max_age=None, now=None):
+        """(as_of, one-horizon explanation) for the stored horizon closest to `horizon`, or None."""
+        if self._conn is None and not os.path.exists(self.path):
+            return None   # nothing stored yet; a read alone must not create the store
+        with self._lock:
+            row = self._db().execute(
+                "SELECT e.horizon, e.engine, e.model_version, e.issued_at, e.as_of, e.base, e.shap, e.x, m.features "
+                "FROM explanations e JOIN models m USING (model_version) WHERE e.location_id = ? "
+                "ORDER BY ABS(e.horizon - ?), e.horizon LIMIT 1",
+                (str(location_id), int(horizon)),
+            ).fetchone()
+        if row is None:
+            return None
+        h, engine, version, issued_at, as_of, base, shap_blob, x_blob, features = row
+        now = time.time() if now is None else now
+        if max_age is not None and now - as_of > max_age:
+            return None
+        values = np.frombuffer(shap_blob, dtype=np.float32)[None, :]
+        x = np.frombuffer(x_blob, dtype=np.float32)[None, :]
+        return as_of, explanation(engine, version, json.loads(features), [h], [base], values, x, issued_at)
+
+    # Global importances: sums of |SHAP| per (horizon, feature) over every row explained for a model version
+    def global_sums(self, model_path):
+        if self._conn is None and not os.path.exists(self.path):
+            return None   # nothing stored yet; a read alone must not create the store
+        with self._lock:
+            row = self._db().execute(
+                "SELECT model_version, features, horizons, rows, sampled, sums, updated FROM global_importance "
+                "WHERE model_path = ?", (model_path,),
+            ).fetchone()
+        if row is None:
+            return None
+        version, features, horizons, rows, sampled, sums, updated = row
+        features, horizons = json.loads(features), json.loads(horizons)
+        return {"model_version": version, "features": features, "horizons": horizons, "rows": rows,
+                "sampled": sampled, "updated": updated,
+                "sums": np.frombuffer(sums, dtype=np.float64).reshape(len(horizons), len(features))}
+
+    def add_global(self, model_path, expls, sampled=0):
+        """Adds explanations of the current model to its running sums, restarting them when the version changed."""
+        first = expls[0]
+        add = sum(np.abs(e["values"].astype(np.float64)) for e in expls)
+        with self._lock, self._db() as conn:
+            row = conn.execute("SELECT model_version, rows, sampled, sums FROM global_importance WHERE model_path = ?",
+                               (model_path,)).fetchone()
+            rows, total_sampled, sums = len(expls), sampled, add
+            if row is not None and row[0] == first["model_version"]:
+                rows += row[1]
+                total_sampled += row[2]
+                sums = sums + np.frombuffer(row[3], dtype=np.float64).reshape(add.shape)
+            conn.execute(
+                "INSERT OR REPLACE INTO global_importance VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (model_path, first["model_version"], json.dumps(first["features"]), json.dumps(first["horizons"]),
+                 rows, total_sampled, sums.tobytes(), time.time()),
+            )
+
+    def stats(self):
+        if self._conn is None and not os.path.exists(self.path):
+            return {"path": self.path, "locations": 0, "rows": 0, "global": []}
+        with self._lock:
+            locations, rows = self._db().execute(
+                "SELECT COUNT(DISTINCT location_id), COUNT(*) FROM explanations").fetchone()
+            models = self._db().execute("SELECT model_path, model_version, rows FROM global_importance").fetchall()
+        return {"path": self.path, "locations": locations, "rows": rows,
+                "global": [{"model_path": p, "model_version": v, "rows": r} for p, v, r in models]}
+
+
+def global_importance(sums, horizon=None):
+    """[{"Feature", "Importance"}] by mean |SHAP| (the shape of feature_importance.json), for one horizon or all."""
+    if horizon is None:
+        mean = sums["sums"].mean(axis=0) / sums["rows"]
+    else:
+        i = min(range(len(sums["horizons"])), key=lambda k: abs(sums["horizons"][k] - horizon))
+        mean = sums["sums"][i] / sums["rows"]
+    order = np.argsort(-mean, kind="stable")
+    return [{"Feature": sums["features"][j], "Importance": round(float(mean[j]), 6)} for j in order]
+
+
+# ----------------------------- #
+# Service
+# ----------------------------- #
+class ExplanationService:
+    """
+    Batch TreeSHAP for scheduled forecasts (refresh) and an on-demand path for
+    everything else: exact results go through an LRU with single-flight, and a
+    request that would wait longer than `budget` gets the fast approximate
+    (Saabas) attribution while the exact one finishes for the next caller.
+    """
+
+    def __init__(self, store, budget=EXPLAIN_BUDGET, cache_size=EXPLAIN_CACHE_SIZE, ttl=3600, workers=EXPLAIN_WORKERS):
+        self.store = store
+        self.budget = budget
+        self.explainers = TreeExplainers()
+        self.cache = ForecastCache(maxsize=cache_size, ttl=ttl)
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="explain")
+        self.approximations = 0
+        self._sample = {}   # model path -> (version, model_x rows) for global importances
+
+    def explain(self, key, inputs):
+        """Explanation for one forecast's inputs, exact if it is cached or finishes within the budget."""
+        version = inputs["registry"].version
+        key = key + (version,)
+        future = self.pool.submit(self.cache.get_or_compute, key, lambda: explain_inputs(self.explainers, [inputs])[0])
+        try:
+            return future.result(timeout=self.budget)
+        except TimeoutError:
+            self.approximations += 1
+            return explain_inputs(self.explainers, [inputs], approximate=True)[0]
+
+    def refresh(self, inputs_by_location, sample=None):
+        """
+        Explains every location's current forecast in one batch and stores it,
+        then adds those rows and the next chunk of `sample` (model path ->
+        callable returning background model_x rows) to the global sums.
+        """
+        if not inputs_by_location:
+            return 0
+        ids = list(inputs_by_location)
+        expls = explain_inputs(self.explainers, [inputs_by_location[i] for i in ids])
+        now = time.time()
+        grouped = {}
+        for location_id, expl in zip(ids, expls):
+            self.store.put(location_id, expl, as_of=now)
+            registry = inputs_by_location[location_id]["registry"]
+            grouped.setdefault(registry.path, (registry, inputs_by_location[location_id], []))[2].append(expl)
+        for path, (registry, template, group) in grouped.items():
+            background = self._sample_chunk(registry, template, (sample or {}).get(path))
+            self.store.add_global(path, group + background, sampled=len(background))
+        logging.info(f"🔎 Stored explanations for {len(ids)} locations")
+        return len(ids)
+
+    def _sample_chunk(self, registry, template, source):
+        """Next GLOBAL_CHUNK_ROWS background rows for the current model, until GLOBAL_SAMPLE_ROWS are covered."""
+        if source is None:
+            return []
+        version = registry.version
+        cached = self._sample.get(registry.path)
+        if cached is None or cached[0] != version:
+            cached = self._sample[registry.path] = (version, source())
+        done = self.store.global_sums(registry.path)
+        offset = done["sampled"] if done is not None and done["model_version"] == version else 0
+        rows = cached[1][offset:min(offset + GLOBAL_CHUNK_ROWS, GLOBAL_SAMPLE_ROWS)]
+        inputs = [{**template, "x": row[None, :], "model_x": row[None, :], "issued_at": None} for row in rows]
+        return explain_inputs(self.explainers, inputs) if inputs else []
+
+    def global_importance(self, registry, horizon=None):
+        """Global importances of the registry's current model, or None until at least one row was explained."""
+        sums = self.store.global_sums(registry.path)
+        if sums is None or sums["model_version"] != registry.version or not sums["rows"]:
+            return None
+        return {"model_version": sums["model_version"], "rows": sums["rows"], "sampled": sums["sampled"],
+                "horizons": sums["horizons"], "importance": global_importance(sums, horizon)}
+
+    def stats(self):
+        return {**self.store.stats(), "cache": self.cache.stats(), "budget": self.budget,
+                "approximations": self.approximations}
@@ -1,31 +1,69 @@
-from feast import FeatureStore
 from datetime import datetime
+import hashlib
+import glob
 import os
-import pandas as pd
 
-def update_feast_store(processed_df):
-    print("🚀 Updating Feast feature store...")
+from src.online_store import OnlineStore
+from src.storage import city_slug
 
-    # ✅ Always find the correct path to feature_repo
-    script_dir = os.path.dirname(os.path.abspath(__file__))
-    feast_repo_path = os.path.abspath(os.path.join(script_dir, "..", "aqi_feature_store"))
+# ✅ Always find the correct path to feature_repo
+script_dir = os.path.dirname(os.path.abspath(__file__))
+FEAST_REPO_PATH = os.path.abspath(os.path.join(script_dir, "..", "aqi_feature_store"))
+APPLIED_HASH_FILE = os.path.join(FEAST_REPO_PATH, "data", "applied_definitions.sha256")
 
-    store = FeatureStore(repo_path=feast_repo_path)
 
-    # ✅ Ensure Feast’s required columns exist
-    if "event_timestamp" not in processed_df.columns:
-        processed_df = processed_df.reset_index().rename(columns={"time": "event_timestamp"})
+def _definitions_hash(repo_path=FEAST_REPO_PATH):
+    digest = hashlib.sha256()
+    for path in sorted(glob.glob(os.path.join(repo_path, "feature_repo", "*.py")) +
+                       glob.glob(os.path.join(repo_path, "*.yaml"))):
+        with open(path, "rb") as f:
+            digest.update(f.read())
+    return digest.hexdigest()
 
-    # ✅ Add static entity key (you can later make this dynamic)
-    processed_df["location_id"] = "karachi"
 
-    # ✅ Save data locally for Feast’s offline store
-    offline_path = "data/feast_data/karachi_features.parquet"
-    os.makedirs(os.path.dirname(offline_path), exist_ok=True)
-    processed_df.to_parquet(offline_path, index=False)
-
-    # ✅ Apply feature definitions and materialize to online store
-    store.apply(store.repo_path)
+def sync_feast(repo_path=FEAST_REPO_PATH):
+    """Materializes into Feast when it is installed; definitions are only re-applied when they changed."""
+    try:
+        from feast import FeatureStore
+    except ImportError:
+        print("ℹ️ Feast not installed; local online store only.")
+        return
+    store = FeatureStore(repo_path=repo_path)
+    current = _definitions_hash(repo_path)
+    applied = open(APPLIED_HASH_FILE).read() if os.path.exists(APPLIED_HASH_FILE) else None
+    if current != applied:
+        store.apply(store.repo_path)
+        os.makedirs(os.path.dirname(APPLIED_HASH_FILE), exist_ok=True)
+        with open(APPLIED_HASH_FILE, "w") as f:
+            f.write(current)
     store.materialize_incremental(end_date=datetime.now())
 
-    print("✅ Feast feature store updated successfully!")
+
+def update_feast_store(processed_df, location_id=None, online_store=None, feast=True):
+    """
+    Upserts the newest processed row per location into the local online store.
+    Rows without a location_id column are keyed by location_id. With several
+    pipeline workers, pass feast=False and call sync_feast() once at the end.
+    """
+    print("🚀 Updating feature store...")
+
+    # ✅ The offline source is the processed Parquet store written by save_outputs,
+    #    so there is no second copy to write here
+    if processed_df is None or processed_df.empty:
+        print("✅ No new processed rows; online store unchanged.")
+        return 0
+    print(f"📦 {len(processed_df)} processed rows available in the offline store.")
+
+    # ✅ Upsert only the newest row per location into the local online store
+    if "location_id" not in processed_df.columns:
+        if location_id is None:
+            raise ValueError("processed_df has no location_id column; pass location_id")
+        processed_df = processed_df.assign(location_id=city_slug(location_id))
+    written = (online_store or OnlineStore()).upsert(processed_df)
+    print(f"⚡ Online store: {written} location(s) upserted.")
+
+    if feast:
+        sync_feast()
+
+    print("✅ Feature store updated successfully!")
+    return written
@@ -0,0 +1,153 @@
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+
+
+def cache_key(lat, lon, precision=2, now=None):
+    """Rounded (lat, lon) plus the current hour bucket."""
+    now = time.time() if now is None else now
+    return (round(float(lat), precision), round(float(lon), precision), int(now // 3600))
+
+
+class _InFlight:
+    def __init__(self):
+        self.event = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class ForecastCache:
+    """
+    In-process LRU cache with a TTL and single-flight coalescing.
+
+    Concurrent get_or_compute() calls for the same key share one call to
+    compute(); everyone else waits for its result (or its exception).
+    """
+
+    def __init__(self, maxsize=256, ttl=3600, clock=time.monotonic):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.clock = clock
+        self._data = OrderedDict()
+        self._inflight = {}
+        self._tasks = {}   # key -> asyncio.Task, for get_or_compute_async
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.coalesced = 0
+
+    def _lookup(self, key):
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        expires, value = entry
+        if expires <= self.clock():
+            del self._data[key]
+            self.evictions += 1
+            return None
+        self._data.move_to_end(key)
+        return entry
+
+    def get(self, key):
+        with self._lock:
+            entry = self._lookup(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return entry[1]
+
+    def peek(self, key):
+        """get() without counting a hit or miss, for opportunistic lookups."""
+        with self._lock:
+            entry = self._lookup(key)
+            return None if entry is None else entry[1]
+
+    def set(self, key, value):
+        with self._lock:
+            self._store(key, value)
+
+    def _store(self, key, value):
+        self._data[key] = (self.clock() + self.ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def get_or_compute(self, key, compute):
+        with self._lock:
+            entry = self._lookup(key)
+            if entry is not None:
+                self.hits += 1
+                return entry[1]
+            flight = self._inflight.get(key)
+            leader = flight is None
+            if leader:
+                self.misses += 1
+                flight = self._inflight[key] = _InFlight()
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            flight.event.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.value
+
+        try:
+            flight.value = compute()
+            with self._lock:
+                self._store(key, flight.value)
+            return flight.value
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+            flight.event.set()
+
+    async def get_or_compute_async(self, key, compute):
+        """
+        Event-loop flavour of get_or_compute(): `compute` is a coroutine function and
+        concurrent callers await one shared task. The task is shielded, so a caller
+        that disconnects does not cancel the computation for everyone else.
+        """
+        with self._lock:
+            entry = self._lookup(key)
+            if entry is not None:
+                self.hits += 1
+                return entry[1]
+            task = self._tasks.get(key)
+            if task is None:
+                self.misses += 1
+                task = self._tasks[key] = asyncio.ensure_future(compute())
+                task.add_done_callback(lambda t: self._finish(key, t))
+            else:
+                self.coalesced += 1
+        return await asyncio.shield(task)
+
+    def _finish(self, key, task):
+        with self._lock:
+            self._tasks.pop(key, None)
+            if not task.cancelled() and task.exception() is None:
+                self._store(key, task.result())
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "coalesced": self.coalesced,
+                "evictions": self.evictions,
+                "inflight": len(self._inflight) + len(self._tasks),
+            }
@@ -0,0 +1,240 @@
+import json
+import logging
+import os
+from datetime import datetime
+
+import joblib
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import RandomForestRegressor
+
+from src import data_preprocessing as dp
+from src.storage import read_partitioned
+from src.transform import Transform
+
+FORECASTER_PATH = os.environ.get("AQI_FORECASTER_PATH", "data/models/aqi_forecaster.pkl")
+MAX_HORIZON = 72
+HORIZONS = list(range(1, MAX_HORIZON + 1))
+
+# Feature vector built from a processed-store row: measurements, AQI history and calendar
+POLLUTANT_COLUMNS = ["pm10", "pm2_5", "carbon_monoxide", "nitrogen_dioxide", "sulphur_dioxide", "ozone"]
+WEATHER_COLUMNS = [
+    "temperature_2m", "relative_humidity_2m", "dew_point_2m", "apparent_temperature",
+    "pressure_msl", "windspeed_10m", "winddirection_10m",
+]
+AQI_COLUMNS = (
+    ["aqi", "aqi_change", "aqi_pct_change"]
+    + [f"aqi_lag{lag}" for lag in dp.LAG_FEATURES]
+    + [f"aqi_roll{w}" for w in dp.ROLL_WINDOWS]
+)
+TIME_COLUMNS = ["hour", "weekday", "month", "is_weekend"]
+FEATURE_COLUMNS = POLLUTANT_COLUMNS + WEATHER_COLUMNS + AQI_COLUMNS + TIME_COLUMNS
+
+# Rows older than this are not used as the "now" of a forecast
+MAX_FEATURE_AGE = pd.Timedelta(hours=6)
+
+
+def meta_path(model_path=FORECASTER_PATH):
+    return os.path.splitext(model_path)[0] + ".json"
+
+
+def transform_snapshot_path(model_path=FORECASTER_PATH):
+    return os.path.splitext(model_path)[0] + ".transform.json"
+
+
+# -------------------------------
+# TRAINING
+# -------------------------------
+def make_supervised(processed, horizons=HORIZONS, features=None, with_times=False):
+    """
+    X = the feature row at hour t, Y[:, k] = AQI at t + horizons[k] hours.
+    Targets are looked up by timestamp, so gaps in the hourly series never pair
+    a row with the wrong future hour; rows whose targets are missing are dropped.
+    A pooled history (several location_id values) gets its targets within each
+    location, with the rows of all locations kept in time order.
+    with_times also returns each kept row's timestamp t.
+    """
+    df = processed.reset_index() if "time" not in processed.columns else processed
+    df = df.assign(time=pd.to_datetime(df["time"])).sort_values("time", kind="stable")
+    features = [c for c in (features or FEATURE_COLUMNS) if c in df.columns]
+    pooled = "location_id" in df.columns and df["location_id"].nunique() > 1
+    keys = ["location_id", "time"] if pooled else ["time"]
+    df = df.drop_duplicates(keys)
+    aqi = df.set_index(keys)["aqi"]
+    targets = []
+    for h in horizons:
+        future = df["time"] + pd.Timedelta(hours=h)
+        if pooled:
+            future = pd.MultiIndex.from_arrays([df["location_id"], future])
+        targets.append(aqi.reindex(future).to_numpy())
+    targets = np.column_stack(targets)
+    X = df[features].to_numpy(dtype=float)
+    keep = ~np.isnan(targets).any(axis=1) & ~np.isnan(X).any(axis=1)
+    if with_times:
+        return X[keep], targets[keep], features, df["time"].to_numpy()[keep]
+    return X[keep], targets[keep], features
+
+
+def train_forecaster(processed, horizons=HORIZONS, path=FORECASTER_PATH, n_estimators=100, max_depth=None,
+                     min_samples_leaf=2, n_jobs=-1, random_state=42, transform_path=None):
+    """
+    Fits one multi-output forest predicting every horizon at once and saves it
+    (plus a JSON side-car with the feature list, horizons and transform artifact)
+    for serving. With transform_path, features are standardized by that artifact
+    here and by scale_features() at serving time; the artifact is copied next to
+    the model, so refitting it later cannot skew a model already being served.
+    """
+    X, Y, features = make_supervised(processed, horizons)
+    if not len(X):
+        raise ValueError(f"Not enough history to train horizons up to {max(horizons)}h")
+    transform = Transform.load(transform_path) if transform_path is not None else None
+    if transform is not None:
+        X = transform.transform_array(X, features)
+    model = RandomForestRegressor(n_estimators=n_estimators, max_depth=max_depth, min_samples_leaf=min_samples_leaf,
+                                  n_jobs=n_jobs, random_state=random_state).fit(X, Y)
+    meta = {"features": features, "horizons": list(horizons), "trained_at": datetime.utcnow().isoformat(),
+            "rows": int(len(X)), "transform": transform and transform.save(transform_snapshot_path(path)),
+            "transform_source": transform_path}
+    save_forecaster(model, meta, path)
+    logging.info(f"✅ Forecaster trained on {len(X)} rows for {len(horizons)} horizons: {path}")
+    return model, meta
+
+
+def save_forecaster(model, meta, path=FORECASTER_PATH):
+    """
+    Writes the JSON side-car, then swaps the model file in atomically, so a
+    serving process that notices the new model always finds its meta.
+    """
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(meta_path(path), "w") as f:
+        json.dump(meta, f, indent=2, default=str)
+    tmp = path + ".tmp"
+    joblib.dump(model, tmp)
+    os.replace(tmp, path)
+
+
+def load_meta(path=FORECASTER_PATH):
+    if not os.path.exists(path) or not os.path.exists(meta_path(path)):
+        return None
+    with open(meta_path(path)) as f:
+        return json.load(f)
+
+
+# -------------------------------
+# INFERENCE
+# -------------------------------
+_transforms = {}   # path -> (mtime, Transform)
+
+
+def scale_features(meta, feature_row):
+    """
+    Applies the transform artifact the forecaster was trained with (if any) to
+    a raw feature row. Returns None when the artifact can't be read, so callers
+    fall back to the legacy model instead of failing the request.
+    """
+    path = meta.get("transform")
+    if path is None:
+        return feature_row
+    try:
+        mtime = os.path.getmtime(path)
+        cached = _transforms.get(path)
+        if cached is None or cached[0] != mtime:
+            cached = _transforms[path] = (mtime, Transform.load(path))
+    except (OSError, ValueError, KeyError) as e:
+        logging.warning(f"❌ Transform artifact {path} unreadable, forecaster skipped: {e}")
+        return None
+    return cached[1].transform_array(feature_row, meta["features"])
+
+
+def local_now(location=None):
+    """
+    Wall-clock now at a location as a naive timestamp, the form the store keeps
+    times in (Open-Meteo returns local times). An "auto" timezone is
+    approximated from the longitude; no location means server-local time.
+    """
+    if location is None:
+        return pd.Timestamp.now()
+    timezone = location.get("timezone", "auto")
+    if timezone != "auto":
+        return pd.Timestamp.now(tz=timezone).tz_localize(None)
+    return pd.Timestamp.now(tz="UTC").tz_localize(None) + pd.Timedelta(hours=round(location["lon"] / 15))
+
+
+def latest_features(location_id, features, now=None, store_dir=dp.PROCESSED_STORE, max_age=MAX_FEATURE_AGE):
+    """
+    The newest processed row for a location as a (1 x n_features) array plus
+    its timestamp, read from the last couple of days of partitions only.
+    Returns None when the location has no row within max_age of now, which
+    must be the location's local time (see local_now).
+    """
+    now = pd.Timestamp(now) if now is not None else pd.Timestamp.now()
+    recent = read_partitioned(store_dir, columns=features, city=location_id, start=now - pd.Timedelta(days=2), end=now)
+    if recent is None:
+        return None
+    row = recent.iloc[-1]
+    if now - row["time"] > max_age or row[features].isna().any():
+        return None
+    return row[features].to_numpy(dtype=float).reshape(1, -1), row["time"]
+
+
+def feature_sample(location_ids, features, rows, store_dir=dp.PROCESSED_STORE):
+    """Up to `rows` complete feature rows spread evenly over the stored history of the given locations."""
+    frames = [read_partitioned(store_dir, columns=features, city=location_id) for location_id in location_ids]
+    frames = [f for f in frames if f is not None]
+    if not frames:
+        return np.empty((0, len(features)))
+    X = pd.concat(frames)[features].dropna().to_numpy(dtype=float)
+    if len(X) > rows:
+        X = X[np.linspace(0, len(X) - 1, rows).astype(int)]
+    return X
+
+
+def daily_history(location_id, days=7, now=None, store_dir=dp.PROCESSED_STORE, columns=POLLUTANT_COLUMNS):
+    """Per-pollutant daily means of the last `days` local days from the processed store ({col: [day1..dayN]}), or None."""
+    now = pd.Timestamp(now) if now is not None else pd.Timestamp.now()
+    start = (now - pd.Timedelta(days=days - 1)).normalize()
+    recent = read_partitioned(store_dir, columns=columns, city=location_id, start=start, end=now)
+    if recent is None:
+        return None
+    daily = recent.set_index("time")[columns].resample("D").mean()
+    if len(daily) < days or daily.isna().any().any():
+        return None
+    return {c: [round(float(v), 2) for v in daily[c]] for c in columns}
+
+
+def forecast_hours(predict, meta, feature_row, issued_at, max_horizon=MAX_HORIZON):
+    """One predict call for all horizons; returns [{"time", "horizon_h", "predicted_AQI"}, ...] up to max_horizon."""
+    raw = np.asarray(predict(feature_row), dtype=float).reshape(-1)
+    issued_at = pd.Timestamp(issued_at)
+    return [
+        {"time": (issued_at + pd.Timedelta(hours=h)).strftime("%Y-%m-%dT%H:%M"), "horizon_h": h,
+         "predicted_AQI": round(float(v), 2)}
+        for h, v in zip(meta["horizons"], raw) if h <= max_horizon
+    ]
+
+
+def daily_from_hourly(hourly, days=3):
+    """Collapses hourly predictions into the Day 1..days summary shape the dashboard already renders."""
+    out = []
+    for i in range(days):
+        chunk = hourly[i * 24:(i + 1) * 24]
+        if not chunk:
+            break
+        day = pd.Timestamp(chunk[-1]["time"]).strftime("%Y-%m-%d")
+        out.append({"date": day, "day": f"Day {i + 1}",
+                    "predicted_AQI": round(float(np.mean([p["predicted_AQI"] for p in chunk])), 2)})
+    return out
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--city", default=dp.CITY)
+    parser.add_argument("--max-horizon", type=int, default=MAX_HORIZON)
+    args = parser.parse_args()
+    history = dp.load_processed(city=args.city)
+    if history is None:
+        raise SystemExit(f"No processed history for {args.city}; run the pipeline first.")
+    transform = dp.transform_path(args.city)
+    train_forecaster(history, horizons=list(range(1, args.max_horizon + 1)),
+                     transform_path=transform if os.path.exists(transform) else None)
@@ -0,0 +1,252 @@
+import copy
+import json
+import logging
+import os
+
+import numpy as np
+import pandas as pd
+
+from src import data_preprocessing as dp
+from src.data_ingestion import read_watermark, watermark_path
+from src.metrics import stage
+from src.storage import city_slug, read_partitioned, upsert_partitioned
+from src.streaming_preprocessing import CONTEXT_ROWS
+
+STATE_DIR = "data/processed/state"
+
+
+# -------------------------------
+# QUANTILE SKETCH
+# -------------------------------
+class QuantileSketch:
+    """
+    Fixed-size weighted sample of a column's distribution. While it has seen
+    at most `capacity` values it is exact (same answer as Series.quantile);
+    beyond that it is compacted to `capacity` evenly spaced quantile points,
+    which keeps rank error around 1/capacity.
+    """
+
+    def __init__(self, capacity=4096, values=None, weights=None):
+        self.capacity = capacity
+        self.values = np.asarray(values if values is not None else [], dtype=float)
+        self.weights = np.asarray(weights if weights is not None else [], dtype=float)
+
+    @property
+    def count(self):
+        return float(self.weights.sum())
+
+    def update(self, values):
+        values = np.asarray(values, dtype=float)
+        values = values[~np.isnan(values)]
+        if not len(values):
+            return
+        merged = np.concatenate([self.values, values])
+        weights = np.concatenate([self.weights, np.ones(len(values))])
+        order = np.argsort(merged, kind="stable")
+        self.values, self.weights = merged[order], weights[order]
+        if len(self.values) > self.capacity:
+            self._compact()
+
+    def _compact(self):
+        total = self.count
+        centers = np.cumsum(self.weights) - self.weights / 2
+        targets = (np.arange(self.capacity) + 0.5) * total / self.capacity
+        self.values = np.interp(targets, centers, self.values)
+        self.weights = np.full(self.capacity, total / self.capacity)
+
+    def quantile(self, q):
+        if not len(self.values):
+            return np.nan
+        if np.all(self.weights == 1):
+            return np.quantile(self.values, q)
+        centers = np.cumsum(self.weights) - self.weights / 2
+        return float(np.interp(q * self.count, centers, self.values))
+
+
+# -------------------------------
+# PERSISTED STATE
+# -------------------------------
+def state_path(city=dp.CITY, state_dir=STATE_DIR):
+    return os.path.join(state_dir, f"{city_slug(city)}_features.npz")
+
+
+def save_state(state, path):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    arrays = {}
+    for col, sketch in state["sketches"].items():
+        arrays[f"values__{col}"] = sketch.values
+        arrays[f"weights__{col}"] = sketch.weights
+    meta = {
+        "last_time": state["last_time"].isoformat(),
+        "carry": state["carry"],
+        "aqi_tail": state["aqi_tail"],
+        "capacity": next(iter(state["sketches"].values())).capacity if state["sketches"] else 4096,
+    }
+    tmp = path + ".tmp.npz"
+    np.savez_compressed(tmp, meta=np.array(json.dumps(meta)), **arrays)
+    os.replace(tmp, path)
+
+
+def load_state(path):
+    if not os.path.exists(path):
+        return None
+    with np.load(path) as data:
+        meta = json.loads(str(data["meta"]))
+        sketches = {
+            key.split("__", 1)[1]: QuantileSketch(meta["capacity"], data[key], data["weights__" + key.split("__", 1)[1]])
+            for key in data.files if key.startswith("values__")
+        }
+    return {
+        "last_time": pd.Timestamp(meta["last_time"]),
+        "carry": meta["carry"],
+        "aqi_tail": meta["aqi_tail"],
+        "sketches": sketches,
+    }
+
+
+# -------------------------------
+# FEATURE STEPS
+# -------------------------------
+def _impute(df, carry):
+    df = dp.to_datetime_index(df, ts_col="time").replace("", np.nan).ffill()
+    if carry:
+        df = df.fillna(pd.Series(carry, dtype=float))
+    return df
+
+
+def _features(df, aqi_tail):
+    df = dp.add_time_features(df)
+    context = pd.DataFrame({"aqi": np.asarray(aqi_tail, dtype=float)})
+    history = pd.concat([context, df[["aqi"]].reset_index(drop=True)], ignore_index=True)
+    history = dp.add_lags_and_rolls(dp.add_aqi_change(history))
+    derived = [c for c in history.columns if c != "aqi"]
+    df[derived] = history[derived].iloc[len(context):].to_numpy()
+    if not len(context):
+        # Matches the full run, where the very first row has no previous AQI
+        df.iloc[:1, df.columns.get_loc("aqi_pct_change")] = 0
+    return df, history["aqi"].iloc[-CONTEXT_ROWS:].tolist()
+
+
+def _bounds(sketches):
+    return {c: dp.iqr_bounds(s.quantile(0.25), s.quantile(0.75)) for c, s in sketches.items()}
+
+
+def _carry(df):
+    last = df.iloc[-1]
+    return {c: float(v) for c, v in last.items() if isinstance(v, (int, float, np.number)) and not pd.isna(v)}
+
+
+# -------------------------------
+# INCREMENTAL ENGINE
+# -------------------------------
+def bootstrap(raw_history, city=dp.CITY, path=None, capacity=4096, settled_until=None):
+    """
+    Full preprocessing run that also seeds the incremental state, as of the
+    last row at or before `settled_until` (see update_features).
+    """
+    path = path or state_path(city)
+    imputed = dp.impute_missing(dp.to_datetime_index(raw_history.copy(), ts_col="time"))
+    imputed = dp.compute_aqi(imputed)
+    settled = imputed if settled_until is None else imputed[imputed.index <= settled_until]
+    if settled.empty:
+        settled = imputed
+    sketches = {}
+    for col in dp.CAP_COLUMNS:
+        if col in settled.columns:
+            sketches[col] = QuantileSketch(capacity)
+            sketches[col].update(settled[col].to_numpy())
+
+    processed = dp.preprocess_data(raw_history, city=city)
+    capped_aqi = settled["aqi"].clip(*dp.iqr_bounds(imputed["aqi"].quantile(0.25), imputed["aqi"].quantile(0.75)))
+    save_state({
+        "last_time": settled.index.max(),
+        "carry": _carry(settled.drop(columns=["aqi", "dominant_pollutant"])),
+        "aqi_tail": capped_aqi.iloc[-CONTEXT_ROWS:].tolist(),
+        "sketches": sketches,
+    }, path)
+    return processed
+
+
+def _featurize(new_raw, state, city):
+    """Features for raw rows that follow `state`, upserted into the processed store; advances `state` in place."""
+    with stage("impute", rows=len(new_raw)):
+        df = _impute(new_raw.copy(), state["carry"])
+    with stage("aqi", rows=len(df)):
+        df = dp.compute_aqi(df)
+    with stage("outlier_capping", rows=len(df)):
+        for col, sketch in state["sketches"].items():
+            if col in df.columns:
+                sketch.update(df[col].to_numpy())
+        carry = _carry(df.drop(columns=["aqi", "dominant_pollutant"]))
+        last_time = df.index.max()
+        df = dp.cap_outliers_iqr(df, _bounds(state["sketches"]))
+
+    with stage("features") as record:
+        df, aqi_tail = _features(df, state["aqi_tail"])
+        df = df.dropna()
+        record["rows"] = len(df)
+    with stage("save", rows=len(df)):
+        df_reset = dp.store_dtypes(df.reset_index())
+        upsert_partitioned(df_reset.assign(location_id=city_slug(city)), dp.PROCESSED_STORE, city)
+
+    state.update(last_time=last_time, carry=carry, aqi_tail=aqi_tail)
+    return df
+
+
+def update_features(new_raw, city=dp.CITY, path=None, settled_until=None):
+    """
+    Computes features for raw rows newer than the stored state and upserts them
+    into the processed store. Work is proportional to the new rows: the state
+    carries the last imputed values, the last CONTEXT_ROWS capped AQI values
+    and a quantile sketch per capped column.
+
+    Rows after `settled_until` (the ingestion watermark: recent hours whose air
+    quality is still a forecast or whose weather the archive has not filled in)
+    are written too, but the state only advances to the last settled row, so
+    the next run re-featurizes them from there once ingestion has refetched
+    them. None treats every row as settled.
+
+    Older rows keep the caps they were written with; only a full run
+    (bootstrap) re-caps the whole history against the latest quantiles.
+    Returns the new processed rows.
+    """
+    path = path or state_path(city)
+    state = load_state(path)
+    if state is None:
+        raise FileNotFoundError(f"No feature state at {path}; run bootstrap() first")
+
+    new_raw = new_raw[pd.to_datetime(new_raw["time"]) > state["last_time"]]
+    if new_raw.empty:
+        logging.info("✅ No new rows for feature computation.")
+        return new_raw
+
+    times = pd.to_datetime(new_raw["time"])
+    settled = times <= settled_until if settled_until is not None else pd.Series(True, index=new_raw.index)
+    frames = []
+    if settled.any():
+        frames.append(_featurize(new_raw[settled], state, city))
+        save_state(state, path)
+    if not settled.all():
+        # Provisional rows continue from the settled state, which is not advanced past them
+        frames.append(_featurize(new_raw[~settled], copy.deepcopy(state), city))
+    df = pd.concat(frames)
+    logging.info(f"✅ Incremental features: {len(df)} rows ({int((~settled).sum())} provisional) "
+                 f"upserted into {dp.PROCESSED_STORE}")
+    return df
+
+
+def run_incremental(raw_store_dir=dp.RAW_STORE_DIR, city=dp.CITY):
+    """
+    Pipeline entry point: bootstraps on the first run, afterwards reads only raw
+    rows past the state's watermark, which stops at the ingestion watermark.
+    """
+    path = state_path(city)
+    state = load_state(path)
+    settled_until = read_watermark(watermark_path({"location_id": city}))
+    if state is None:
+        raw = read_partitioned(raw_store_dir, city=city)
+        return None if raw is None else bootstrap(raw, city, path, settled_until=settled_until)
+    new_raw = read_partitioned(raw_store_dir, city=city, start=state["last_time"])
+    if new_raw is None:
+        return pd.DataFrame()
+    return update_features(new_raw, city, path, settled_until=settled_until)
@@ -0,0 +1,28 @@
+import json
+import os
+
+from src.storage import city_slug
+
+LOCATIONS_FILE = os.environ.get("AQI_LOCATIONS_FILE", "config/locations.json")
+
+
+def make_location(name, lat, lon, timezone="auto", location_id=None):
+    """One pipeline location; location_id is the entity key and partition name (defaults to the slug of name)."""
+    return {
+        "name": name,
+        "lat": float(lat),
+        "lon": float(lon),
+        "timezone": timezone,
+        "location_id": location_id or city_slug(name),
+    }
+
+
+def load_locations(path=LOCATIONS_FILE):
+    """Reads the list of locations the pipeline fans out over from a JSON config file."""
+    with open(path) as f:
+        entries = json.load(f)
+    locations = [make_location(**entry) for entry in entries]
+    ids = [loc["location_id"] for loc in locations]
+    if len(set(ids)) != len(ids):
+        raise ValueError(f"Duplicate location_id in {path}: {ids}")
+    return locations
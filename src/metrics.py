@@ -0,0 +1,245 @@
+import contextvars
+import json
+import logging
+import os
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime
+
+# Latency buckets in seconds (Prometheus defaults plus a sub-millisecond bucket for cached paths)
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+REPORT_DIR = "data/reports"
+
+
+# ----------------------------- #
+# Metric types
+# ----------------------------- #
+class Histogram:
+    """Cumulative-bucket histogram with sum and count, as exposed by Prometheus."""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        self.counts = [0] * (len(self.buckets) + 1)   # last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                break
+        else:
+            i = len(self.buckets)
+        self.counts[i] += 1
+        self.sum += value
+        self.count += 1
+
+
+def _labels(labels):
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _format_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (v.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in pairs)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+
+class MetricsRegistry:
+    """Thread-safe counters, gauges and histograms keyed by (name, labels), rendered in Prometheus text format."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics = {}   # name -> (type, help, {labels: value or Histogram})
+
+    def _series(self, kind, name, help_text):
+        entry = self._metrics.get(name)
+        if entry is None:
+            entry = self._metrics[name] = (kind, help_text, {})
+        elif entry[0] != kind:
+            raise ValueError(f"Metric {name} already registered as a {entry[0]}")
+        return entry[2]
+
+    def inc(self, name, value=1, help_text="", **labels):
+        with self._lock:
+            series = self._series("counter", name, help_text)
+            key = _labels(labels)
+            series[key] = series.get(key, 0) + value
+
+    def set(self, name, value, help_text="", **labels):
+        with self._lock:
+            self._series("gauge", name, help_text)[_labels(labels)] = value
+
+    def observe(self, name, value, help_text="", buckets=DEFAULT_BUCKETS, **labels):
+        with self._lock:
+            series = self._series("histogram", name, help_text)
+            key = _labels(labels)
+            if key not in series:
+                series[key] = Histogram(buckets)
+            series[key].observe(value)
+
+    @contextmanager
+    def time(self, name, help_text="", **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, help_text, **labels)
+
+    def get(self, name, **labels):
+        entry = self._metrics.get(name)
+        return None if entry is None else entry[2].get(_labels(labels))
+
+    def render(self):
+        lines = []
+        with self._lock:
+            for name, (kind, help_text, series) in sorted(self._metrics.items()):
+                if help_text:
+                    lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} {kind}")
+                for labels, value in sorted(series.items()):
+                    if kind != "histogram":
+                        lines.append(f"{name}{_format_labels(labels)} {value}")
+                        continue
+                    cumulative = 0
+                    for bound, count in zip(value.buckets + ("+Inf",), value.counts):
+                        cumulative += count
+                        le = bound if bound == "+Inf" else repr(float(bound))
+                        lines.append(f"{name}_bucket{_format_labels(labels, [('le', le)])} {cumulative}")
+                    lines.append(f"{name}_sum{_format_labels(labels)} {value.sum}")
+                    lines.append(f"{name}_count{_format_labels(labels)} {value.count}")
+        return "\n".join(lines) + "\n"
+
+    def clear(self):
+        with self._lock:
+            self._metrics.clear()
+
+
+REGISTRY = MetricsRegistry()
+
+
+# ----------------------------- #
+# Pipeline stage instrumentation
+# ----------------------------- #
+_current_report = contextvars.ContextVar("aqi_run_report", default=None)
+
+
+class RunReport:
+    """
+    Collects per-stage timings, row counts and peak traced memory for one
+    pipeline run. Activate it with `with report:`; every `stage()` entered
+    meanwhile (in this thread/context) is recorded. Peak memory comes from
+    tracemalloc, which is started for the duration of the report when
+    trace_memory is set and not already running.
+    """
+
+    def __init__(self, name="pipeline", trace_memory=True):
+        self.name = name
+        self.trace_memory = trace_memory
+        self.stages = []
+        self.started_at = None
+        self.seconds = None
+        self._stack = []
+        self._started_tracing = False
+        self._token = None
+
+    def __enter__(self):
+        self.started_at = datetime.utcnow().isoformat()
+        self._start = time.perf_counter()
+        if self.trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracing = True
+        self._token = _current_report.set(self)
+        return self
+
+    def __exit__(self, *exc):
+        _current_report.reset(self._token)
+        self.seconds = time.perf_counter() - self._start
+        if self._started_tracing:
+            tracemalloc.stop()
+            self._started_tracing = False
+        return False
+
+    def _enter_stage(self):
+        if not tracemalloc.is_tracing():
+            return
+        # reset_peak() is global, so fold the peak so far into every open parent stage first
+        peak = tracemalloc.get_traced_memory()[1]
+        for record in self._stack:
+            record["_peak"] = max(record["_peak"], peak)
+        tracemalloc.reset_peak()
+
+    def _exit_stage(self, record):
+        if tracemalloc.is_tracing():
+            current, peak = tracemalloc.get_traced_memory()
+            record["_peak"] = max(record["_peak"], peak)
+            record["peak_memory_mb"] = round((record["_peak"] - record.pop("_base")) / 1e6, 3)
+            for parent in self._stack:
+                parent["_peak"] = max(parent["_peak"], record["_peak"])
+        record.pop("_peak")
+
+    def add(self, records):
+        """Merges stage records produced elsewhere (e.g. by a worker process)."""
+        self.stages.extend(records)
+
+    def to_dict(self):
+        totals = {}
+        for record in self.stages:
+            total = totals.setdefault(record["stage"], {"seconds": 0.0, "rows": 0, "calls": 0, "peak_memory_mb": None})
+            total["seconds"] += record["seconds"]
+            total["rows"] += record.get("rows") or 0
+            total["calls"] += 1
+            if record.get("peak_memory_mb") is not None:
+                total["peak_memory_mb"] = max(total["peak_memory_mb"] or 0.0, record["peak_memory_mb"])
+        return {
+            "name": self.name,
+            "started_at": self.started_at,
+            "seconds": self.seconds,
+            "stages": self.stages,
+            "totals": totals,
+        }
+
+    def write(self, report_dir=REPORT_DIR):
+        """Writes the report as <report_dir>/<name>_<timestamp>.json and <name>_latest.json; returns the path."""
+        os.makedirs(report_dir, exist_ok=True)
+        stamp = datetime.utcnow().strftime("%Y%m%dT%H%M%S")
+        path = os.path.join(report_dir, f"{self.name}_{stamp}.json")
+        body = json.dumps(self.to_dict(), indent=2, default=str)
+        for target in (path, os.path.join(report_dir, f"{self.name}_latest.json")):
+            with open(target, "w") as f:
+                f.write(body)
+        logging.info(f"📊 Run report saved: {path}")
+        return path
+
+
+@contextmanager
+def stage(name, rows=None, **labels):
+    """
+    Times a pipeline stage. Set record["rows"] inside the block if the row count
+    is only known afterwards. Durations always go to the process-wide registry;
+    the full record (rows, peak memory) goes to the active RunReport, if any.
+    """
+    report = _current_report.get()
+    record = {"stage": name, "rows": rows, **labels}
+    if report is not None:
+        report._enter_stage()
+        if tracemalloc.is_tracing():
+            record["_base"] = tracemalloc.get_traced_memory()[0]
+            record["_peak"] = 0
+        report._stack.append(record)
+    start = time.perf_counter()
+    try:
+        yield record
+    finally:
+        record["seconds"] = time.perf_counter() - start
+        if report is not None:
+            report._stack.pop()
+            if "_peak" in record:
+                report._exit_stage(record)
+            report.stages.append(record)
+        REGISTRY.observe("aqi_pipeline_stage_seconds", record["seconds"], "Pipeline stage duration", stage=name)
+        if record.get("rows") is not None:
+            REGISTRY.inc("aqi_pipeline_stage_rows_total", record["rows"], "Rows produced by a pipeline stage", stage=name)
@@ -0,0 +1,208 @@
+import logging
+import os
+import shutil
+import threading
+import time
+
+import joblib
+import numpy as np
+
+from src.upstream import LatencyTracker
+
+
+# ----------------------------- #
+# Flattened tree-array inference
+# ----------------------------- #
+class FlatForest:
+    """
+    All trees of a fitted sklearn forest (or single tree) concatenated into flat
+    node arrays. Prediction walks every (row, tree) pair one level per NumPy
+    step, with no per-tree Python or estimator overhead, which is what makes
+    single-row requests fast. Arrays are stored as .npy files so workers can
+    memory-map them and share one copy through the page cache.
+    """
+
+    FIELDS = ("feature", "threshold", "left", "right", "value", "roots")
+
+    def __init__(self, feature, threshold, left, right, value, roots):
+        self.feature = feature
+        self.threshold = threshold
+        self.left = left
+        self.right = right
+        self.value = value
+        self.roots = roots
+
+    @classmethod
+    def from_estimator(cls, model):
+        trees = [est.tree_ for est in getattr(model, "estimators_", [model])]
+        offsets = np.cumsum([0] + [t.node_count for t in trees[:-1]])
+        feature, threshold, left, right, value = [], [], [], [], []
+        for offset, t in zip(offsets, trees):
+            is_leaf = t.children_left == -1
+            feature.append(np.where(is_leaf, -1, t.feature).astype(np.int32))
+            threshold.append(t.threshold.astype(np.float64))
+            left.append(np.where(is_leaf, -1, t.children_left + offset).astype(np.int32))
+            right.append(np.where(is_leaf, -1, t.children_right + offset).astype(np.int32))
+            value.append(t.value[:, :, 0].astype(np.float64))
+        return cls(
+            np.concatenate(feature), np.concatenate(threshold), np.concatenate(left),
+            np.concatenate(right), np.concatenate(value), offsets.astype(np.int32),
+        )
+
+    def save(self, directory):
+        os.makedirs(directory, exist_ok=True)
+        for name in self.FIELDS:
+            np.save(os.path.join(directory, f"{name}.npy"), getattr(self, name))
+
+    @classmethod
+    def load(cls, directory, mmap=True):
+        return cls(*[np.load(os.path.join(directory, f"{name}.npy"), mmap_mode="r" if mmap else None)
+                     for name in cls.FIELDS])
+
+    def predict(self, X):
+        # sklearn compares float32 features against float64 thresholds
+        X = np.asarray(X, dtype=np.float32)
+        n = len(X)
+        node = np.broadcast_to(self.roots, (n, len(self.roots))).copy()
+        rows = np.arange(n)[:, None]
+        while True:
+            feature = self.feature[node]
+            internal = feature >= 0
+            if not internal.any():
+                break
+            go_left = X[rows, np.maximum(feature, 0)] <= self.threshold[node]
+            step = np.where(go_left, self.left[node], self.right[node])
+            node = np.where(internal, step, node)
+        out = self.value[node].mean(axis=1)
+        return out[:, 0] if out.shape[1] == 1 else out
+
+
+# ----------------------------- #
+# Registry
+# ----------------------------- #
+def _rss_mb():
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1e6
+    except (OSError, ValueError):
+        return None
+
+
+class ModelRegistry:
+    """
+    Lazily loads the model on first use and hot-swaps it when the file on disk
+    changes (checked at most every `check_interval` seconds), so a retrained
+    model is picked up without restarting workers.
+
+    mmap=True passes mmap_mode="r" to joblib.load. That does not share a forest
+    between workers: sklearn's Tree.__setstate__ copies the node and value
+    arrays into private memory. compiled=True does: predictions come from a
+    FlatForest cached next to the model (<model>.flat/), whose arrays every
+    worker memory-maps from the same files.
+    """
+
+    def __init__(self, path, check_interval=5.0, mmap=True, compiled=False):
+        self.path = path
+        self.check_interval = check_interval
+        self.mmap = mmap
+        self.compiled = compiled
+        self._lock = threading.Lock()
+        self._current = None   # (model, flat forest or None, version), swapped as one unit
+        self._checked_at = 0.0
+        self.load_seconds = None
+        self.loaded_at = None
+        self.reloads = 0
+        self.latency = LatencyTracker(window=1000, min_samples=1)
+
+    def _file_version(self):
+        st = os.stat(self.path)
+        return f"{st.st_mtime_ns}-{st.st_size}"
+
+    def _load(self, version):
+        start = time.perf_counter()
+        if self.compiled:
+            # The estimator itself is only unpickled when the flat arrays need rebuilding
+            # or someone asks for .model, so compiled workers don't each hold a full forest
+            flat, model = self._load_compiled(version)
+        else:
+            flat, model = None, self._load_estimator()
+        self._current = (model, flat, version)
+        self.load_seconds = time.perf_counter() - start
+        self.loaded_at = time.time()
+        logging.info(f"📦 Model loaded from {self.path} (version {version}) in {self.load_seconds:.3f}s")
+
+    def _load_estimator(self):
+        return joblib.load(self.path, mmap_mode="r" if self.mmap else None)
+
+    def _load_compiled(self, version):
+        directory = self.path + ".flat"
+        marker = os.path.join(directory, "VERSION")
+        cached = None
+        if os.path.exists(marker):
+            with open(marker) as f:
+                cached = f.read()
+        model = None
+        if cached != version:
+            model = self._load_estimator()
+            tmp = f"{directory}.{os.getpid()}.tmp"
+            FlatForest.from_estimator(model).save(tmp)
+            with open(os.path.join(tmp, "VERSION"), "w") as f:
+                f.write(version)
+            shutil.rmtree(directory, ignore_errors=True)
+            os.replace(tmp, directory)
+        return FlatForest.load(directory, mmap=True), model
+
+    def _ensure_current(self):
+        now = time.monotonic()
+        if self._current is not None and now - self._checked_at < self.check_interval:
+            return self._current
+        with self._lock:
+            if self._current is None or now - self._checked_at >= self.check_interval:
+                self._checked_at = now
+                version = self._file_version()
+                if self._current is None or version != self._current[2]:
+                    if self._current is not None:
+                        self.reloads += 1
+                    self._load(version)
+        return self._current
+
+    def get(self):
+        """The object to call predict() on: the FlatForest when compiled, else the estimator."""
+        model, flat, _ = self._ensure_current()
+        return flat if flat is not None else model
+
+    @property
+    def model(self):
+        """The underlying estimator (e.g. for feature_importances_ or SHAP)."""
+        model, flat, version = self._ensure_current()
+        if model is None:
+            with self._lock:
+                if self._current[0] is None and self._current[2] == version:
+                    self._current = (self._load_estimator(), flat, version)
+                model = self._current[0]
+        return model
+
+    @property
+    def version(self):
+        return self._ensure_current()[2]
+
+    def predict(self, X):
+        model = self.get()
+        start = time.perf_counter()
+        out = model.predict(X)
+        self.latency.record(time.perf_counter() - start)
+        return out
+
+    def stats(self):
+        return {
+            "path": self.path,
+            "loaded": self._current is not None,
+            "version": self._current[2] if self._current is not None else None,
+            "compiled": self.compiled,
+            "load_seconds": self.load_seconds,
+            "loaded_at": self.loaded_at,
+            "reloads": self.reloads,
+            "rss_mb": _rss_mb(),
+            "predict_p50_ms": None if self.latency.percentile(50) is None else self.latency.percentile(50) * 1000,
+            "predict_p99_ms": None if self.latency.percentile(99) is None else self.latency.percentile(99) * 1000,
+        }
@@ -0,0 +1,131 @@
+import os
+import sqlite3
+import threading
+
+import numpy as np
+import pandas as pd
+
+ONLINE_STORE_PATH = os.environ.get("AQI_ONLINE_STORE", "data/online/features.db")
+VIEW_NAME = "karachi_air_features"
+
+# Same schema as the karachi_air_features FeatureView in aqi_feature_store/feature_repo/feature_view.py
+VIEW_FEATURES = [
+    "pm10", "pm2_5", "carbon_monoxide", "nitrogen_dioxide", "sulphur_dioxide", "ozone",
+    "temperature_2m", "relative_humidity_2m", "dew_point_2m", "apparent_temperature",
+    "pressure_msl", "windspeed_10m", "winddirection_10m", "aqi", "aqi_change", "aqi_pct_change",
+]
+
+
+class OnlineStore:
+    """
+    Embedded SQLite online store holding the latest feature row per entity
+    (sensor_id / location_id), with an in-process read-through cache.
+
+    Writes are upserts that only replace a row with a newer event_timestamp, so
+    materialization is incremental and re-running it is harmless. The cache is
+    dropped on every local write and whenever SQLite reports a commit from
+    another connection (PRAGMA data_version), so readers never serve stale rows.
+    """
+
+    def __init__(self, path=ONLINE_STORE_PATH, view=VIEW_NAME, features=VIEW_FEATURES):
+        self.path = path
+        self.view = view
+        self.features = list(features)
+        self._cache = {}
+        self._cache_version = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        # One connection shared under the lock: PRAGMA data_version is per connection
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        columns = ", ".join(f'"{f}" REAL' for f in self.features)
+        with self._lock, self._conn as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                f'CREATE TABLE IF NOT EXISTS "{view}" '
+                f"(entity_key TEXT PRIMARY KEY, event_timestamp TEXT NOT NULL, {columns})"
+            )
+
+    # ----------------------------- #
+    # Materialization
+    # ----------------------------- #
+    def upsert(self, df, entity_col="location_id", time_col="time"):
+        """Writes the newest row per entity from df; returns the number of entities written."""
+        if time_col not in df.columns:
+            df = df.reset_index()
+        latest = df.sort_values(time_col, kind="stable").groupby(entity_col, sort=False).tail(1)
+        features = [f for f in self.features if f in latest.columns]
+        rows = [
+            (str(key), pd.Timestamp(ts).isoformat(), *[None if pd.isna(v) else float(v) for v in values])
+            for key, ts, *values in latest[[entity_col, time_col] + features].itertuples(index=False)
+        ]
+        cols = ", ".join(["entity_key", "event_timestamp"] + [f'"{f}"' for f in features])
+        marks = ", ".join("?" * (len(features) + 2))
+        updates = ", ".join(["event_timestamp = excluded.event_timestamp"] + [f'"{f}" = excluded."{f}"' for f in features])
+        with self._lock, self._conn as conn:
+            conn.executemany(
+                f'INSERT INTO "{self.view}" ({cols}) VALUES ({marks}) '
+                f"ON CONFLICT(entity_key) DO UPDATE SET {updates} "
+                f"WHERE excluded.event_timestamp >= \"{self.view}\".event_timestamp",
+                rows,
+            )
+            # data_version only moves for other connections' commits
+            self._cache = {}
+        return len(rows)
+
+    # ----------------------------- #
+    # Online reads
+    # ----------------------------- #
+    def _sync_cache(self):
+        version = self._conn.execute("PRAGMA data_version").fetchone()[0]
+        if version != self._cache_version:
+            self._cache = {}
+            self._cache_version = version
+
+    def get_online_features(self, entity_keys, features=None):
+        """
+        Batch point lookup. Returns {"entity_key": [...], "event_timestamp": [...], <feature>: [...]}
+        in the order of entity_keys, with None for unknown entities. Features may be
+        given Feast-style as "karachi_air_features:pm10".
+        """
+        features = [f.split(":", 1)[-1] for f in (features or self.features)]
+        keys = [str(k) for k in entity_keys]
+        with self._lock:
+            self._sync_cache()
+            missing = [k for k in dict.fromkeys(keys) if k not in self._cache]
+            self.hits += len(keys) - len(missing)
+            self.misses += len(missing)
+            if missing:
+                cols = ", ".join(["entity_key", "event_timestamp"] + [f'"{f}"' for f in self.features])
+                marks = ", ".join("?" * len(missing))
+                fetched = self._conn.execute(
+                    f'SELECT {cols} FROM "{self.view}" WHERE entity_key IN ({marks})', missing
+                ).fetchall()
+                for row in fetched:
+                    self._cache[row[0]] = dict(zip(["event_timestamp"] + self.features, row[1:]))
+                for k in missing:
+                    self._cache.setdefault(k, None)
+            rows = [self._cache[k] for k in keys]
+
+        out = {"entity_key": keys, "event_timestamp": [r and r["event_timestamp"] for r in rows]}
+        for f in features:
+            out[f] = [r and r[f] for r in rows]
+        return out
+
+    def get_latest(self, entity_key):
+        """One entity's latest feature row as a dict, or None."""
+        result = self.get_online_features([entity_key])
+        if result["event_timestamp"][0] is None:
+            return None
+        return {k: v[0] for k, v in result.items()}
+
+    def to_array(self, entity_keys, features=None):
+        """Feature matrix (len(entity_keys) x len(features)) with NaN for missing values, ready for a model."""
+        features = list(features or self.features)
+        result = self.get_online_features(entity_keys, features)
+        return np.array([[np.nan if v is None else v for v in result[f]] for f in features], dtype=float).T
+
+    def stats(self):
+        return {"path": self.path, "cached_entities": len(self._cache), "hits": self.hits, "misses": self.misses}
@@ -0,0 +1,160 @@
+"""
+HTTP response helpers shared by app.py and asgi.py: precompressed static
+files, cache headers and conditional (ETag / Last-Modified) checks.
+
+    python -m src.responses build    # precompress the React build ahead of time
+"""
+import gzip
+import hashlib
+import mimetypes
+import os
+from email.utils import formatdate, parsedate_to_datetime
+
+try:
+    import brotli
+except ImportError:   # optional: .br variants are only written when brotli is installed
+    brotli = None
+
+# Hashed CRA assets never change under the same name; everything else must revalidate
+IMMUTABLE = "public, max-age=31536000, immutable"
+REVALIDATE = "no-cache"
+COMPRESSIBLE = {".js", ".css", ".html", ".json", ".map", ".svg", ".txt", ".ico"}
+MIN_COMPRESS_BYTES = 1024
+# Paths answered with a JSON 404 instead of the React app
+API_PREFIXES = ("/forecast", "/history", "/model", "/upstream", "/metrics")
+
+
+# ----------------------------- #
+# Static files
+# ----------------------------- #
+def cache_control(relative_path):
+    return IMMUTABLE if relative_path.replace(os.sep, "/").startswith("static/") else REVALIDATE
+
+
+def accepted_encodings(header):
+    """Content codings a client accepts (q > 0) from its Accept-Encoding header."""
+    accepted = set()
+    for part in (header or "").split(","):
+        coding, _, params = part.strip().partition(";")
+        if coding and _qvalue(params.strip()) > 0:
+            accepted.add(coding.strip().lower())
+    return accepted
+
+
+def _qvalue(params):
+    """q-value of one Accept-Encoding entry; a malformed q counts as not acceptable."""
+    if not params.startswith("q="):
+        return 1.0
+    try:
+        return float(params[2:])
+    except ValueError:
+        return 0.0
+
+
+def _compressors():
+    out = [("br", ".br", brotli and (lambda data: brotli.compress(data, quality=11)))]
+    out.append(("gzip", ".gz", lambda data: gzip.compress(data, compresslevel=9, mtime=0)))
+    return out
+
+
+def ensure_variant(full_path, suffix, compress):
+    """The up-to-date `full_path + suffix` (written atomically if missing or older than the source), or None."""
+    variant = full_path + suffix
+    try:
+        source_mtime = os.path.getmtime(full_path)
+        if os.path.exists(variant) and os.path.getmtime(variant) >= source_mtime:
+            return variant
+        if compress is None:
+            return None
+        with open(full_path, "rb") as f:
+            data = compress(f.read())
+        tmp = f"{variant}.{os.getpid()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, variant)
+        return variant
+    except OSError:
+        return None
+
+
+def compressible(full_path):
+    return os.path.splitext(full_path)[1] in COMPRESSIBLE and os.path.getsize(full_path) >= MIN_COMPRESS_BYTES
+
+
+def precompressed_variant(full_path, accept_encoding):
+    """
+    (path to send, Content-Encoding or None): the brotli or gzip copy of a
+    static file when the client accepts it. Copies are written next to the
+    file on first use (or ahead of time by precompress()).
+    """
+    accepted = accepted_encodings(accept_encoding)
+    if not accepted or not compressible(full_path):
+        return full_path, None
+    for encoding, suffix, compress in _compressors():
+        if encoding in accepted:
+            variant = ensure_variant(full_path, suffix, compress)
+            if variant is not None:
+                return variant, encoding
+    return full_path, None
+
+
+def content_type(full_path):
+    return mimetypes.guess_type(full_path)[0] or "application/octet-stream"
+
+
+def precompress(root):
+    """Writes .gz (and .br with brotli installed) copies of every compressible file under root."""
+    written = 0
+    for directory, _, files in os.walk(root):
+        for name in files:
+            path = os.path.join(directory, name)
+            if name.endswith((".gz", ".br", ".tmp")) or not compressible(path):
+                continue
+            for _, suffix, compress in _compressors():
+                written += ensure_variant(path, suffix, compress) is not None
+    return written
+
+
+def is_api_path(path):
+    return any(path == p or path.startswith(p + "/") for p in API_PREFIXES)
+
+
+# ----------------------------- #
+# Conditional responses
+# ----------------------------- #
+def etag_for(*parts):
+    return hashlib.sha1(repr(parts).encode()).hexdigest()[:20]
+
+
+def http_date(epoch):
+    return formatdate(epoch, usegmt=True)
+
+
+def not_modified(if_none_match, if_modified_since, etag, last_modified):
+    """
+    True when the client's copy is current: If-None-Match (weak comparison)
+    wins when present, otherwise If-Modified-Since against last_modified
+    (epoch seconds).
+    """
+    if if_none_match:
+        tags = [t.strip().removeprefix("W/").strip('"') for t in if_none_match.split(",")]
+        return "*" in tags or etag in tags
+    if if_modified_since:
+        try:
+            return int(last_modified) <= parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return False
+    return False
+
+
+def gzip_json(body, accept_encoding, level=6):
+    """(bytes, "gzip") for JSON bodies worth compressing when the client accepts gzip, else (body, None)."""
+    if len(body) < MIN_COMPRESS_BYTES or "gzip" not in accepted_encodings(accept_encoding):
+        return body, None
+    return gzip.compress(body, compresslevel=level, mtime=0), "gzip"
+
+
+if __name__ == "__main__":
+    import sys
+    root = sys.argv[1] if len(sys.argv) > 1 else "build"
+    print(f"🗜️ Wrote {precompress(root)} compressed variants under {root}")
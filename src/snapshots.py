@@ -0,0 +1,174 @@
+import json
+import logging
+import os
+import random
+import sqlite3
+import threading
+import time
+import zlib
+from datetime import datetime, timezone
+
+SNAPSHOT_PATH = os.environ.get("AQI_SNAPSHOT_STORE", "data/online/snapshots.db")
+SNAPSHOT_INTERVAL = float(os.environ.get("SNAPSHOT_INTERVAL", 900))
+SNAPSHOT_JITTER = float(os.environ.get("SNAPSHOT_JITTER", 0.1))
+# Snapshots older than this are ignored and /forecast computes live instead
+SNAPSHOT_MAX_AGE = float(os.environ.get("SNAPSHOT_MAX_AGE", 3 * SNAPSHOT_INTERVAL))
+
+
+# ----------------------------- #
+# Snapshot store
+# ----------------------------- #
+class SnapshotStore:
+    """
+    Latest precomputed forecast per location, as zlib-compressed JSON in SQLite
+    so every server process (and a refresher running alongside) shares it.
+    Reads go through an in-process cache that is dropped on local writes and
+    whenever another connection commits (PRAGMA data_version), as in OnlineStore.
+    """
+
+    def __init__(self, path=SNAPSHOT_PATH):
+        self.path = path
+        self._cache = {}
+        self._cache_version = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self._conn = None
+
+    def _db(self):
+        """The connection, opened (with the schema) on first use so creating a store touches no files; needs the lock."""
+        if self._conn is None:
+            if os.path.dirname(self.path):
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            with conn:
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS snapshots "
+                    "(location_id TEXT PRIMARY KEY, as_of REAL NOT NULL, payload BLOB NOT NULL)"
+                )
+            self._conn = conn
+        return self._conn
+
+    def put(self, location_id, payload, as_of=None):
+        as_of = time.time() if as_of is None else as_of
+        blob = zlib.compress(json.dumps(payload, separators=(",", ":")).encode())
+        with self._lock, self._db() as conn:
+            conn.execute(
+                "INSERT INTO snapshots VALUES (?, ?, ?) "
+                "ON CONFLICT(location_id) DO UPDATE SET as_of = excluded.as_of, payload = excluded.payload",
+                (str(location_id), as_of, blob),
+            )
+            self._cache.pop(str(location_id), None)
+
+    def get(self, location_id, max_age=SNAPSHOT_MAX_AGE, now=None):
+        """(as_of epoch seconds, payload) of the location's snapshot, or None if missing or older than max_age."""
+        key = str(location_id)
+        now = time.time() if now is None else now
+        with self._lock:
+            if self._conn is None and not os.path.exists(self.path):
+                # Nothing has written a snapshot yet; a read alone must not create the store
+                self.misses += 1
+                return None
+            version = self._db().execute("PRAGMA data_version").fetchone()[0]
+            if version != self._cache_version:
+                self._cache = {}
+                self._cache_version = version
+            if key not in self._cache:
+                row = self._db().execute("SELECT as_of, payload FROM snapshots WHERE location_id = ?", (key,)).fetchone()
+                self._cache[key] = row and (row[0], json.loads(zlib.decompress(row[1])))
+            entry = self._cache[key]
+            if entry is None or now - entry[0] > max_age:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return entry
+
+    def stats(self):
+        if self._conn is None and not os.path.exists(self.path):
+            return {"path": self.path, "locations": 0, "payload_bytes": 0, "hits": self.hits, "misses": self.misses}
+        with self._lock:
+            count, size = self._db().execute("SELECT COUNT(*), COALESCE(SUM(LENGTH(payload)), 0) FROM snapshots").fetchone()
+        return {"path": self.path, "locations": count, "payload_bytes": size, "hits": self.hits, "misses": self.misses}
+
+
+def iso(as_of):
+    return datetime.fromtimestamp(as_of, timezone.utc).isoformat(timespec="seconds")
+
+
+# ----------------------------- #
+# Background refresher
+# ----------------------------- #
+class SnapshotRefresher:
+    """
+    Recomputes every location's snapshot every `interval` seconds on a daemon
+    thread. Each wait is stretched or shortened by up to `jitter` (a fraction of
+    the interval), and the first run is delayed by a random fraction of that, so
+    several processes or replicas don't hit the upstream APIs in lockstep.
+    A location whose refresh fails keeps its previous snapshot. after_refresh,
+    if given, is called with {location_id: payload} of each run's successes.
+    """
+
+    def __init__(self, compute, locations, store, interval=SNAPSHOT_INTERVAL, jitter=SNAPSHOT_JITTER,
+                 after_refresh=None):
+        self.compute = compute   # location dict -> JSON-serializable payload; raises instead of returning a fallback
+        self.after_refresh = after_refresh
+        self.locations = locations
+        self.store = store
+        self.interval = interval
+        self.jitter = jitter
+        self.runs = 0
+        self.failures = 0
+        self.last_run = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def refresh_once(self):
+        """Refreshes every location now; returns the number of snapshots written."""
+        results = {}
+        for location in self.locations:
+            try:
+                payload = self.compute(location)
+                self.store.put(location["location_id"], payload)
+                results[location["location_id"]] = payload
+            except Exception as e:
+                self.failures += 1
+                logging.warning(f"❌ [{location['location_id']}] snapshot refresh failed: {e}")
+        written = len(results)
+        if self.after_refresh is not None and results:
+            try:
+                self.after_refresh(results)
+            except Exception as e:
+                logging.warning(f"❌ after-refresh hook failed: {e}")
+        self.runs += 1
+        self.last_run = time.time()
+        logging.info(f"🗂️ Refreshed {written}/{len(self.locations)} forecast snapshots")
+        return written
+
+    def next_delay(self):
+        return self.interval * (1 + random.uniform(-self.jitter, self.jitter))
+
+    def run_forever(self):
+        if self._stop.wait(random.uniform(0, self.jitter * self.interval)):
+            return
+        while True:
+            self.refresh_once()
+            if self._stop.wait(self.next_delay()):
+                return
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self.run_forever, name="snapshot-refresher", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def stats(self):
+        return {"locations": len(self.locations), "interval": self.interval, "runs": self.runs,
+                "failures": self.failures, "last_run": self.last_run and iso(self.last_run),
+                "running": self._thread is not None and self._thread.is_alive()}
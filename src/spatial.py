@@ -0,0 +1,102 @@
+import math
+import os
+from collections import namedtuple
+
+import numpy as np
+
+# Requests are snapped to the centre of a GRID_DEGREES cell (no finer than 0.01°, the
+# cache key precision), or to a configured station within STATION_RADIUS_KM
+GRID_DEGREES = float(os.environ.get("FORECAST_GRID", 0.1))
+STATION_RADIUS_KM = float(os.environ.get("FORECAST_STATION_RADIUS_KM", 5))
+# An uncached grid tile with at least this many cached neighbours is interpolated from them (0 disables)
+IDW_MIN_NEIGHBORS = int(os.environ.get("FORECAST_IDW_NEIGHBORS", 4))
+IDW_POWER = 2
+EARTH_RADIUS_KM = 6371.0
+
+# lat/lon: where the forecast is computed; point: what the client asked for
+Tile = namedtuple("Tile", ["lat", "lon", "location_id", "point"])
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    lat1, lon1, lat2, lon2 = map(np.radians, (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(a))
+
+
+def snap(lat, lon, grid=GRID_DEGREES):
+    """Centre of the grid cell containing (lat, lon)."""
+    return (round((math.floor(lat / grid) + 0.5) * grid, 6), round((math.floor(lon / grid) + 0.5) * grid, 6))
+
+
+def grid_neighbors(lat, lon, grid=GRID_DEGREES):
+    """Centres of the 8 cells around the cell of (lat, lon)."""
+    lat, lon = snap(lat, lon, grid)
+    return [(round(lat + i * grid, 6), round(lon + j * grid, 6))
+            for i in (-1, 0, 1) for j in (-1, 0, 1) if i or j]
+
+
+class SpatialIndex:
+    """
+    Maps arbitrary coordinates to forecast tiles: the nearest configured
+    location (haversine BallTree) when one is within `radius_km`, else the
+    centre of a `grid`-degree cell, so nearby requests share one computation
+    and one cache entry.
+    """
+
+    def __init__(self, locations, grid=GRID_DEGREES, radius_km=STATION_RADIUS_KM):
+        self.locations = list(locations)
+        self.grid = grid
+        self.radius_km = radius_km
+        self._tree = None
+        if self.locations:
+            from sklearn.neighbors import BallTree
+            coords = np.radians([[loc["lat"], loc["lon"]] for loc in self.locations])
+            self._tree = BallTree(coords, metric="haversine")
+
+    def nearest(self, lat, lon, k=1):
+        """[(location, distance_km)] of the k nearest configured locations, closest first."""
+        if self._tree is None:
+            return []
+        dist, idx = self._tree.query(np.radians([[lat, lon]]), k=min(k, len(self.locations)))
+        return [(self.locations[i], float(d * EARTH_RADIUS_KM)) for d, i in zip(dist[0], idx[0])]
+
+    def locate(self, lat, lon, location_id=None):
+        """The Tile serving (lat, lon); an explicit location_id is kept with the requested coordinates."""
+        if location_id:
+            return Tile(lat, lon, location_id, (lat, lon))
+        for loc, distance in self.nearest(lat, lon):
+            if distance <= self.radius_km:
+                return Tile(loc["lat"], loc["lon"], loc["location_id"], (lat, lon))
+        return Tile(*snap(lat, lon, self.grid), None, (lat, lon))
+
+
+# ----------------------------- #
+# Inverse-distance interpolation
+# ----------------------------- #
+def idw_weights(point, centers, power=IDW_POWER):
+    """Normalized 1/d^power weights of `centers` for `point`; a centre at distance 0 takes all the weight."""
+    d = haversine_km(point[0], point[1], *np.asarray(centers, dtype=float).T)
+    if (d == 0).any():
+        return (d == 0).astype(float) / (d == 0).sum()
+    w = 1.0 / d ** power
+    return w / w.sum()
+
+
+def blend(values, weights):
+    """Weighted mean of structurally identical forecast results: numbers are blended, everything else taken from the first."""
+    first = values[0]
+    if isinstance(first, bool) or not isinstance(first, (int, float, dict, list)):
+        return first
+    if isinstance(first, dict):
+        return {k: blend([v[k] for v in values], weights) for k in first}
+    if isinstance(first, list):
+        return [blend([v[i] for v in values], weights) for i in range(len(first))]
+    return round(float(np.dot(weights, values)), 2)
+
+
+def same_shape(a, b):
+    if isinstance(a, dict):
+        return isinstance(b, dict) and a.keys() == b.keys() and all(same_shape(a[k], b[k]) for k in a)
+    if isinstance(a, (list, tuple)):
+        return isinstance(b, (list, tuple)) and len(a) == len(b) and all(same_shape(x, y) for x, y in zip(a, b))
+    return True
@@ -0,0 +1,164 @@
+import os
+import shutil
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+
+# -------------------------------
+# PARTITIONED PARQUET STORE
+# -------------------------------
+# Datasets are laid out as <root>/<city slug>/<yyyy>/<m>/part-*.parquet. The partition keys
+# get private names so they never clash with data columns such as the "year"/"month" features.
+PARTITION_COLS = ["_city", "_year", "_month"]
+PARTITIONING = ds.partitioning(
+    pa.schema([("_city", pa.string()), ("_year", pa.int16()), ("_month", pa.int8())])
+)
+COMPRESSION = "zstd"
+
+
+def city_slug(city):
+    return str(city).strip().lower().replace(" ", "_")
+
+
+def _with_partitions(df, city, time_col):
+    times = pd.to_datetime(df[time_col])
+    return df.assign(**{time_col: times, "_city": city_slug(city), "_year": times.dt.year.astype("int16"),
+                        "_month": times.dt.month.astype("int8")})
+
+
+def _month_filter(start, end):
+    """Partition filter for every (year, month) between start and end, so untouched months are never opened."""
+    months = pd.period_range(pd.Timestamp(start).to_period("M"), pd.Timestamp(end).to_period("M"), freq="M")
+    expr = None
+    for m in months:
+        term = (ds.field("_year") == m.year) & (ds.field("_month") == m.month)
+        expr = term if expr is None else expr | term
+    return expr
+
+
+def write_partitioned(df, root, city, time_col="time"):
+    """
+    Writes df as compressed Parquet partitioned by city/year/month. Only the
+    partitions present in df are replaced; everything else in root is left alone.
+    """
+    if df.empty:
+        return
+    table = pa.Table.from_pandas(_with_partitions(df, city, time_col), preserve_index=False)
+    ds.write_dataset(
+        table, root, format="parquet", partitioning=PARTITIONING,
+        existing_data_behavior="delete_matching",
+        file_options=ds.ParquetFileFormat().make_write_options(compression=COMPRESSION),
+        basename_template="part-{i}.parquet",
+    )
+
+
+def upsert_partitioned(df, root, city, time_col="time"):
+    """Merges df into the partitions it touches, deduplicating on time_col (rows in df win)."""
+    if df.empty:
+        return
+    times = pd.to_datetime(df[time_col])
+    existing = read_partitioned(root, city=city, start=times.min().to_period("M").start_time,
+                                end=times.max().to_period("M").end_time, time_col=time_col)
+    df = df.assign(**{time_col: times})
+    if existing is not None:
+        df = pd.concat([existing, df], ignore_index=True).drop_duplicates(subset=time_col, keep="last")
+    write_partitioned(df.sort_values(time_col, kind="stable"), root, city, time_col)
+
+
+def read_partitioned(root, columns=None, start=None, end=None, city=None, time_col="time"):
+    """
+    Loads a time-sorted slice of the dataset. Partition pruning and Parquet
+    predicate pushdown mean only the requested columns of the matching
+    city/months are read from disk. start and end are inclusive.
+    Returns None when nothing is stored yet.
+    """
+    if not os.path.isdir(root):
+        return None
+    dataset = ds.dataset(root, format="parquet", partitioning=PARTITIONING)
+
+    filters = []
+    if city is not None:
+        filters.append(ds.field("_city") == city_slug(city))
+    if start is not None and end is not None:
+        filters.append(_month_filter(start, end))
+    if start is not None:
+        start = pd.Timestamp(start)
+        filters.append(ds.field("_year") >= start.year)
+        filters.append(ds.field(time_col) >= pa.scalar(start.to_datetime64()))
+    if end is not None:
+        end = pd.Timestamp(end)
+        filters.append(ds.field("_year") <= end.year)
+        filters.append(ds.field(time_col) <= pa.scalar(end.to_datetime64()))
+    expr = None
+    for f in filters:
+        expr = f if expr is None else expr & f
+
+    if columns is not None:
+        columns = list(dict.fromkeys([time_col] + [c for c in columns if c != time_col]))
+    df = dataset.to_table(columns=columns, filter=expr).to_pandas()
+    if df.empty:
+        return None
+    df = df.drop(columns=[c for c in PARTITION_COLS if c in df.columns and c not in (columns or [])])
+    return df.sort_values(time_col, kind="stable").reset_index(drop=True)
+
+
+def append_partitioned(df, root, city, part, time_col="time"):
+    """Adds df as new files named part-<part>-*.parquet, keeping whatever the partitions already hold."""
+    if df.empty:
+        return
+    table = pa.Table.from_pandas(_with_partitions(df, city, time_col), preserve_index=False)
+    ds.write_dataset(
+        table, root, format="parquet", partitioning=PARTITIONING,
+        existing_data_behavior="overwrite_or_ignore",
+        file_options=ds.ParquetFileFormat().make_write_options(compression=COMPRESSION),
+        basename_template=f"part-{part}-{{i}}.parquet",
+    )
+
+
+def iter_partitioned(root, city=None, columns=None, batch_rows=100_000, time_col="time"):
+    """
+    Yields the dataset as time-ordered DataFrames of roughly batch_rows rows,
+    reading one month partition at a time so memory never holds the full history.
+    """
+    if not os.path.isdir(root):
+        return
+    dataset = ds.dataset(root, format="parquet", partitioning=PARTITIONING)
+    expr = ds.field("_city") == city_slug(city) if city is not None else None
+    months = {}
+    for fragment in dataset.get_fragments(filter=expr):
+        keys = ds.get_partition_keys(fragment.partition_expression)
+        months.setdefault((keys["_city"], keys["_year"], keys["_month"]), []).append(fragment)
+
+    if columns is not None:
+        columns = list(dict.fromkeys([time_col] + [c for c in columns if c != time_col]))
+    buffer, buffered = [], 0
+    for key in sorted(months):
+        tables = [f.to_table(columns=columns, schema=dataset.schema) for f in sorted(months[key], key=lambda f: f.path)]
+        month = pa.concat_tables(tables).to_pandas()
+        month = month.drop(columns=[c for c in PARTITION_COLS if c in month.columns and c not in (columns or [])])
+        buffer.append(month.sort_values(time_col, kind="stable"))
+        buffered += len(month)
+        while buffered >= batch_rows:
+            batch = pd.concat(buffer, ignore_index=True)
+            yield batch.iloc[:batch_rows].reset_index(drop=True)
+            rest = batch.iloc[batch_rows:]
+            buffer, buffered = [rest], len(rest)
+    if buffered:
+        yield pd.concat(buffer, ignore_index=True)
+
+
+def replace_city(staging_root, root, city):
+    """Swaps the city's partitions in root for the ones built in staging_root."""
+    slug = city_slug(city)
+    target = os.path.join(root, slug)
+    os.makedirs(root, exist_ok=True)
+    if os.path.isdir(target):
+        shutil.rmtree(target)
+    os.replace(os.path.join(staging_root, slug), target)
+    shutil.rmtree(staging_root, ignore_errors=True)
+
+
+def delete_dataset(root):
+    if os.path.isdir(root):
+        shutil.rmtree(root)
@@ -0,0 +1,241 @@
+import logging
+
+import numpy as np
+import pandas as pd
+from sklearn.preprocessing import StandardScaler
+
+from src import data_preprocessing as dp
+from src.storage import append_partitioned, city_slug, iter_partitioned, replace_city
+from src.transform import Transform, numeric_columns
+
+# Rows of capped AQI carried from one chunk into the next so diffs, lags and
+# rolling windows at chunk boundaries see the same history as the in-memory run
+CONTEXT_ROWS = max(max(dp.LAG_FEATURES), max(dp.ROLL_WINDOWS) - 1, 1)
+CHUNK_ROWS = 100_000
+
+
+# -------------------------------
+# EXACT STREAMING QUANTILES
+# -------------------------------
+class ExactQuantiles:
+    """
+    Exact linear-interpolation quantiles (same result as Series.quantile) over
+    data that is replayed in several passes. The first pass counts values; each
+    following pass narrows every needed order statistic with a histogram until
+    its bin is small enough to collect and sort. Memory stays bounded by
+    `bins` and `max_candidates`, not by the number of rows.
+    """
+
+    def __init__(self, columns, qs=(0.25, 0.75), bins=4096, max_candidates=250_000):
+        self.columns = list(columns)
+        self.qs = qs
+        self.bins = bins
+        self.max_candidates = max_candidates
+        self.passes = 0
+        self._count = {c: 0 for c in self.columns}
+        self._min = {c: np.inf for c in self.columns}
+        self._max = {c: -np.inf for c in self.columns}
+        self._targets = None   # {col: {rank: state}}
+        self._values = {}      # {(col, rank): resolved order statistic}
+
+    @property
+    def done(self):
+        return self._targets is not None and all(not t for t in self._targets.values())
+
+    def begin_pass(self):
+        if self._targets is None:
+            return
+        for targets in self._targets.values():
+            for t in targets.values():
+                t["hist"] = np.zeros(self.bins, dtype=np.int64)
+                t["chunks"] = []
+                t["vmin"], t["vmax"] = np.inf, -np.inf
+
+    def update(self, col, values):
+        values = np.asarray(values, dtype=float)
+        values = values[~np.isnan(values)]
+        if self._targets is None:
+            self._count[col] += len(values)
+            if len(values):
+                self._min[col] = min(self._min[col], values.min())
+                self._max[col] = max(self._max[col], values.max())
+            return
+        for t in self._targets[col].values():
+            inside = values[(values >= t["lo"]) & (values <= t["hi"])]
+            if not len(inside):
+                continue
+            t["vmin"] = min(t["vmin"], inside.min())
+            t["vmax"] = max(t["vmax"], inside.max())
+            if t["collect"]:
+                t["chunks"].append(inside)
+            else:
+                idx = np.searchsorted(t["edges"], inside, side="right") - 1
+                t["hist"] += np.bincount(np.minimum(idx, self.bins - 1), minlength=self.bins)
+
+    def end_pass(self):
+        self.passes += 1
+        if self._targets is None:
+            self._targets = {c: {} for c in self.columns}
+            for col in self.columns:
+                for rank in self._ranks(col):
+                    self._targets[col][rank] = self._new_target(self._min[col], self._max[col], 0, self._count[col])
+            return
+        for col, targets in self._targets.items():
+            for rank, t in list(targets.items()):
+                if t["collect"]:
+                    values = np.sort(np.concatenate(t["chunks"]))
+                    self._values[(col, rank)] = values[rank - t["below"]]
+                elif t["vmin"] == t["vmax"]:
+                    self._values[(col, rank)] = t["vmin"]
+                else:
+                    cum = np.cumsum(t["hist"])
+                    j = int(np.searchsorted(cum, rank - t["below"], side="right"))
+                    below = t["below"] + (int(cum[j - 1]) if j else 0)
+                    lo = t["edges"][j]
+                    hi = t["hi"] if j == self.bins - 1 else np.nextafter(t["edges"][j + 1], -np.inf)
+                    targets[rank] = self._new_target(lo, hi, below, int(t["hist"][j]))
+                    continue
+                del targets[rank]
+        if self.passes > 64:
+            raise RuntimeError("ExactQuantiles did not converge")
+
+    def _ranks(self, col):
+        n = self._count[col]
+        ranks = set()
+        for q in self.qs:
+            if n:
+                k = int(np.floor((n - 1) * q))
+                ranks.update([k, min(k + 1, n - 1)])
+        return sorted(ranks)
+
+    def _new_target(self, lo, hi, below, count):
+        return {
+            "lo": lo, "hi": hi, "below": below,
+            "collect": count <= self.max_candidates,
+            "edges": np.linspace(lo, hi, self.bins + 1),
+        }
+
+    def result(self, col, q):
+        n = self._count[col]
+        if not n:
+            return np.nan
+        h = (n - 1) * q
+        k = int(np.floor(h))
+        gamma = h - k
+        a = self._values[(col, k)]
+        b = self._values[(col, min(k + 1, n - 1))]
+        # Same interpolation numpy applies to the two neighbouring order statistics
+        return np.quantile(np.array([a, b]), gamma)
+
+
+# -------------------------------
+# CHUNK STEPS
+# -------------------------------
+class _Imputer:
+    """ffill().bfill() across chunk boundaries: carries the last seen row and back-fills from the first valid values."""
+
+    def __init__(self, first_valid):
+        self.first_valid = first_valid
+        self.carry = None
+
+    def __call__(self, chunk):
+        chunk = chunk.replace("", np.nan).ffill()
+        if self.carry is not None:
+            chunk = chunk.fillna(self.carry)
+        chunk = chunk.fillna(self.first_valid)
+        if len(chunk):
+            self.carry = chunk.iloc[-1]
+        return chunk
+
+
+def _first_valid(chunks):
+    first = None
+    for chunk in chunks():
+        chunk = dp.to_datetime_index(chunk, ts_col="time").replace("", np.nan)
+        values = chunk.bfill().iloc[0] if len(chunk) else None
+        if values is None:
+            continue
+        first = values if first is None else first.fillna(values)
+        if not first.isna().any():
+            break
+    return first
+
+
+def _imputed_chunks(chunks, first_valid):
+    impute = _Imputer(first_valid)
+    for chunk in chunks():
+        chunk = impute(dp.to_datetime_index(chunk, ts_col="time"))
+        yield dp.compute_aqi(chunk)
+
+
+def _cap_bounds(chunks, first_valid):
+    quantiles = None
+    while quantiles is None or not quantiles.done:
+        if quantiles is not None:
+            quantiles.begin_pass()
+        for chunk in _imputed_chunks(chunks, first_valid):
+            if quantiles is None:
+                quantiles = ExactQuantiles([c for c in dp.CAP_COLUMNS if c in chunk.columns])
+            for col in quantiles.columns:
+                quantiles.update(col, chunk[col].to_numpy())
+        if quantiles is None:
+            return {}
+        quantiles.end_pass()
+    return {c: dp.iqr_bounds(quantiles.result(c, 0.25), quantiles.result(c, 0.75)) for c in quantiles.columns}
+
+
+# -------------------------------
+# STREAMING PIPELINE
+# -------------------------------
+def raw_store_chunks(store_dir=dp.RAW_STORE_DIR, city=dp.CITY, chunk_rows=CHUNK_ROWS):
+    """Chunk source for preprocess_data_streaming reading the raw Parquet store month by month."""
+    return lambda: iter_partitioned(store_dir, city=city, batch_rows=chunk_rows)
+
+
+def preprocess_data_streaming(chunks, city=dp.CITY):
+    """
+    Same output as preprocess_data, with peak memory bounded by the chunk size.
+
+    `chunks` is a zero-argument callable returning a fresh iterator of raw,
+    time-ordered DataFrames (e.g. raw_store_chunks()); it is replayed once to
+    find back-fill values, a few times to find the exact IQR caps and once to
+    build features. The transform artifact is fitted with partial_fit.
+    """
+    logging.info("🚀 Starting streaming preprocessing...")
+    first_valid = _first_valid(chunks)
+    if first_valid is None:
+        logging.info("⚠️ No input rows.")
+        return 0
+    bounds = _cap_bounds(chunks, first_valid)
+
+    staging = dp.PROCESSED_STORE + ".staging"
+    context = None
+    rows = 0
+    scaler = StandardScaler()
+    for i, chunk in enumerate(_imputed_chunks(chunks, first_valid)):
+        chunk = dp.cap_outliers_iqr(chunk, bounds)
+        chunk = dp.add_time_features(chunk)
+
+        history = chunk[["aqi"]] if context is None else pd.concat([context, chunk[["aqi"]]])
+        history = dp.add_lags_and_rolls(dp.add_aqi_change(history))
+        derived = [c for c in history.columns if c != "aqi"]
+        chunk[derived] = history[derived].iloc[len(history) - len(chunk):].to_numpy()
+        context = history[["aqi"]].iloc[-CONTEXT_ROWS:]
+
+        chunk = chunk.dropna()
+        df_reset = dp.store_dtypes(chunk.reset_index())
+        append_partitioned(df_reset.assign(location_id=city_slug(city)), staging, city, f"{i:06d}")
+        numeric_cols = numeric_columns(df_reset)
+        if len(df_reset):
+            scaler.partial_fit(df_reset[numeric_cols])
+        rows += len(df_reset)
+        logging.info(f"🧩 Chunk {i}: {len(df_reset)} rows processed")
+
+    if rows:
+        replace_city(staging, dp.PROCESSED_STORE, city)
+    logging.info(f"💾 Unscaled data saved: {dp.PROCESSED_STORE}")
+    if rows:
+        transform_file = Transform.from_scaler(scaler, numeric_cols).save(dp.transform_path(city))
+        logging.info(f"📁 Transform saved: {transform_file}")
+    logging.info(f"✅ Streaming preprocessing complete. Final rows: {rows}")
+    return rows
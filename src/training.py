@@ -0,0 +1,271 @@
+import glob
+import json
+import logging
+import os
+import re
+import shutil
+import time
+from datetime import datetime
+
+import joblib
+import numpy as np
+import pandas as pd
+from joblib import Parallel, delayed
+from sklearn.ensemble import RandomForestRegressor
+from sklearn.model_selection import TimeSeriesSplit
+
+from src import data_preprocessing as dp
+from src import forecasting
+from src.metrics import stage
+from src.transform import Transform
+
+CV_FOLDS = int(os.environ.get("TRAIN_CV_FOLDS", 4))
+INITIAL_TREES = int(os.environ.get("TRAIN_INITIAL_TREES", 100))
+# Warm-started runs add this many trees fitted on the hours since the last run,
+# until the forest reaches MAX_TREES and is rebuilt from scratch on all history
+TREES_PER_RUN = int(os.environ.get("TRAIN_TREES_PER_RUN", 20))
+MAX_TREES = int(os.environ.get("TRAIN_MAX_TREES", 300))
+MIN_FRESH_ROWS = 24
+# Versioned model files (<model>.vNNNN.*) kept next to the served model; older ones are deleted
+KEEP_VERSIONS = int(os.environ.get("TRAIN_KEEP_VERSIONS", 5))
+FOREST_PARAMS = {"max_depth": None, "min_samples_leaf": 2}
+REPORT_HORIZONS = [1, 6, 24, 48, 72]
+
+
+# -------------------------------
+# WALK-FORWARD VALIDATION
+# -------------------------------
+def _score(Y_true, Y_pred, horizons):
+    err = Y_pred - Y_true
+    out = {"mae": float(np.abs(err).mean()), "rmse": float(np.sqrt((err ** 2).mean()))}
+    for h in REPORT_HORIZONS:
+        if h in horizons:
+            out[f"mae_{h}h"] = float(np.abs(err[:, horizons.index(h)]).mean())
+    return out
+
+
+def _run_fold(fold, X, Y, train_idx, test_idx, horizons, n_estimators, random_state):
+    start = time.perf_counter()
+    model = RandomForestRegressor(n_estimators=n_estimators, n_jobs=1, random_state=random_state, **FOREST_PARAMS)
+    model.fit(X[train_idx], Y[train_idx])
+    scores = _score(Y[test_idx], model.predict(X[test_idx]), horizons)
+    return {"fold": fold, "train_rows": int(len(train_idx)), "test_rows": int(len(test_idx)),
+            "seconds": round(time.perf_counter() - start, 3), **scores}
+
+
+def walk_forward_cv(X, Y, horizons, n_folds=CV_FOLDS, n_estimators=INITIAL_TREES, n_jobs=-1, random_state=42,
+                    n_series=1):
+    """
+    Expanding-window folds in time order, one process per fold. Each test block
+    starts max(horizons) hours after its training window ends, so no training
+    target overlaps the test period; rows pooled from n_series locations take
+    n_series rows per hour.
+    """
+    splits = TimeSeriesSplit(n_splits=n_folds, gap=max(horizons) * n_series).split(X)
+    return Parallel(n_jobs=n_jobs)(
+        delayed(_run_fold)(i, X, Y, train_idx, test_idx, list(horizons), n_estimators, random_state)
+        for i, (train_idx, test_idx) in enumerate(splits)
+    )
+
+
+def summarize(folds):
+    keys = [k for k in folds[0] if k not in ("fold", "train_rows", "test_rows", "seconds")]
+    return {k: round(float(np.mean([f[k] for f in folds])), 4) for k in keys}
+
+
+# -------------------------------
+# VERSIONED MODELS
+# -------------------------------
+def versioned_path(path, version):
+    root, ext = os.path.splitext(path)
+    return f"{root}.v{version:04d}{ext}"
+
+
+def latest_version(path):
+    root, ext = os.path.splitext(path)
+    pattern = re.compile(re.escape(os.path.basename(root)) + r"\.v(\d+)" + re.escape(ext) + "$")
+    versions = [int(m.group(1)) for f in glob.glob(f"{root}.v*{ext}") if (m := pattern.search(f))]
+    return max(versions, default=0)
+
+
+def version_files(path, version):
+    versioned = versioned_path(path, version)
+    return [versioned, forecasting.meta_path(versioned), forecasting.transform_snapshot_path(versioned)]
+
+
+def prune_versions(path, keep=KEEP_VERSIONS):
+    """Deletes all but the newest `keep` versions of the model at `path`; returns the versions removed."""
+    latest = latest_version(path)
+    removed = []
+    for version in range(1, latest - keep + 1):
+        files = [f for f in version_files(path, version) if os.path.exists(f)]
+        for f in files:
+            os.remove(f)
+        if files:
+            removed.append(version)
+    return removed
+
+
+def _warm_start_base(path, meta, features, horizons, transform, trees_per_run, max_trees):
+    """
+    The served forest if it can take trees_per_run more trees fitted on the same
+    feature layout and scaling, else None.
+    """
+    if meta is None or not os.path.exists(path):
+        return None
+    if meta.get("features") != features or meta.get("horizons") != list(horizons):
+        return None
+    previous = Transform.load(meta["transform"]) if meta.get("transform") else None
+    if previous != transform:
+        return None
+    model = joblib.load(path)
+    if not isinstance(model, RandomForestRegressor) or model.n_estimators + trees_per_run > max_trees:
+        return None
+    return model
+
+
+# -------------------------------
+# TRAIN STAGE
+# -------------------------------
+def train(processed, path=forecasting.FORECASTER_PATH, horizons=forecasting.HORIZONS, transform_path=None,
+          n_folds=CV_FOLDS, initial_trees=INITIAL_TREES, trees_per_run=TREES_PER_RUN, max_trees=MAX_TREES,
+          keep_versions=KEEP_VERSIONS, n_jobs=-1, random_state=42):
+    """
+    A warm-started (or full) fit of the multi-horizon forecaster. The result is
+    saved as <model>.vNNNN.pkl/.json next to `path` (keeping the newest
+    `keep_versions`) and then published to `path`, which the API hot-reloads.
+    Full runs record walk-forward CV metrics and fold timings. Warm starts skip
+    CV, since its freshly fitted forests would not be the model served; they
+    record the served model's error on the new hours it had not seen instead.
+    The meta also points at a copy of the transform artifact the features were
+    scaled with. Returns the meta, or None when a warm start has no new hours to
+    learn from.
+    """
+    start = time.perf_counter()
+    horizons = list(horizons)
+    with stage("train_prepare") as record:
+        X, Y, features, times = forecasting.make_supervised(processed, horizons, with_times=True)
+        transform = Transform.load(transform_path) if transform_path is not None else None
+        if transform is not None:
+            X = transform.transform_array(X, features)
+        locations = sorted(processed["location_id"].unique()) if "location_id" in processed.columns else []
+        record["rows"] = len(X)
+    n_series = max(1, len(locations))
+    if len(X) < (n_folds + 1) * max(horizons) * n_series:
+        raise ValueError(f"Not enough history for {n_folds} walk-forward folds at {max(horizons)}h horizons")
+
+    previous = forecasting.load_meta(path)
+    model = _warm_start_base(path, previous, features, horizons, transform, trees_per_run, max_trees)
+    fresh = slice(None)
+    if model is not None:
+        fresh = times > np.datetime64(pd.Timestamp(previous["trained_until"]))
+        if fresh.sum() < MIN_FRESH_ROWS:
+            logging.info(f"⏭️ Only {int(fresh.sum())} new training rows since the last run; keeping the model.")
+            return None
+
+    cv, holdout, cv_seconds = None, None, 0.0
+    if model is None:
+        with stage("train_cv", rows=len(X)):
+            cv_start = time.perf_counter()
+            folds = walk_forward_cv(X, Y, horizons, n_folds, initial_trees, n_jobs, random_state, n_series)
+            cv = {"folds": folds, "mean": summarize(folds)}
+            cv_seconds = time.perf_counter() - cv_start
+    else:
+        # Out-of-sample for the model being extended: it was trained before these hours
+        holdout = {"model_version": previous.get("version"), "rows": int(fresh.sum()),
+                   **_score(Y[fresh], model.predict(X[fresh]), horizons)}
+
+    with stage("train_fit") as record:
+        fit_start = time.perf_counter()
+        if model is not None:
+            mode = "warm_start"
+            model.set_params(warm_start=True, n_estimators=model.n_estimators + trees_per_run, n_jobs=n_jobs)
+        else:
+            mode = "full"
+            model = RandomForestRegressor(n_estimators=initial_trees, n_jobs=n_jobs, random_state=random_state,
+                                          **FOREST_PARAMS)
+        model.fit(X[fresh], Y[fresh])
+        record["rows"] = int(len(X[fresh]))
+        fit_seconds = time.perf_counter() - fit_start
+
+    version = latest_version(path) + 1
+    versioned = versioned_path(path, version)
+    meta = {
+        "features": features,
+        "horizons": horizons,
+        # The model keeps its own copy of the scaling it was trained with; preprocessing may refit the original
+        "transform": transform and transform.save(forecasting.transform_snapshot_path(versioned)),
+        "transform_source": transform_path,
+        "locations": locations,
+        "version": version,
+        "mode": mode,
+        "trained_at": datetime.utcnow().isoformat(),
+        "trained_until": str(pd.Timestamp(times[-1])),
+        "rows": int(len(X)),
+        "fit_rows": record["rows"],
+        "n_estimators": model.n_estimators,
+        "cv": cv,
+        "holdout": holdout,
+        "timings": {"cv_seconds": round(cv_seconds, 3), "fit_seconds": round(fit_seconds, 3),
+                    "total_seconds": round(time.perf_counter() - start, 3)},
+    }
+    with stage("train_save"):
+        forecasting.save_forecaster(model, meta, versioned)
+        # Publish: side-car first, then an atomic swap of the served file
+        shutil.copyfile(forecasting.meta_path(versioned), forecasting.meta_path(path))
+        shutil.copyfile(versioned, path + ".tmp")
+        os.replace(path + ".tmp", path)
+        _log_run(path, meta)
+        prune_versions(path, keep_versions)
+
+    error = f"CV MAE {cv['mean']['mae']:.2f}" if cv else f"MAE {holdout['mae']:.2f} on {holdout['rows']} new rows"
+    logging.info(f"✅ Forecaster v{version} ({mode}, {model.n_estimators} trees) trained in "
+                 f"{meta['timings']['total_seconds']:.1f}s; {error}")
+    return meta
+
+
+def _log_run(path, meta):
+    """One line per training run in training_log.jsonl next to the model, to track cost as history grows."""
+    entry = {k: meta[k] for k in ("version", "mode", "trained_at", "rows", "fit_rows", "n_estimators")}
+    entry.update(meta["timings"], cv_mae=meta["cv"] and meta["cv"]["mean"]["mae"],
+                 holdout_mae=meta["holdout"] and meta["holdout"]["mae"])
+    with open(os.path.join(os.path.dirname(path) or ".", "training_log.jsonl"), "a") as f:
+        f.write(json.dumps(entry) + "\n")
+
+
+def train_location(location_id=dp.CITY, path=forecasting.FORECASTER_PATH, **kwargs):
+    """Trains on one location's processed store (with its transform artifact when present)."""
+    processed = dp.load_processed(city=location_id)
+    if processed is None:
+        raise ValueError(f"No processed history for {location_id}")
+    transform = dp.transform_path(location_id)
+    return train(processed, path=path, transform_path=transform if os.path.exists(transform) else None, **kwargs)
+
+
+def train_locations(location_ids, path=forecasting.FORECASTER_PATH, **kwargs):
+    """
+    Trains the one forecaster /forecast serves for every location on their
+    pooled processed history. Each location's transform is fitted on its own
+    history and a single model can't apply all of them, so a pooled model is
+    trained on unscaled features (the forest does not need scaling); a single
+    location is trained as train_location does.
+    """
+    if len(location_ids) == 1:
+        return train_location(location_ids[0], path=path, **kwargs)
+    frames = {location_id: dp.load_processed(city=location_id) for location_id in location_ids}
+    missing = [location_id for location_id, df in frames.items() if df is None]
+    if missing:
+        logging.warning(f"⚠️ No processed history for {', '.join(missing)}; training without them.")
+    frames = [df for df in frames.values() if df is not None]
+    if not frames:
+        raise ValueError(f"No processed history for {', '.join(location_ids)}")
+    return train(pd.concat(frames, ignore_index=True), path=path, **kwargs)
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--city", nargs="+", default=[dp.CITY], help="one or more locations to train on (pooled)")
+    parser.add_argument("--folds", type=int, default=CV_FOLDS)
+    args = parser.parse_args()
+    train_locations(args.city, n_folds=args.folds)
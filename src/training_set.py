@@ -0,0 +1,57 @@
+import logging
+
+import pandas as pd
+
+from src import data_preprocessing as dp
+from src.storage import read_partitioned
+
+# Same as the ttl of the karachi_air_features FeatureView
+FEATURE_TTL = pd.Timedelta(days=7)
+
+
+def _asof_location(entities, location, features, store_dir, ttl, timestamp_col):
+    """As-of joins one location's entity rows against its feature partitions, reading only the months it needs."""
+    history = read_partitioned(
+        store_dir, columns=features, city=location,
+        start=entities[timestamp_col].min() - ttl, end=entities[timestamp_col].max(),
+    )
+    if history is None:
+        return entities.assign(feature_timestamp=pd.NaT)
+    history = history.rename(columns={"time": "feature_timestamp"})
+    history = history.drop(columns=[c for c in ("location_id",) if c in history.columns])
+    return pd.merge_asof(
+        entities, history,
+        left_on=timestamp_col, right_on="feature_timestamp",
+        direction="backward", allow_exact_matches=True, tolerance=ttl,
+    )
+
+
+def build_training_set(entity_df, features=None, store_dir=dp.PROCESSED_STORE, ttl=FEATURE_TTL,
+                       entity_col="location_id", timestamp_col="event_timestamp"):
+    """
+    Point-in-time correct join of entity_df (entity_col, timestamp_col, plus any
+    labels) against the processed feature store. Each row gets the latest feature
+    row at or before its timestamp and no older than ttl, so no future values leak
+    into training; rows with nothing in that window get NaN features.
+
+    Works location by location with a sorted merge_asof, so the cost is a sort
+    plus one pass per location rather than a lookup per row. Rows come back in
+    the order of entity_df, with a feature_timestamp column for auditing.
+    """
+    entities = entity_df.assign(**{timestamp_col: pd.to_datetime(entity_df[timestamp_col])})
+    entities = entities.assign(_row=range(len(entities)))
+    if features is not None:
+        features = [f.split(":", 1)[-1] for f in features]
+
+    parts = []
+    for location, group in entities.groupby(entity_col, sort=False):
+        group = group.sort_values(timestamp_col, kind="stable")
+        parts.append(_asof_location(group, location, features, store_dir, ttl, timestamp_col))
+    if not parts:
+        return entity_df.assign(feature_timestamp=pd.NaT)
+
+    result = pd.concat(parts, ignore_index=True).sort_values("_row").drop(columns="_row")
+    missing = result["feature_timestamp"].isna().sum()
+    if missing:
+        logging.info(f"⚠️ {missing} entity rows had no features within the {ttl} TTL.")
+    return result.set_index(entity_df.index)
@@ -0,0 +1,72 @@
+import json
+import os
+
+import numpy as np
+
+
+def numeric_columns(df):
+    """Columns the pipeline standardizes: every float and integer column, whatever its width."""
+    return [c for c in df.columns if df[c].dtype.kind in "fi"]
+
+
+class Transform:
+    """
+    Standard scaling as a small persisted artifact: column order plus mean and
+    scale arrays. Training and serving apply it on the fly instead of reading a
+    pre-scaled copy of the dataset, so both always use the same parameters.
+    """
+
+    def __init__(self, columns, mean, scale, n_samples=None):
+        self.columns = list(columns)
+        self.mean = np.asarray(mean, dtype=float)
+        self.scale = np.asarray(scale, dtype=float)
+        self.n_samples = n_samples
+        self._index = {c: i for i, c in enumerate(self.columns)}
+
+    def __eq__(self, other):
+        return (isinstance(other, Transform) and self.columns == other.columns
+                and np.array_equal(self.mean, other.mean) and np.array_equal(self.scale, other.scale))
+
+    @classmethod
+    def from_scaler(cls, scaler, columns):
+        """From a fitted (or partial_fit) sklearn StandardScaler; zero-variance columns keep scale 1 as sklearn does."""
+        return cls(columns, scaler.mean_, scaler.scale_, int(np.max(scaler.n_samples_seen_)))
+
+    @classmethod
+    def fit(cls, df, columns=None):
+        from sklearn.preprocessing import StandardScaler
+        columns = list(columns or numeric_columns(df))
+        return cls.from_scaler(StandardScaler().fit(df[columns]), columns)
+
+    def params(self, columns):
+        """mean/scale aligned to `columns`; columns outside the artifact pass through unchanged (0 / 1)."""
+        idx = np.array([self._index.get(c, -1) for c in columns], dtype=int)
+        known = idx >= 0
+        mean = np.where(known, self.mean[idx], 0.0)
+        scale = np.where(known, self.scale[idx], 1.0)
+        return mean, scale
+
+    def transform_array(self, X, columns=None):
+        """(X - mean) / scale for a 2-D array whose columns are `columns` (default: the artifact's order)."""
+        mean, scale = self.params(columns or self.columns)
+        return (np.asarray(X, dtype=float) - mean) / scale
+
+    def apply(self, df):
+        """Scaled copy of df: the artifact's columns present in df are standardized, everything else is kept."""
+        columns = [c for c in self.columns if c in df.columns]
+        out = df.copy()
+        out[columns] = self.transform_array(df[columns].to_numpy(dtype=float), columns)
+        return out
+
+    def save(self, path):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "w") as f:
+            json.dump({"columns": self.columns, "mean": self.mean.tolist(), "scale": self.scale.tolist(),
+                       "n_samples": self.n_samples}, f, indent=2)
+        return path
+
+    @classmethod
+    def load(cls, path):
+        with open(path) as f:
+            data = json.load(f)
+        return cls(data["columns"], data["mean"], data["scale"], data.get("n_samples"))
@@ -0,0 +1,340 @@
+import asyncio
+import logging
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import numpy as np
+import pandas as pd
+import requests
+from requests.adapters import HTTPAdapter
+
+from src.aggregation import aggregate, fill_gaps, hourly_to_array, to_series
+
+POLLUTANTS = ["pm10","pm2_5","carbon_monoxide","nitrogen_dioxide","sulphur_dioxide","ozone"]
+
+OPEN_METEO_AQ_URL = os.environ.get("OPEN_METEO_AQ_URL", "https://air-quality-api.open-meteo.com/v1/air-quality")
+OPENAQ_URL = os.environ.get("OPENAQ_URL", "https://api.openaq.org/v3/measurements")
+
+
+# ----------------------------- #
+# Pooled HTTP session
+# ----------------------------- #
+def make_session(pool_size=32, retries=0):
+    """requests.Session with keep-alive connection pools shared by all request threads."""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retries)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+# ----------------------------- #
+# Circuit breaker + latency tracking
+# ----------------------------- #
+class CircuitBreaker:
+    """
+    Opens after `failure_threshold` consecutive failures and skips the provider
+    for `reset_timeout` seconds, then lets a single probe request through.
+    """
+
+    def __init__(self, failure_threshold=3, reset_timeout=60, clock=time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.clock = clock
+        self.failures = 0
+        self.opened_at = None
+        self._probing = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return "closed"
+        if self.clock() - self.opened_at >= self.reset_timeout:
+            return "half-open"
+        return "open"
+
+    def allow(self):
+        with self._lock:
+            state = self.state
+            if state == "closed":
+                return True
+            if state == "half-open" and not self._probing:
+                self._probing = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self._probing or self.failures >= self.failure_threshold:
+                self.opened_at = self.clock()
+            self._probing = False
+
+
+class LatencyTracker:
+    """Rolling window of successful response times, used to pick the hedge delay."""
+
+    def __init__(self, window=200, min_samples=20):
+        self.samples = deque(maxlen=window)
+        self.min_samples = min_samples
+        self._lock = threading.Lock()
+
+    def record(self, seconds):
+        with self._lock:
+            self.samples.append(seconds)
+
+    def percentile(self, q=95):
+        with self._lock:
+            if len(self.samples) < self.min_samples:
+                return None
+            return float(np.percentile(self.samples, q))
+
+
+# ----------------------------- #
+# Providers
+# ----------------------------- #
+def parse_open_meteo(data, days=7):
+    """Daily means of the first `days` calendar days of the hourly payload, placed by each sample's timestamp."""
+    times, values = hourly_to_array(data.get("hourly", {}), POLLUTANTS)
+    if not len(times):
+        return None
+    _, means = aggregate(times, values, times.min().astype("datetime64[D]"), days)
+    # Empty days take the neighbouring day's mean; a pollutant with no data at all reads 0 as before
+    return to_series(POLLUTANTS, fill_gaps(means))
+
+
+def parse_open_meteo_hourly(data):
+    hourly = data.get("hourly")
+    return hourly if hourly and hourly.get("time") else None
+
+
+def parse_openaq(data, days=7):
+    records = []
+    for rec in data.get("results", []):
+        if rec.get("parameter") in ["pm10","pm25","co","no2","so2","o3"]:
+            records.append({"parameter": rec.get("parameter"), "value": rec.get("value")})
+    if not records:
+        return None
+    df = pd.DataFrame(records)
+    daily_averages = {}
+    mapping = {"pm10":"pm10","pm25":"pm2_5","co":"carbon_monoxide","no2":"nitrogen_dioxide","so2":"sulphur_dioxide","o3":"ozone"}
+    for key, mapped in mapping.items():
+        daily_averages[mapped] = [round(float(df[df["parameter"]==key]["value"].mean()), 2)]*days
+    return daily_averages
+
+
+class Provider:
+    def __init__(self, name, build_request, parse, timeout=10):
+        self.name = name
+        self.build_request = build_request
+        self.parse = parse
+        self.timeout = timeout
+        self.breaker = CircuitBreaker()
+        self.latency = LatencyTracker()
+
+
+def open_meteo_provider(base_url=None, timeout=10):
+    def build_request(lat, lon, start_date, end_date):
+        return base_url or OPEN_METEO_AQ_URL, {
+            "latitude": lat,
+            "longitude": lon,
+            "start_date": str(start_date),
+            "end_date": str(end_date),
+            "hourly": ",".join(POLLUTANTS),
+            "timezone": "auto",   # local calendar days for the daily buckets
+        }
+    return Provider("open-meteo", build_request, parse_open_meteo, timeout)
+
+
+def open_meteo_hourly_provider(base_url=None, timeout=10):
+    """Same request as open_meteo_provider, returning the raw hourly payload for src.aggregation."""
+    provider = open_meteo_provider(base_url, timeout)
+    return Provider("open-meteo-hourly", provider.build_request, parse_open_meteo_hourly, timeout)
+
+
+def openaq_provider(base_url=None, timeout=10):
+    def build_request(lat, lon, start_date, end_date):
+        return base_url or OPENAQ_URL, {
+            "coordinates": f"{lat},{lon}",
+            "radius": 10000,
+            "limit": 1000,
+            "date_from": str(start_date),
+            "date_to": str(end_date),
+        }
+    return Provider("openaq", build_request, parse_openaq, timeout)
+
+
+# ----------------------------- #
+# Hedged fetcher
+# ----------------------------- #
+class _Hedged:
+    """Hedge delay and stats shared by the threaded and asyncio fetchers."""
+
+    def __init__(self, providers, hedge_after=1.5):
+        self.providers = providers
+        self.hedge_after = hedge_after
+
+    def hedge_delay(self, provider):
+        p95 = provider.latency.percentile(95)
+        return self.hedge_after if p95 is None else min(p95, provider.timeout)
+
+    def stats(self):
+        return {
+            p.name: {
+                "breaker": p.breaker.state,
+                "consecutive_failures": p.breaker.failures,
+                "p95_latency": p.latency.percentile(95),
+            }
+            for p in self.providers
+        }
+
+
+class HedgedFetcher(_Hedged):
+    """
+    Queries providers in priority order over a pooled session. The next provider
+    is started as soon as the current one fails, or once it has been outstanding
+    longer than the hedge delay (p95 of its recent latencies, `hedge_after`
+    until enough samples exist). The first successful response wins.
+    Providers whose circuit breaker is open are skipped.
+    """
+
+    def __init__(self, providers, session=None, hedge_after=1.5, max_workers=32):
+        super().__init__(providers, hedge_after)
+        self.session = session or make_session(pool_size=max_workers)
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="upstream")
+
+    def _call(self, provider, lat, lon, start_date, end_date):
+        url, params = provider.build_request(lat, lon, start_date, end_date)
+        start = time.perf_counter()
+        try:
+            resp = self.session.get(url, params=params, timeout=provider.timeout)
+            if resp.status_code != 200:
+                raise RuntimeError(f"HTTP {resp.status_code}")
+            result = provider.parse(resp.json())
+            if result is None:
+                raise RuntimeError("empty response")
+        except Exception as e:
+            logging.warning(f"❌ {provider.name} error: {e}")
+            provider.breaker.record_failure()
+            return None
+        provider.latency.record(time.perf_counter() - start)
+        provider.breaker.record_success()
+        return result
+
+    def fetch(self, lat, lon, start_date, end_date):
+        """Returns the first provider result, or None if every provider failed or was skipped."""
+        queue = list(self.providers)
+        pending = {}
+
+        def launch():
+            # Breakers are consulted only when a provider is actually about to be called,
+            # so a half-open probe slot is never claimed without a request being made
+            while queue:
+                provider = queue.pop(0)
+                if provider.breaker.allow():
+                    pending[self.executor.submit(self._call, provider, lat, lon, start_date, end_date)] = provider
+                    return provider
+            return None
+
+        current = launch()
+        while pending:
+            timeout = self.hedge_delay(current) if queue else None
+            done, _ = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+            if not done:
+                current = launch() or current
+                continue
+            for future in done:
+                pending.pop(future)
+                result = future.result()
+                if result is not None:
+                    return result
+            current = launch() or current
+        return None
+
+
+class AsyncHedgedFetcher(_Hedged):
+    """
+    HedgedFetcher for an event loop: same providers, breakers and hedging, but
+    requests go through a non-blocking httpx.AsyncClient, so thousands of slow
+    upstream calls cost sockets rather than threads. httpx is only needed when
+    this class is used (the ASGI server); the client is created on first fetch,
+    inside the running loop, and closed with aclose().
+    """
+
+    def __init__(self, providers, client=None, hedge_after=1.5, max_connections=1000):
+        super().__init__(providers, hedge_after)
+        self.max_connections = max_connections
+        self._client = client
+        self._tasks = set()   # strong refs so hedged-away calls still finish and update their breaker
+
+    @property
+    def client(self):
+        if self._client is None:
+            import httpx
+            limits = httpx.Limits(max_connections=self.max_connections, max_keepalive_connections=100)
+            self._client = httpx.AsyncClient(limits=limits)
+        return self._client
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def _call(self, provider, lat, lon, start_date, end_date):
+        url, params = provider.build_request(lat, lon, start_date, end_date)
+        start = time.perf_counter()
+        try:
+            resp = await self.client.get(url, params=params, timeout=provider.timeout)
+            if resp.status_code != 200:
+                raise RuntimeError(f"HTTP {resp.status_code}")
+            result = provider.parse(resp.json())
+            if result is None:
+                raise RuntimeError("empty response")
+        except Exception as e:
+            logging.warning(f"❌ {provider.name} error: {e}")
+            provider.breaker.record_failure()
+            return None
+        provider.latency.record(time.perf_counter() - start)
+        provider.breaker.record_success()
+        return result
+
+    async def fetch(self, lat, lon, start_date, end_date):
+        """Returns the first provider result, or None if every provider failed or was skipped."""
+        queue = list(self.providers)
+        pending = {}
+
+        def launch():
+            while queue:
+                provider = queue.pop(0)
+                if provider.breaker.allow():
+                    task = asyncio.ensure_future(self._call(provider, lat, lon, start_date, end_date))
+                    self._tasks.add(task)
+                    task.add_done_callback(self._tasks.discard)
+                    pending[task] = provider
+                    return provider
+            return None
+
+        current = launch()
+        while pending:
+            timeout = self.hedge_delay(current) if queue else None
+            done, _ = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+            if not done:
+                current = launch() or current
+                continue
+            for task in done:
+                pending.pop(task)
+                result = task.result()
+                if result is not None:
+                    return result
+            current = launch() or current
+        return None
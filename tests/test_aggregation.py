@@ -0,0 +1,73 @@
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from datetime import date, timedelta
+
+import numpy as np
+
+import app as app_module
+from benchmarks.upstream_stub import POLLUTANTS, StubUpstream, hourly_window_payload
+from src.aggregation import aggregate, fill_gaps, history, hourly_to_array
+from src.upstream import HedgedFetcher, open_meteo_hourly_provider, parse_open_meteo
+
+
+def payload(start, hours, pm10):
+    times = [str(np.datetime64(start, "h") + np.timedelta64(i, "h")) + ":00" for i in range(hours)]
+    return {"time": times, "pm10": pm10}
+
+
+def test_daily_means_follow_timestamps_and_ignore_nulls():
+    # Day 1 starts at 01:00 (23 samples), day 2 has nulls, day 3 is missing entirely
+    hourly = payload("2025-01-01T01", 47, [2.0] * 23 + [None] * 12 + [4.0] * 12)
+    times, values = hourly_to_array(hourly, ["pm10", "ozone"])
+    buckets, means = aggregate(times, values, "2025-01-01", 3)
+
+    assert [str(b) for b in buckets] == ["2025-01-01T00", "2025-01-02T00", "2025-01-03T00"]
+    assert means[:, 0].tolist()[:2] == [2.0, 4.0]
+    assert np.isnan(means[2, 0]) and np.isnan(means[:, 1]).all()
+    assert fill_gaps(means).tolist() == [[2.0, 0.0], [4.0, 0.0], [4.0, 0.0]]
+
+
+def test_six_hourly_history_has_nulls_for_gaps():
+    hourly = payload("2025-01-01T00", 12, list(range(12)))
+    result = history(hourly, ["pm10"], date(2025, 1, 1), days=1, granularity="6h")
+    assert result["times"] == ["2025-01-01T00:00", "2025-01-01T06:00", "2025-01-01T12:00", "2025-01-01T18:00"]
+    assert result["values"]["pm10"] == [2.5, 8.5, None, None]
+
+
+def test_parse_open_meteo_matches_legacy_on_aligned_data():
+    values = np.random.default_rng(0).uniform(0, 100, 192).round(1).tolist()
+    data = {"hourly": {"time": payload("2025-01-01T00", 192, None)["time"], **{p: values for p in POLLUTANTS}}}
+    legacy = [round(float(np.mean(values[i * 24:(i + 1) * 24])), 2) for i in range(7)]
+    assert parse_open_meteo(data) == {p: legacy for p in POLLUTANTS}
+
+
+def test_history_route_aggregates_stub_payload(monkeypatch):
+    with StubUpstream() as stub:
+        stub.routes["/v1/air-quality"] = {"delay": 0.0, "status": 200, "body": hourly_window_payload, "query_body": True}
+        fetcher = HedgedFetcher([open_meteo_hourly_provider(stub.open_meteo_url)])
+        monkeypatch.setattr(app_module, "history_upstream", fetcher)
+        app_module.history_cache.clear()
+        client = app_module.app.test_client()
+
+        data = client.get("/history?lat=1&lon=2&days=30").get_json()
+        assert len(data["times"]) == 30
+        assert data["times"][-1] == f"{date.today()}T00:00"
+        assert data["values"]["pm2_5"] == [51.5] * 30   # 40 + mean(0..23)
+
+        six = client.get("/history?lat=1&lon=2&days=7&granularity=6h").get_json()
+        assert len(six["times"]) == 28
+        client.get("/history?lat=1&lon=2&days=30")
+        assert stub.calls["/v1/air-quality"] == 2
+
+        assert client.get("/history?days=365").status_code == 400
+        assert client.get("/history?granularity=weekly").status_code == 400
+
+
+def test_history_route_reports_upstream_failure(monkeypatch):
+    with StubUpstream() as stub:
+        stub.routes["/v1/air-quality"]["status"] = 500
+        monkeypatch.setattr(app_module, "history_upstream", HedgedFetcher([open_meteo_hourly_provider(stub.open_meteo_url)]))
+        app_module.history_cache.clear()
+        assert app_module.app.test_client().get("/history?lat=3&lon=4").status_code == 502
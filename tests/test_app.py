@@ -2,7 +2,14 @@ import sys
 import os
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
+import joblib
+import numpy as np
+import pytest
+from sklearn.ensemble import RandomForestRegressor
+
 from app import app  # now Python can find your app.py
+import app as app_module
+from src.model_registry import ModelRegistry
 
 
 def test_forecast_route():
@@ -26,3 +33,117 @@ def test_forecast_route():
         assert "date" in item
         assert "day" in item
         assert "predicted_AQI" in item
+
+
+@pytest.fixture
+def small_model(tmp_path, monkeypatch):
+    """Swaps the served model for a tiny forest so tests don't need the trained artifact."""
+    rng = np.random.default_rng(0)
+    X = rng.uniform(0, 100, (200, 15))
+    model = RandomForestRegressor(n_estimators=5, max_depth=4, random_state=0).fit(X, X[:, :6].sum(axis=1))
+    path = tmp_path / "model.pkl"
+    joblib.dump(model, path)
+    registry = ModelRegistry(str(path))
+    monkeypatch.setattr(app_module, "model_registry", registry)
+    return registry
+
+
+def fake_history(lat=24.8607, lon=67.0011):
+    return {k: [float(i + 1) for i in range(7)] for k in
+            ["pm10", "pm2_5", "carbon_monoxide", "nitrogen_dioxide", "sulphur_dioxide", "ozone"]}
+
+
+def test_forecast_is_cached(monkeypatch, small_model):
+    calls = []
+
+    def fetch(lat, lon):
+        calls.append((lat, lon))
+        return fake_history()
+
+    monkeypatch.setattr(app_module, "fetch_past_7_days_air_quality", fetch)
+    app_module.forecast_cache.clear()
+    client = app.test_client()
+
+    first = client.get("/forecast?lat=10.0&lon=20.0").get_json()
+    second = client.get("/forecast?lat=10.001&lon=20.001&city=Other").get_json()
+
+    assert len(calls) == 1
+    assert first["predictions"] == second["predictions"]
+    assert second["city"] == "Other"
+
+    stats = client.get("/forecast/cache/stats").get_json()
+    assert stats["hits"] >= 1
+
+
+def test_upstream_failure_is_served_but_not_cached(monkeypatch, small_model):
+    monkeypatch.setattr(app_module.upstream, "fetch", lambda *args: None)
+    app_module.forecast_cache.clear()
+    client = app.test_client()
+
+    data = client.get("/forecast?lat=12.0&lon=22.0").get_json()
+    assert data["fallback"] is True and data["pollutants_history"]["pm10"] == [0] * 7
+    assert app_module.forecast_cache.peek(app_module.cache_key(12.05, 22.05) + (None,)) is None
+
+    # The next request after the outage computes (and caches) a real forecast
+    monkeypatch.setattr(app_module, "fetch_past_7_days_air_quality", fake_history)
+    assert "fallback" not in client.get("/forecast?lat=12.0&lon=22.0").get_json()
+    batch = client.post("/forecast/batch", json={"locations": [{"lat": 12.0, "lon": 22.0}]}).get_json()
+    assert "fallback" not in batch["results"][0]
+
+
+def test_forecast_batch_uses_one_model_call(monkeypatch, small_model):
+    monkeypatch.setattr(app_module, "fetch_past_7_days_air_quality", fake_history)
+    app_module.forecast_cache.clear()
+
+    calls = []
+    real_predict = app_module.model_registry.predict
+
+    def predict(X):
+        calls.append(X.shape)
+        return real_predict(X)
+
+    monkeypatch.setattr(app_module.model_registry, "predict", predict)
+    client = app.test_client()
+
+    locations = [{"city": f"City {i}", "lat": 20 + i, "lon": 60 + i} for i in range(5)]
+    response = client.post("/forecast/batch", json={"locations": locations})
+    assert response.status_code == 200
+
+    results = response.get_json()["results"]
+    assert [r["city"] for r in results] == [loc["city"] for loc in locations]
+    assert calls == [(15, 15)]
+
+    single = client.get("/forecast?lat=20&lon=60").get_json()
+    assert single["predictions"] == results[0]["predictions"]
+
+
+def test_forecast_batch_rejects_bad_body():
+    client = app.test_client()
+    assert client.post("/forecast/batch", json={}).status_code == 400
+    assert client.post("/forecast/batch", json={"locations": [{"lat": "x"}]}).status_code == 400
+
+
+def test_model_stats_route(monkeypatch, small_model):
+    monkeypatch.setattr(app_module, "fetch_past_7_days_air_quality", fake_history)
+    app_module.forecast_cache.clear()
+    client = app.test_client()
+    assert client.get("/model/stats").get_json()["loaded"] is False
+    [forecast] = client.post("/forecast/batch", json={"locations": [{"lat": 1, "lon": 2}]}).get_json()["results"]
+    assert "fallback" not in forecast
+    stats = client.get("/model/stats").get_json()
+    assert stats["loaded"] is True
+    assert stats["predict_p50_ms"] is not None
+
+
+def test_metrics_endpoint_exposes_phase_histograms(monkeypatch, small_model):
+    monkeypatch.setattr(app_module, "fetch_past_7_days_air_quality", fake_history)
+    app_module.forecast_cache.clear()
+    client = app.test_client()
+    client.get("/forecast?lat=11.0&lon=21.0")
+
+    body = client.get("/metrics").get_data(as_text=True)
+    for phase in ("upstream", "features", "predict"):
+        assert f'aqi_forecast_phase_seconds_count{{phase="{phase}"}}' in body
+    assert 'aqi_http_request_seconds_bucket{method="GET",route="/forecast",status="200",le="+Inf"}' in body
+    assert "# TYPE aqi_forecast_phase_seconds histogram" in body
+    assert "aqi_model_loaded 1" in body
@@ -0,0 +1,42 @@
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.fixtures import legacy_compute_aqi, make_pollutants
+from src.data_preprocessing import compute_aqi
+
+
+def test_compute_aqi_matches_legacy():
+    df = make_pollutants()
+    expected = legacy_compute_aqi(df)
+    result = compute_aqi(df.copy())
+    np.testing.assert_array_equal(result["aqi"].to_numpy(), expected)
+
+
+def test_all_missing_or_out_of_range_rows_are_nan():
+    df = pd.DataFrame({"pm2_5": [np.nan, 30.5, 400.0], "pm10": [np.nan, np.nan, 700.0]})
+    result = compute_aqi(df)
+    assert result["aqi"].isna().all()
+    assert result["dominant_pollutant"].isna().all()
+    np.testing.assert_array_equal(legacy_compute_aqi(df), result["aqi"].to_numpy())
+
+
+def test_dominant_pollutant():
+    df = pd.DataFrame({
+        "pm2_5": [100.0, 10.0, 20.0],
+        "pm10": [20.0, 500.0, 20.0],
+        "ozone": [10.0, 10.0, 20.0],
+    })
+    result = compute_aqi(df)
+    # Ties go to the pollutant evaluated first
+    assert list(result["dominant_pollutant"]) == ["pm2_5", "pm10", "pm2_5"]
+
+
+def test_missing_columns_are_skipped():
+    df = pd.DataFrame({"ozone": [25.0, np.nan]})
+    result = compute_aqi(df)
+    assert result["aqi"].iloc[0] == 25.0
+    assert np.isnan(result["aqi"].iloc[1])
@@ -0,0 +1,114 @@
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import asyncio
+import time
+
+import pytest
+
+pytest.importorskip("starlette")
+httpx = pytest.importorskip("httpx")
+
+import app as app_module
+import asgi
+from benchmarks.upstream_stub import StubUpstream
+from src.upstream import AsyncHedgedFetcher, open_meteo_provider, openaq_provider
+from tests.test_app import small_model  # noqa: F401  (fixture)
+
+
+@pytest.fixture
+def stub(monkeypatch):
+    with StubUpstream() as stub:
+        fetcher = AsyncHedgedFetcher([open_meteo_provider(stub.open_meteo_url, timeout=5),
+                                      openaq_provider(stub.openaq_url, timeout=5)], hedge_after=5)
+        monkeypatch.setattr(asgi, "upstream", fetcher)
+        app_module.forecast_cache.clear()
+        yield stub
+
+
+async def get_all(paths):
+    transport = httpx.ASGITransport(app=asgi.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        responses = await asyncio.gather(*(client.get(p) for p in paths))
+    await asgi.upstream.aclose()
+    return responses
+
+
+def test_forecast_matches_flask_schema(stub, small_model):
+    [response] = asyncio.run(get_all(["/forecast?lat=10&lon=20&city=Test"]))
+    flask = app_module.app.test_client().get("/forecast?lat=10&lon=20&city=Test").get_json()
+
+    assert response.status_code == 200
+    assert response.json() == flask   # second call is a cache hit on the same entry
+    assert response.json()["pollutants"]["pm10"] == 40.0
+    assert stub.calls["/v1/air-quality"] == 1
+
+
+def test_batch_matches_flask(stub, small_model):
+    locations = [{"city": f"City {i}", "lat": 20 + i, "lon": 60 + i} for i in range(3)] + [{"lat": 20, "lon": 60}]
+
+    async def post(body):
+        transport = httpx.ASGITransport(app=asgi.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            response = await client.post("/forecast/batch", json=body)
+        await asgi.upstream.aclose()
+        return response
+
+    response = asyncio.run(post({"locations": locations}))
+    assert response.status_code == 200 and stub.calls["/v1/air-quality"] == 3
+    flask = app_module.app.test_client().post("/forecast/batch", json={"locations": locations}).get_json()
+    assert response.json() == flask   # served from the entries the ASGI batch cached
+    assert asyncio.run(post({"locations": [{"lat": "x"}]})).status_code == 400
+
+
+def test_slow_upstream_requests_run_concurrently(stub, small_model):
+    stub.routes["/v1/air-quality"]["delay"] = 0.5
+    # 100 distinct locations plus 50 duplicates of one of them
+    paths = [f"/forecast?lat={i}&lon=1" for i in range(100)] + ["/forecast?lat=0&lon=1"] * 50
+
+    start = time.perf_counter()
+    responses = asyncio.run(get_all(paths))
+    elapsed = time.perf_counter() - start
+
+    assert all(r.status_code == 200 for r in responses)
+    assert stub.calls["/v1/air-quality"] == 100   # duplicates share one in-flight computation
+    assert elapsed < 5   # 150 sequential upstream waits would take 75s
+
+
+def test_spa_fallback_and_static_assets():
+    responses = asyncio.run(get_all(["/", "/dashboard", "/robots.txt"]))
+    assert [r.status_code for r in responses] == [200, 200, 200]
+    assert responses[0].text == responses[1].text
+    assert "User-agent" in responses[2].text
+
+
+def test_static_and_conditional_responses(stub, small_model, tmp_path, monkeypatch):
+    (tmp_path / "static").mkdir()
+    (tmp_path / "static" / "main.abc123.js").write_bytes(b"console.log('aqi');\n" * 200)
+    monkeypatch.setattr(asgi.app.routes[-1].app, "directory", str(tmp_path))
+    monkeypatch.setattr(asgi.app.routes[-1].app, "all_directories", [str(tmp_path)])
+
+    async def run():
+        transport = httpx.ASGITransport(app=asgi.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            asset = await client.get("/static/main.abc123.js", headers={"Accept-Encoding": "gzip"})
+            first = await client.get("/forecast?lat=10&lon=20")
+            again = await client.get("/forecast?lat=10&lon=20", headers={"If-None-Match": first.headers["etag"]})
+            missing = await client.get("/history/nope")
+        await asgi.upstream.aclose()
+        return asset, first, again, missing
+
+    asset, first, again, missing = asyncio.run(run())
+    assert asset.headers["content-encoding"] == "gzip" and "immutable" in asset.headers["cache-control"]
+    assert asset.content == b"console.log('aqi');\n" * 200   # httpx decodes
+    assert first.status_code == 200 and again.status_code == 304
+    assert missing.status_code == 404 and missing.json() == {"error": "Not found"}
+
+
+def test_global_explanation_ignores_bad_horizon(monkeypatch):
+    seen = []
+    monkeypatch.setattr(app_module, "current_global_importance", lambda horizon=None: seen.append(horizon))
+    responses = asyncio.run(get_all(["/forecast/explain/global?horizon=abc", "/forecast/explain/global?horizon=24"]))
+    assert [r.status_code for r in responses] == [503, 503]   # not a 500, as in the Flask route
+    assert sorted(seen, key=str) == [24, None]
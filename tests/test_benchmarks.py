@@ -0,0 +1,39 @@
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import json
+
+from benchmarks.bench_pipeline import bench_ingest, bench_preprocess
+from benchmarks.compare import compare
+from benchmarks.datasets import parse_sizes, synthetic_raw
+from benchmarks.results import save_results
+
+
+def test_synthetic_raw_is_reproducible():
+    a, b = synthetic_raw(500), synthetic_raw(500)
+    assert a.equals(b)
+    assert a["pm2_5"].isna().any()
+    assert parse_sizes("10k, 2000") == {"10k": 10_000, "2000": 2000}
+
+
+def test_pipeline_bench_times_every_stage():
+    result = bench_preprocess(2000)
+    assert list(result["stages"]) == ["impute", "aqi", "outlier_capping", "features", "save"]
+    assert result["stages"]["impute"]["rows"] == 2000
+
+
+def test_ingest_bench_runs_against_stub():
+    result = bench_ingest(days=3)
+    assert result["rows"] == 4 * 24
+    assert result["requests"] == 2
+
+
+def test_compare_flags_only_real_regressions(tmp_path):
+    old = json.load(open(save_results("x", {"cold": {"p99_ms": 100.0, "throughput_rps": 50.0, "requests": 10}},
+                                      out_dir=str(tmp_path))))
+    new = {"results": {"cold": {"p99_ms": 105.0, "throughput_rps": 40.0, "requests": 99}}}
+    rows, regressions = compare(old, new, threshold=0.10)
+    assert regressions == ["cold.throughput_rps"]
+    assert len(rows) == 3
+    assert old["commit"] and old["benchmark"] == "x"
@@ -0,0 +1,155 @@
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from datetime import date
+
+import pandas as pd
+
+from src import data_ingestion
+
+
+def hourly_frame(start, end, column, value=1.0):
+    times = pd.date_range(start, pd.Timestamp(end) + pd.Timedelta(hours=23), freq="h")
+    return pd.DataFrame({"time": times.strftime("%Y-%m-%dT%H:%M"), column: value})
+
+
+class FakeAPI:
+    def __init__(self, today):
+        self.today = today
+        self.requests = []
+
+    def window(self):
+        """Overall date range requested since the last call."""
+        window = (min(s for s, _ in self.requests), max(e for _, e in self.requests))
+        self.requests = []
+        return window
+
+    def aqi(self, days=None, start_date=None, end_date=None, location=None):
+        self.requests.append((start_date, end_date))
+        return hourly_frame(start_date, end_date, "pm2_5")
+
+    def weather(self, days=None, start_date=None, end_date=None, location=None):
+        return hourly_frame(start_date, end_date, "temperature_2m")
+
+
+def run(monkeypatch, tmp_path, api):
+    monkeypatch.setattr(data_ingestion, "fetch_openmeteo_aqi", api.aqi)
+    monkeypatch.setattr(data_ingestion, "fetch_weather_data", api.weather)
+    return data_ingestion.ingest_incremental(
+        days=60, store_dir=str(tmp_path / "raw"), watermark_file=str(tmp_path / "wm.json"), end_date=api.today
+    )
+
+
+def test_first_run_backfills_then_fetches_only_missing_window(monkeypatch, tmp_path):
+    api = FakeAPI(date(2025, 3, 10))
+    first = run(monkeypatch, tmp_path, api)
+    assert api.window() == (date(2025, 1, 9), date(2025, 3, 10))
+    assert len(first) == 61 * 24
+    assert sorted(os.listdir(tmp_path / "raw" / "karachi" / "2025")) == ["1", "2", "3"]
+
+    # The end date's hours are provisional, so the watermark stops the day before
+    assert data_ingestion.read_watermark(str(tmp_path / "wm.json")) == pd.Timestamp("2025-03-09 23:00")
+
+    api.today = date(2025, 3, 12)
+    second = run(monkeypatch, tmp_path, api)
+    # Only the lookback before the watermark onwards is requested
+    assert api.window() == (date(2025, 3, 6), date(2025, 3, 12))
+    assert len(second) == len(first) + 2 * 24
+    assert second["time"].is_unique
+    assert data_ingestion.read_watermark(str(tmp_path / "wm.json")) == pd.Timestamp("2025-03-11 23:00")
+
+
+def test_provisional_hours_are_refetched(monkeypatch, tmp_path):
+    api = FakeAPI(date(2025, 3, 10))
+    real_weather = api.weather
+
+    def lagging_weather(days=None, start_date=None, end_date=None, location=None):
+        # The archive has nothing yet for the last two days
+        df = real_weather(days, start_date, end_date)
+        df.loc[pd.to_datetime(df["time"]) >= pd.Timestamp(api.today) - pd.Timedelta(days=1), "temperature_2m"] = None
+        return df
+
+    monkeypatch.setattr(api, "weather", lagging_weather)
+    first = run(monkeypatch, tmp_path, api)
+    assert first["temperature_2m"].tail(48).isna().all()
+    assert data_ingestion.read_watermark(str(tmp_path / "wm.json")) == pd.Timestamp("2025-03-08 23:00")
+
+    api.today = date(2025, 3, 12)
+    second = run(monkeypatch, tmp_path, api)
+    filled = pd.to_datetime(second["time"]) < pd.Timestamp("2025-03-11")
+    assert second.loc[filled, "temperature_2m"].notna().all() and second["time"].is_unique
+
+
+def test_rerun_is_idempotent(monkeypatch, tmp_path):
+    api = FakeAPI(date(2025, 3, 10))
+    first = run(monkeypatch, tmp_path, api)
+    again = run(monkeypatch, tmp_path, api)
+    pd.testing.assert_frame_equal(first, again)
+
+
+def test_partition_merge_deduplicates_on_time(tmp_path):
+    store = str(tmp_path / "raw")
+    df = hourly_frame("2025-01-01", "2025-01-01", "pm2_5", 1.0)
+    data_ingestion.append_partitions(df, store)
+    data_ingestion.append_partitions(df.assign(pm2_5=2.0).tail(5), store)
+
+    history = data_ingestion.load_raw_history(store)
+    assert len(history) == 24
+    assert (history["pm2_5"].tail(5) == 2.0).all()
+    assert history["time"].is_monotonic_increasing
+
+
+def test_date_chunks_cover_range_without_overlap():
+    chunks = data_ingestion.date_chunks(date(2025, 1, 1), date(2025, 3, 5), chunk_days=30)
+    assert chunks == [
+        (date(2025, 1, 1), date(2025, 1, 30)),
+        (date(2025, 1, 31), date(2025, 3, 1)),
+        (date(2025, 3, 2), date(2025, 3, 5)),
+    ]
+
+
+def test_parallel_fetch_retries_and_keeps_other_chunks(monkeypatch):
+    attempts = {}
+
+    def fetch_openmeteo_aqi(days=None, start_date=None, end_date=None, location=None):
+        attempts[start_date] = attempts.get(start_date, 0) + 1
+        if start_date == date(2025, 1, 11) and attempts[start_date] == 1:
+            raise Exception("transient 502")
+        if start_date == date(2025, 1, 21):
+            raise Exception("permanent 500")
+        return hourly_frame(start_date, end_date, "pm2_5")
+
+    def fetch_weather_data(days=None, start_date=None, end_date=None, location=None):
+        return hourly_frame(start_date, end_date, "temperature_2m")
+
+    monkeypatch.setattr(data_ingestion, "fetch_openmeteo_aqi", fetch_openmeteo_aqi)
+    monkeypatch.setattr(data_ingestion, "fetch_weather_data", fetch_weather_data)
+
+    df_aqi, df_weather = data_ingestion.fetch_sources_parallel(
+        date(2025, 1, 1), date(2025, 1, 31), chunk_days=10, max_workers=4, retries=2, backoff=0
+    )
+    assert len(df_weather) == 31 * 24
+    assert df_weather["time"].is_monotonic_increasing
+    # The transient failure was retried; only the permanently failing chunk is missing
+    assert attempts[date(2025, 1, 11)] == 2
+    assert attempts[date(2025, 1, 21)] == 2
+    assert len(df_aqi) == 21 * 24
+    assert pd.to_datetime(df_aqi["time"]).is_monotonic_increasing
+
+
+def test_failed_chunk_holds_back_watermark(monkeypatch, tmp_path):
+    api = FakeAPI(date(2025, 3, 10))
+    real_aqi = api.aqi
+
+    def flaky_aqi(days=None, start_date=None, end_date=None, location=None):
+        if start_date <= date(2025, 3, 1) <= end_date:
+            raise Exception("502")
+        return real_aqi(days, start_date, end_date)
+
+    monkeypatch.setattr(data_ingestion.time, "sleep", lambda seconds: None)
+    monkeypatch.setattr(api, "aqi", flaky_aqi)
+    run(monkeypatch, tmp_path, api)
+
+    watermark = data_ingestion.read_watermark(str(tmp_path / "wm.json"))
+    assert watermark < pd.Timestamp("2025-03-01")
@@ -0,0 +1,55 @@
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.datasets import synthetic_raw
+from src import data_preprocessing as dp
+from src.storage import read_partitioned
+
+
+def test_vectorized_capping_matches_per_column_quantiles():
+    df = synthetic_raw(3000).set_index("time").rename(columns={"windspeed_10m": "wind_speed_10m"})
+    expected = df.copy()
+    for col in dp.CAP_COLUMNS:
+        if col in expected.columns:
+            s = expected[col]
+            expected[col] = s.clip(*dp.iqr_bounds(s.quantile(0.25), s.quantile(0.75)))
+    pd.testing.assert_frame_equal(dp.cap_outliers_iqr(df.copy()), expected, check_exact=True)
+
+    bounds = {c: (1.0, 2.0) for c in dp.CAP_COLUMNS}
+    capped = dp.cap_outliers_iqr(df.copy(), bounds)
+    assert capped["pm10"].min() == 1.0 and capped["pm10"].max() == 2.0
+
+    # Integer columns get float fences untruncated; float32 stays float32
+    ints = pd.DataFrame({"relative_humidity_2m": [10, 50, 51, 52, 53, 90], "pm10": np.arange(6, dtype=np.float32)})
+    capped = dp.cap_outliers_iqr(ints.copy(), {"relative_humidity_2m": (20.5, 80.25), "pm10": (0.5, 4.5)})
+    assert capped["relative_humidity_2m"].tolist() == [20.5, 50, 51, 52, 53, 80.25]
+    assert capped.dtypes.to_dict() == {"relative_humidity_2m": np.float64, "pm10": np.float32}
+
+
+def test_impute_fills_every_gap_and_leaves_empty_columns():
+    df = pd.DataFrame({"a": [np.nan, 1.0, np.nan, 3.0, np.nan], "b": [np.nan] * 5},
+                      index=pd.date_range("2025-01-01", periods=5, freq="h"))
+    out = dp.impute_missing(df)
+    assert out["a"].tolist() == [1.0, 1.0, 1.0, 3.0, 3.0]
+    assert out["b"].isna().all()
+
+
+def test_compact_mode_shrinks_frame_but_not_the_store(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    raw = synthetic_raw(2000)
+    default = dp.preprocess_data(raw.copy(), compact=False)
+    default_store = read_partitioned(dp.PROCESSED_STORE, city="Karachi")
+    compact = dp.preprocess_data(raw.copy(), compact=True)
+    compact_store = read_partitioned(dp.PROCESSED_STORE, city="Karachi")
+
+    assert compact["pm2_5"].dtype == np.float32 and compact["hour"].dtype == np.int8
+    assert compact["year"].dtype == np.int16 and compact["dominant_pollutant"].dtype == "category"
+    assert compact.memory_usage(deep=True).sum() < 0.8 * default.memory_usage(deep=True).sum()
+    # Same schema on disk whichever mode wrote it, values equal to float32 precision
+    assert compact_store.dtypes.equals(default_store.dtypes)
+    assert (compact_store["dominant_pollutant"] == default_store["dominant_pollutant"]).mean() > 0.99
+    np.testing.assert_allclose(compact_store["aqi"], default_store["aqi"], rtol=1e-4)
@@ -0,0 +1,123 @@
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import time
+
+import joblib
+import numpy as np
+import pytest
+from sklearn.ensemble import RandomForestRegressor
+
+import app as app_module
+from src.explain import ExplanationService, ExplanationStore, TreeExplainers, explain_inputs, horizon_response
+from src.model_registry import ModelRegistry
+from src.snapshots import SnapshotRefresher, SnapshotStore
+from tests.test_app import fake_history, small_model  # noqa: F401  (fixture)
+
+pytest.importorskip("shap")
+
+KARACHI = {"location_id": "karachi", "lat": 24.8607, "lon": 67.0011}
+
+
+@pytest.fixture
+def horizon_model(tmp_path):
+    rng = np.random.default_rng(0)
+    X = rng.uniform(0, 100, (300, 5))
+    Y = np.column_stack([X[:, 0] + h * X[:, 1] / 10 for h in (1, 2, 3)])
+    path = tmp_path / "forecaster.pkl"
+    joblib.dump(RandomForestRegressor(n_estimators=5, max_depth=4, random_state=0).fit(X, Y), path)
+    return ModelRegistry(str(path)), X
+
+
+def test_attributions_add_up_to_the_model_output(horizon_model, small_model):
+    registry, X = horizon_model
+    multi = {"engine": "multi_horizon", "registry": registry, "features": list("abcde"), "horizons": [1, 2, 3],
+             "x": X[:1] * 2, "model_x": X[:1], "issued_at": "2025-01-01T00:00:00"}
+    legacy_X = np.random.default_rng(1).uniform(0, 100, (3, 15))
+    legacy = {"engine": "legacy", "registry": small_model, "features": [f"f{i}" for i in range(15)],
+              "horizons": [24, 48, 72], "x": legacy_X, "model_x": legacy_X}
+
+    expl_multi, expl_legacy = explain_inputs(TreeExplainers(), [multi, legacy])
+
+    assert expl_multi["values"].shape == (3, 5) and expl_legacy["values"].shape == (3, 15)
+    np.testing.assert_allclose(expl_multi["base"] + expl_multi["values"].sum(axis=1),
+                               registry.model.predict(X[:1])[0], rtol=1e-4)
+    np.testing.assert_allclose(expl_legacy["base"] + expl_legacy["values"].sum(axis=1),
+                               small_model.model.predict(legacy_X), rtol=1e-4)
+    # Users see the unscaled inputs
+    np.testing.assert_allclose(expl_multi["x"][2], X[0] * 2, rtol=1e-6)
+
+    body = horizon_response(expl_multi, horizon=2, top=2)
+    assert body["horizon_h"] == 2 and len(body["contributions"]) == 2
+    assert body["prediction"] == pytest.approx(registry.model.predict(X[:1])[0][1], abs=0.01)
+
+
+def test_store_round_trip_and_global_reset(tmp_path, horizon_model):
+    registry, X = horizon_model
+    store = ExplanationStore(str(tmp_path / "online" / "explain.db"))
+    # Nothing is created until the store is used (app.py builds one at import)
+    assert store.get("karachi", horizon=3) is None and store.global_sums(registry.path) is None
+    assert store.stats()["rows"] == 0
+    assert not (tmp_path / "online").exists() and os.path.isabs(app_module.explanations.store.path)
+    inputs = {"engine": "multi_horizon", "registry": registry, "features": list("abcde"), "horizons": [1, 2, 3],
+              "x": X[:1], "model_x": X[:1]}
+    expl = explain_inputs(TreeExplainers(), [inputs])[0]
+
+    store.put("karachi", expl, as_of=1000.0)
+    as_of, stored = store.get("karachi", horizon=3)
+    assert as_of == 1000.0 and stored["horizons"] == [3]
+    np.testing.assert_array_equal(stored["values"][0], expl["values"][2])
+    assert store.get("karachi", horizon=3, max_age=60, now=1100.0) is None
+    assert store.get("lahore", horizon=3) is None
+
+    store.add_global(registry.path, [expl, expl])
+    assert store.global_sums(registry.path)["rows"] == 2
+    # A new model version starts the running sums over
+    store.add_global(registry.path, [{**expl, "model_version": "v2"}])
+    sums = store.global_sums(registry.path)
+    assert sums["model_version"] == "v2" and sums["rows"] == 1
+
+
+def test_explain_endpoint_precomputed_on_demand_and_budget(tmp_path, monkeypatch, small_model):
+    calls = []
+    monkeypatch.setattr(app_module, "fetch_past_7_days_air_quality", lambda lat, lon: calls.append(lat) or fake_history())
+    service = ExplanationService(ExplanationStore(str(tmp_path / "explain.db")), budget=30)
+    monkeypatch.setattr(app_module, "explanations", service)
+    monkeypatch.setattr(app_module, "LOCATIONS", [KARACHI])
+    app_module.forecast_cache.clear()
+    client = app_module.app.test_client()
+
+    assert client.get("/forecast/explain/global").status_code == 503
+    assert client.get("/forecast/explain?horizon=0").status_code == 400
+
+    # Configured locations are explained in one batch right after their snapshots refresh
+    refresher = SnapshotRefresher(app_module.snapshot_refresher.compute, [KARACHI], SnapshotStore(str(tmp_path / "s.db")),
+                                  after_refresh=app_module.snapshot_refresher.after_refresh)
+    assert refresher.refresh_once() == 1
+    data = client.get("/forecast/explain?lat=24.8607&lon=67.0011&horizon=30&top=3").get_json()
+    assert data["source"] == "precomputed" and data["horizon_h"] == 24 and len(data["contributions"]) == 3
+    assert data["engine"] == "legacy" and data["method"] == "tree_shap"
+
+    # Anything else is computed on demand once, then served from the LRU
+    live = client.get("/forecast/explain?lat=10&lon=10&horizon=72").get_json()
+    assert live["source"] == "on_demand" and live["horizon_h"] == 72
+    assert client.get("/forecast/explain?lat=10&lon=10&horizon=72").get_json() == live
+    assert service.cache.stats()["hits"] == 1 and len(calls) == 2
+
+    # Past the latency budget the approximate attribution is served instead
+    exact = service.explainers.shap_values
+
+    def slow(registry, X, approximate=False):
+        if not approximate:
+            time.sleep(0.5)
+        return exact(registry, X, approximate)
+
+    monkeypatch.setattr(service.explainers, "shap_values", slow)
+    service.budget = 0.05
+    service.cache.clear()
+    assert client.get("/forecast/explain?lat=10&lon=10").get_json()["method"] == "approximate"
+
+    importance = client.get("/forecast/explain/global").get_json()
+    assert importance["rows"] == 1 and len(importance["importance"]) == 15
+    assert client.get("/feature_importance.json").get_json() == importance["importance"]
@@ -0,0 +1,85 @@
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import threading
+import time
+
+import pytest
+
+from src.forecast_cache import ForecastCache, cache_key
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_cache_key_rounds_and_buckets_by_hour():
+    assert cache_key(24.86071, 67.00109, now=7200) == cache_key(24.8607, 67.0011, now=10799)
+    assert cache_key(24.8607, 67.0011, now=7200) != cache_key(24.8607, 67.0011, now=10800)
+
+
+def test_ttl_expiry():
+    clock = FakeClock()
+    cache = ForecastCache(ttl=60, clock=clock)
+    cache.set("k", 1)
+    assert cache.get("k") == 1
+    clock.now = 61
+    assert cache.get("k") is None
+    assert cache.stats()["evictions"] == 1
+
+
+def test_lru_eviction():
+    cache = ForecastCache(maxsize=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+    assert cache.stats()["evictions"] == 1
+
+
+def test_concurrent_requests_are_coalesced():
+    cache = ForecastCache()
+    calls = []
+    barrier = threading.Barrier(50)
+
+    def compute():
+        calls.append(1)
+        time.sleep(0.2)
+        return "forecast"
+
+    results = []
+
+    def worker():
+        barrier.wait()
+        results.append(cache.get_or_compute("karachi", compute))
+
+    threads = [threading.Thread(target=worker) for _ in range(50)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert len(calls) == 1
+    assert results == ["forecast"] * 50
+    stats = cache.stats()
+    assert stats["misses"] == 1
+    assert stats["hits"] + stats["coalesced"] == 49
+
+
+def test_errors_are_not_cached():
+    cache = ForecastCache()
+
+    def fail():
+        raise RuntimeError("upstream down")
+
+    with pytest.raises(RuntimeError):
+        cache.get_or_compute("k", fail)
+    assert cache.get_or_compute("k", lambda: 42) == 42
@@ -0,0 +1,132 @@
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import numpy as np
+import pandas as pd
+
+import app as app_module
+from benchmarks.datasets import synthetic_raw
+from src import data_preprocessing as dp
+from src import forecasting
+from src.model_registry import ModelRegistry
+from src.transform import Transform
+from tests.test_app import fake_history, small_model  # noqa: F401  (fixture)
+
+
+KARACHI = {"location_id": "karachi", "lat": 24.8607, "lon": 67.0011, "timezone": "Asia/Karachi"}
+
+
+def recent_raw(hours, location=None):
+    """Synthetic hours ending just before now, in the location's local time as Open-Meteo returns them."""
+    raw = synthetic_raw(hours, missing=0)
+    end = forecasting.local_now(location).floor("h") - pd.Timedelta(hours=1)
+    raw["time"] = pd.date_range(end=end, periods=hours, freq="h").strftime("%Y-%m-%dT%H:%M")
+    return raw
+
+
+def test_supervised_targets_follow_timestamps_across_gaps():
+    processed = pd.DataFrame({
+        "time": pd.to_datetime(["2025-01-01 00:00", "2025-01-01 01:00", "2025-01-01 02:00", "2025-01-01 05:00"]),
+        "aqi": [10.0, 11.0, 12.0, 15.0],
+        "pm10": [1.0, 2.0, 3.0, 4.0],
+    })
+    X, Y, features = forecasting.make_supervised(processed, horizons=[1, 2])
+    assert features == ["pm10", "aqi"]
+    # 02:00 has no 03:00/04:00 target, so only 00:00 survives (01:00 lacks 03:00)
+    assert X.tolist() == [[1.0, 10.0]]
+    assert Y.tolist() == [[11.0, 12.0]]
+
+
+def test_supervised_targets_stay_within_each_pooled_location():
+    times = pd.to_datetime(["2025-01-01 00:00", "2025-01-01 01:00"] * 2)
+    processed = pd.DataFrame({"time": times, "location_id": ["a", "a", "b", "b"],
+                              "aqi": [10.0, 11.0, 50.0, 51.0], "pm10": [1.0, 2.0, 3.0, 4.0]})
+    X, Y, _, when = forecasting.make_supervised(processed, horizons=[1], with_times=True)
+    assert X.tolist() == [[1.0, 10.0], [3.0, 50.0]]
+    assert Y.tolist() == [[11.0], [51.0]]
+    assert (when == times[0].to_datetime64()).all()
+
+
+def test_forecaster_predicts_all_horizons_in_one_call(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    processed = dp.preprocess_data(recent_raw(24 * 15))
+    path = str(tmp_path / "forecaster.pkl")
+    model, meta = forecasting.train_forecaster(processed, path=path, n_estimators=5, n_jobs=1)
+    assert meta["horizons"] == list(range(1, 73))
+    assert "aqi_lag1" in meta["features"] and "temperature_2m" in meta["features"]
+    assert forecasting.load_meta(path) == meta
+
+    calls = []
+
+    def predict(X):
+        calls.append(X.shape)
+        return model.predict(X)
+
+    row, issued_at = forecasting.latest_features("karachi", meta["features"])
+    hourly = forecasting.forecast_hours(predict, meta, row, issued_at)
+    assert calls == [(1, len(meta["features"]))]
+    assert [p["horizon_h"] for p in hourly] == list(range(1, 73))
+    assert len(forecasting.daily_from_hourly(hourly)) == 3
+
+    # Stale stores are not used as the "now" of a forecast
+    assert forecasting.latest_features("karachi", meta["features"], now=issued_at + pd.Timedelta(days=1)) is None
+
+
+def test_store_times_are_compared_in_the_locations_local_time(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    denver = {"location_id": "denver", "lat": 39.74, "lon": -104.99, "timezone": "America/Denver"}
+    dp.preprocess_data(recent_raw(24 * 10, denver), city="denver")
+    features = ["pm10", "aqi"]
+
+    now = forecasting.local_now(denver)
+    assert abs(now - pd.Timestamp.now(tz="America/Denver").tz_localize(None)) < pd.Timedelta(minutes=1)
+    row, issued_at = forecasting.latest_features("denver", features, now=now)
+    assert issued_at == now.floor("h") - pd.Timedelta(hours=1)
+    assert len(forecasting.daily_history("denver", now=now)["pm10"]) == 7
+    # "auto" falls back to the longitude's solar offset
+    auto = forecasting.local_now({**denver, "timezone": "auto"})
+    assert abs(auto - pd.Timestamp.now(tz="UTC").tz_localize(None) + pd.Timedelta(hours=7)) < pd.Timedelta(minutes=1)
+
+
+def test_forecast_route_uses_stored_features(tmp_path, monkeypatch, small_model):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(app_module, "LOCATIONS", [KARACHI])
+    processed = dp.preprocess_data(recent_raw(24 * 15, KARACHI))
+    path = str(tmp_path / "forecaster.pkl")
+    # Trained on standardized features; serving must apply the same artifact
+    model, meta = forecasting.train_forecaster(processed, path=path, n_estimators=5, n_jobs=1,
+                                               transform_path=dp.TRANSFORM_PATH)
+
+    def no_upstream(*args):
+        raise AssertionError("the multi-horizon path must not call upstream APIs")
+
+    monkeypatch.setattr(app_module, "forecaster_registry", ModelRegistry(path))
+    monkeypatch.setattr(app_module, "PROCESSED_STORE", dp.PROCESSED_STORE)   # under tmp_path, not the repo
+    monkeypatch.setattr(app_module, "_forecaster_meta", {"version": None, "meta": None})
+    monkeypatch.setattr(app_module, "fetch_past_7_days_air_quality", no_upstream)
+    app_module.forecast_cache.clear()
+
+    data = app_module.app.test_client().get("/forecast?lat=1&lon=2&location_id=karachi").get_json()
+    assert data["engine"] == "multi_horizon"
+    assert len(data["hourly_predictions"]) == 72
+    assert [p["day"] for p in data["predictions"]] == ["Day 1", "Day 2", "Day 3"]
+    assert len(data["pollutants_history"]["pm2_5"]) == 7
+    assert np.isfinite(data["predictions"][0]["predicted_AQI"])
+
+    row, _ = forecasting.latest_features("karachi", meta["features"], now=forecasting.local_now(KARACHI))
+    expected = model.predict(Transform.load(dp.TRANSFORM_PATH).transform_array(row, meta["features"]))[0]
+    assert [p["predicted_AQI"] for p in data["hourly_predictions"]] == [round(float(v), 2) for v in expected]
+
+    # Serving reads the copy saved with the model, so a refit of the live artifact can't skew it
+    assert meta["transform"] == forecasting.transform_snapshot_path(path)
+    os.remove(dp.TRANSFORM_PATH)
+    app_module.forecast_cache.clear()
+    assert app_module.app.test_client().get("/forecast?lat=1&lon=2&location_id=karachi").get_json() == data
+
+    # Without a readable artifact the legacy model answers instead of a 500
+    os.remove(meta["transform"])
+    monkeypatch.setattr(app_module, "fetch_past_7_days_air_quality", lambda lat, lon: fake_history())
+    app_module.forecast_cache.clear()
+    response = app_module.app.test_client().get("/forecast?lat=1&lon=2&location_id=karachi")
+    assert response.status_code == 200 and response.get_json()["engine"] == "legacy"
@@ -0,0 +1,97 @@
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import numpy as np
+import pandas as pd
+
+from src import data_preprocessing as dp
+from src.incremental_features import QuantileSketch, bootstrap, load_state, state_path, update_features
+from src.storage import read_partitioned
+
+
+def make_raw(n, seed=0):
+    rng = np.random.default_rng(seed)
+    # Uniform concentrations keep every value inside the IQR fences, so capping is a no-op
+    # and the incremental result must match a full recompute
+    return pd.DataFrame({
+        "time": pd.date_range("2025-01-01", periods=n, freq="h"),
+        "pm2_5": rng.uniform(5, 25, n),
+        "pm10": rng.uniform(10, 40, n),
+        "ozone": rng.uniform(10, 45, n),
+        "temperature_2m": rng.uniform(20, 30, n),
+    })
+
+
+def test_incremental_update_matches_full_run(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    raw = make_raw(24 * 20)
+    history, new = raw.iloc[:24 * 19], raw.iloc[24 * 19:]
+
+    full = dp.preprocess_data(raw.copy()).reset_index()
+    bootstrap(history.copy())
+    appended = update_features(new.copy()).reset_index()
+
+    pd.testing.assert_frame_equal(appended, full.tail(24).reset_index(drop=True), rtol=1e-12)
+    stored = read_partitioned(dp.PROCESSED_STORE, city="Karachi")
+    assert len(stored) == len(full)
+    assert stored["time"].is_unique
+    assert load_state(state_path())["last_time"] == raw["time"].max()
+
+
+def test_update_is_idempotent(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    raw = make_raw(24 * 3)
+    bootstrap(raw.iloc[:48].copy())
+    assert len(update_features(raw.copy())) == 24
+    assert update_features(raw.copy()).empty
+
+
+def test_provisional_rows_are_refeaturized_once_settled(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    raw = make_raw(24 * 10)
+    watermark = raw["time"].iloc[-25]
+    # The last day is provisional at ingestion time: forecast air quality, no weather yet
+    provisional = raw.copy()
+    provisional.loc[provisional.index[-24:], "pm2_5"] = 59.0
+    provisional.loc[provisional.index[-24:], "temperature_2m"] = np.nan
+    bootstrap(provisional.copy(), settled_until=watermark)
+    assert load_state(state_path())["last_time"] == watermark
+    stored = read_partitioned(dp.PROCESSED_STORE, city="Karachi")
+    assert (stored["pm2_5"].tail(24) > 25).all()   # the (capped) forecast values
+
+    # Ingestion refetched the day with observed values and moved its watermark on
+    later = pd.concat([raw, make_raw(24, seed=1).assign(time=raw["time"] + pd.Timedelta(days=10))[:24]],
+                      ignore_index=True)
+    update_features(later.copy(), settled_until=raw["time"].max())
+    stored = read_partitioned(dp.PROCESSED_STORE, city="Karachi").set_index("time")
+    expected = dp.preprocess_data(later.copy(), city="Other")
+    np.testing.assert_allclose(stored.loc[raw["time"].iloc[-24:], "pm2_5"], raw["pm2_5"].iloc[-24:])
+    np.testing.assert_allclose(stored["temperature_2m"], expected["temperature_2m"], rtol=1e-12)
+    assert load_state(state_path())["last_time"] == raw["time"].max()
+
+
+def test_new_rows_are_capped_with_updated_sketch(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    raw = make_raw(24 * 10)
+    bootstrap(raw.copy())
+    spike = make_raw(1).assign(time=raw["time"].max() + pd.Timedelta(hours=1), pm2_5=5000.0)
+    row = update_features(spike)
+    low, high = dp.iqr_bounds(np.quantile(np.append(raw["pm2_5"], 5000.0), 0.25),
+                              np.quantile(np.append(raw["pm2_5"], 5000.0), 0.75))
+    assert row["pm2_5"].iloc[0] == high
+
+
+def test_sketch_is_exact_below_capacity_and_close_above():
+    rng = np.random.default_rng(0)
+    values = rng.normal(size=3000)
+    sketch = QuantileSketch(capacity=4096)
+    sketch.update(values)
+    assert sketch.quantile(0.25) == pd.Series(values).quantile(0.25)
+
+    more = rng.normal(size=200_000)
+    small = QuantileSketch(capacity=1024)
+    for chunk in np.array_split(more, 50):
+        small.update(chunk)
+    for q in (0.25, 0.75):
+        assert abs(small.quantile(q) - np.quantile(more, q)) < 0.02
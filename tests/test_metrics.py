@@ -0,0 +1,55 @@
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import json
+
+import numpy as np
+import pandas as pd
+
+from src import data_preprocessing as dp
+from src.metrics import MetricsRegistry, RunReport, stage
+
+
+def test_histogram_renders_cumulative_buckets():
+    registry = MetricsRegistry()
+    for value in (0.002, 0.02, 0.02, 100):
+        registry.observe("latency_seconds", value, "Latency", buckets=(0.01, 0.1), route="/x")
+    registry.inc("requests_total", route="/x")
+    registry.set("queue_depth", 3)
+
+    lines = registry.render().splitlines()
+    assert 'latency_seconds_bucket{route="/x",le="0.01"} 1' in lines
+    assert 'latency_seconds_bucket{route="/x",le="0.1"} 3' in lines
+    assert 'latency_seconds_bucket{route="/x",le="+Inf"} 4' in lines
+    assert 'latency_seconds_count{route="/x"} 4' in lines
+    assert 'requests_total{route="/x"} 1' in lines
+    assert "queue_depth 3" in lines
+
+
+def test_run_report_records_stages_rows_and_memory(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    n = 24 * 10
+    raw = pd.DataFrame({
+        "time": pd.date_range("2025-01-01", periods=n, freq="h"),
+        "pm2_5": np.random.default_rng(0).uniform(5, 50, n),
+        "pm10": np.random.default_rng(1).uniform(10, 90, n),
+    })
+
+    with RunReport("test") as report:
+        with stage("ingest", rows=len(raw)):
+            big = np.ones(2_000_000)   # ~16MB allocated inside the stage
+            del big
+        processed = dp.preprocess_data(raw)
+
+    names = [r["stage"] for r in report.stages]
+    assert names == ["ingest", "impute", "aqi", "outlier_capping", "features", "save"]
+    ingest = report.stages[0]
+    assert ingest["rows"] == n and ingest["peak_memory_mb"] >= 15
+    assert report.stages[-1]["rows"] == len(processed) < n
+    assert all(r["seconds"] >= 0 and "_peak" not in r for r in report.stages)
+
+    path = report.write(str(tmp_path / "reports"))
+    saved = json.load(open(path))
+    assert saved["totals"]["features"]["calls"] == 1
+    assert json.load(open(tmp_path / "reports" / "test_latest.json")) == saved
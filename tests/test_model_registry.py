@@ -0,0 +1,80 @@
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import joblib
+import numpy as np
+from sklearn.ensemble import RandomForestRegressor
+from sklearn.tree import DecisionTreeRegressor
+
+from src.model_registry import FlatForest, ModelRegistry
+
+
+def fit_forest(n_outputs=1, seed=0, n_estimators=20):
+    rng = np.random.default_rng(seed)
+    X = rng.uniform(0, 300, (500, 15))
+    y = X[:, :6] @ rng.uniform(0, 1, (6, n_outputs))
+    return RandomForestRegressor(n_estimators=n_estimators, max_depth=10, random_state=seed).fit(X, y.squeeze()), X
+
+
+def test_flat_forest_matches_sklearn():
+    model, X = fit_forest()
+    flat = FlatForest.from_estimator(model)
+    np.testing.assert_allclose(flat.predict(X[:50]), model.predict(X[:50]), rtol=1e-12)
+    np.testing.assert_allclose(flat.predict(X[:1]), model.predict(X[:1]), rtol=1e-12)
+
+
+def test_flat_forest_multi_output_and_single_tree():
+    model, X = fit_forest(n_outputs=3)
+    np.testing.assert_allclose(FlatForest.from_estimator(model).predict(X[:20]), model.predict(X[:20]), rtol=1e-12)
+
+    tree = DecisionTreeRegressor(max_depth=6).fit(X, X[:, 0])
+    np.testing.assert_allclose(FlatForest.from_estimator(tree).predict(X[:20]), tree.predict(X[:20]))
+
+
+def test_registry_loads_lazily_and_hot_reloads(tmp_path):
+    path = tmp_path / "model.pkl"
+    model, X = fit_forest()
+    joblib.dump(model, path)
+
+    registry = ModelRegistry(str(path), check_interval=0)
+    assert registry.stats()["loaded"] is False
+    first = registry.predict(X[:3])
+    version = registry.version
+
+    retrained, _ = fit_forest(seed=1)
+    joblib.dump(retrained, path)
+    os.utime(path, ns=(0, os.stat(path).st_mtime_ns + 10**9))
+
+    np.testing.assert_allclose(registry.predict(X[:3]), retrained.predict(X[:3]))
+    assert not np.allclose(first, retrained.predict(X[:3]))
+    assert registry.version != version
+    assert registry.stats()["reloads"] == 1
+
+
+def test_compiled_registry_memory_maps_flat_arrays(tmp_path):
+    path = tmp_path / "model.pkl"
+    model, X = fit_forest()
+    joblib.dump(model, path)
+
+    registry = ModelRegistry(str(path), compiled=True)
+    np.testing.assert_allclose(registry.predict(X[:5]), model.predict(X[:5]), rtol=1e-12)
+    assert isinstance(registry.get().threshold, np.memmap)
+    assert os.path.exists(str(path) + ".flat/VERSION")
+
+    # A second worker reuses the cached arrays instead of rebuilding them
+    mtime = os.stat(str(path) + ".flat/threshold.npy").st_mtime_ns
+    ModelRegistry(str(path), compiled=True).get()
+    assert os.stat(str(path) + ".flat/threshold.npy").st_mtime_ns == mtime
+
+
+def test_compiled_worker_skips_unpickling_until_estimator_is_needed(tmp_path):
+    path = tmp_path / "model.pkl"
+    model, X = fit_forest()
+    joblib.dump(model, path)
+    ModelRegistry(str(path), compiled=True).get()
+
+    worker = ModelRegistry(str(path), compiled=True)
+    worker.predict(X[:1])
+    assert worker._current[0] is None
+    assert worker.model.n_estimators == model.n_estimators
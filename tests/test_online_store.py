@@ -0,0 +1,74 @@
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import sqlite3
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.feature_store_update import update_feast_store
+from src.online_store import OnlineStore
+
+
+def make_features(location_id, start, n, aqi_start=50):
+    return pd.DataFrame({
+        "time": pd.date_range(start, periods=n, freq="h"),
+        "location_id": location_id,
+        "pm10": np.arange(n, dtype=float),
+        "pm2_5": np.arange(n, dtype=float) / 2,
+        "aqi": aqi_start + np.arange(n, dtype=float),
+    })
+
+
+def test_upsert_keeps_latest_row_per_location(tmp_path):
+    store = OnlineStore(str(tmp_path / "features.db"))
+    df = pd.concat([make_features("karachi", "2025-01-01", 24), make_features("lahore", "2025-01-01", 12, 100)])
+
+    assert store.upsert(df) == 2
+    result = store.get_online_features(["lahore", "karachi", "nowhere"], features=["aqi", "karachi_air_features:pm10"])
+    assert result["entity_key"] == ["lahore", "karachi", "nowhere"]
+    assert result["aqi"] == [111.0, 73.0, None]
+    assert result["pm10"] == [11.0, 23.0, None]
+    assert result["event_timestamp"][1] == "2025-01-01T23:00:00"
+    # Columns missing from the frame come back empty rather than failing
+    assert store.get_latest("karachi")["ozone"] is None
+
+
+def test_older_rows_do_not_overwrite_newer(tmp_path):
+    store = OnlineStore(str(tmp_path / "features.db"))
+    store.upsert(make_features("karachi", "2025-01-02", 1, aqi_start=80))
+    store.upsert(make_features("karachi", "2025-01-01", 1, aqi_start=10))
+    assert store.get_latest("karachi")["aqi"] == 80.0
+
+    store.upsert(make_features("karachi", "2025-01-03", 1, aqi_start=90))
+    assert store.get_latest("karachi")["aqi"] == 90.0
+
+
+def test_read_through_cache_sees_writes_from_other_connections(tmp_path):
+    path = str(tmp_path / "features.db")
+    reader = OnlineStore(path)
+    writer = OnlineStore(path)
+    writer.upsert(make_features("karachi", "2025-01-01", 1, aqi_start=40))
+
+    assert reader.get_latest("karachi")["aqi"] == 40.0
+    assert reader.get_latest("karachi")["aqi"] == 40.0
+    assert reader.stats()["hits"] == 1 and reader.stats()["misses"] == 1
+
+    writer.upsert(make_features("karachi", "2025-01-02", 1, aqi_start=60))
+    assert reader.get_latest("karachi")["aqi"] == 60.0
+    assert reader.to_array(["karachi", "nowhere"], ["aqi", "pm10"]).tolist()[0] == [60.0, 0.0]
+
+
+def test_update_feast_store_upserts_locally(tmp_path):
+    store = OnlineStore(str(tmp_path / "features.db"))
+    df = make_features("karachi", "2025-01-01", 5).drop(columns=["location_id"]).set_index("time")
+
+    with pytest.raises(ValueError):
+        update_feast_store(df, online_store=store, feast=False)
+    assert update_feast_store(df, "karachi", online_store=store, feast=False) == 1
+    assert update_feast_store(df.iloc[:0], "karachi", online_store=store, feast=False) == 0
+    assert store.get_latest("karachi")["aqi"] == 54.0
+    rows = sqlite3.connect(store.path).execute("SELECT COUNT(*) FROM karachi_air_features").fetchone()
+    assert rows == (1,)
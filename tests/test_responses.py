@@ -0,0 +1,94 @@
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import gzip
+
+import pytest
+
+import app as app_module
+from src.responses import IMMUTABLE, REVALIDATE, accepted_encodings, not_modified, precompressed_variant
+from tests.test_app import fake_history, small_model  # noqa: F401  (fixture)
+
+ASSET = b"console.log('aqi');\n" * 200
+
+
+@pytest.fixture
+def build(tmp_path, monkeypatch):
+    (tmp_path / "static" / "js").mkdir(parents=True)
+    (tmp_path / "static" / "js" / "main.abc123.js").write_bytes(ASSET)
+    (tmp_path / "index.html").write_text("<html>" + "<div></div>" * 200 + "</html>")
+    monkeypatch.setattr(app_module.app, "static_folder", str(tmp_path))
+    return tmp_path
+
+
+def test_precompressed_variants_and_validators(tmp_path):
+    path = tmp_path / "app.js"
+    path.write_bytes(ASSET)
+
+    assert accepted_encodings("gzip;q=1.0, br;q=0, identity") == {"gzip", "identity"}
+    assert accepted_encodings("gzip;q=abc, br;q=") == set()
+    variant, encoding = precompressed_variant(str(path), "gzip, deflate")
+    assert encoding == "gzip" and variant == str(path) + ".gz"
+    assert gzip.decompress((tmp_path / "app.js.gz").read_bytes()) == ASSET
+    assert precompressed_variant(str(path), None) == (str(path), None)
+
+    # A rebuilt file gets a fresh copy
+    os.utime(variant, (0, 0))
+    path.write_bytes(ASSET * 2)
+    precompressed_variant(str(path), "gzip")
+    assert gzip.decompress((tmp_path / "app.js.gz").read_bytes()) == ASSET * 2
+
+    assert not_modified('W/"abc", "def"', None, "abc", 1000)
+    assert not not_modified('"xyz"', "Thu, 01 Jan 1970 00:20:00 GMT", "abc", 1000)
+    assert not_modified(None, "Thu, 01 Jan 1970 00:20:00 GMT", "abc", 1000)
+
+
+def test_static_build_caching_and_404s(build):
+    client = app_module.app.test_client()
+
+    asset = client.get("/static/js/main.abc123.js", headers={"Accept-Encoding": "br, gzip"})
+    assert asset.headers["Content-Encoding"] == "gzip" and asset.headers["Cache-Control"] == IMMUTABLE
+    assert asset.mimetype in ("text/javascript", "application/javascript")
+    assert gzip.decompress(asset.get_data()) == ASSET
+    assert client.get("/static/js/main.abc123.js").get_data() == ASSET
+    malformed = client.get("/static/js/main.abc123.js", headers={"Accept-Encoding": "gzip;q=abc"})
+    assert malformed.status_code == 200 and malformed.get_data() == ASSET
+
+    index = client.get("/")
+    assert index.headers["Cache-Control"] == REVALIDATE
+    assert client.get("/dashboard").get_data() == index.get_data()
+    assert client.get("/forecast/nope").get_json() == {"error": "Not found"}
+    assert client.get("/static/js/main.old.js").status_code == 404
+
+
+def test_forecast_conditional_and_compact(build, monkeypatch, small_model):
+    calls = []
+    monkeypatch.setattr(app_module, "fetch_past_7_days_air_quality", lambda lat, lon: calls.append(lat) or fake_history())
+    app_module.forecast_cache.clear()
+    client = app_module.app.test_client()
+
+    first = client.get("/forecast?lat=33&lon=44")
+    etag = first.headers["ETag"]
+    assert first.headers["Cache-Control"] == REVALIDATE
+
+    # Unchanged body: 304 (recomputed here, since the ETag hashes the body rather than the cache hour)
+    app_module.forecast_cache.clear()
+    again = client.get("/forecast?lat=33&lon=44", headers={"If-None-Match": etag})
+    assert again.status_code == 304 and again.get_data() == b"" and len(calls) == 2
+    # A live body has no Last-Modified, so If-Modified-Since alone never yields a stale 304
+    assert "Last-Modified" not in first.headers
+    assert client.get("/forecast?lat=33&lon=44", headers={"If-Modified-Since": "Fri, 01 Jan 2100 00:00:00 GMT"}).status_code == 200
+
+    # A recomputed forecast with different data gets a new ETag
+    app_module.forecast_cache.clear()
+    monkeypatch.setattr(app_module, "fetch_past_7_days_air_quality",
+                        lambda lat, lon: {k: [v * 2 for v in vals] for k, vals in fake_history().items()})
+    changed = client.get("/forecast?lat=33&lon=44", headers={"If-None-Match": etag})
+    assert changed.status_code == 200 and changed.headers["ETag"] != etag
+
+    compact = client.get("/forecast?lat=33&lon=44&compact=1")
+    assert "pollutants_history" not in compact.get_json() and compact.headers["ETag"] != etag
+    assert compact.get_json()["predictions"] == changed.get_json()["predictions"]
+    monkeypatch.setattr(app_module, "FORECAST_COMPACT", True)
+    assert "pollutants_history" in client.get("/forecast?lat=33&lon=44&history=1").get_json()
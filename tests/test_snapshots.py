@@ -0,0 +1,101 @@
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import time
+
+import app as app_module
+from src.snapshots import SnapshotRefresher, SnapshotStore
+from tests.test_app import fake_history, small_model  # noqa: F401  (fixture)
+
+KARACHI = {"location_id": "karachi", "lat": 24.8607, "lon": 67.0011}
+
+
+def test_store_round_trip_and_max_age(tmp_path):
+    store = SnapshotStore(str(tmp_path / "online" / "snapshots.db"))
+    # Nothing is created until the store is used (app.py builds one at import)
+    assert store.get("karachi") is None and store.stats()["locations"] == 0
+    assert not (tmp_path / "online").exists()
+    assert os.path.isabs(app_module.snapshot_store.path)
+    store.put("karachi", [{"pm10": [1.0]}, {"pm10": 1.0}, [], {"engine": "legacy"}], as_of=1000.0)
+
+    assert store.get("karachi", max_age=60, now=1030.0) == (1000.0, [{"pm10": [1.0]}, {"pm10": 1.0}, [], {"engine": "legacy"}])
+    assert store.get("karachi", max_age=60, now=1100.0) is None
+    assert store.get("lahore") is None
+    # Another process's writes are picked up despite the read cache
+    SnapshotStore(str(tmp_path / "online" / "snapshots.db")).put("karachi", [{}, {}, [], {}], as_of=1050.0)
+    assert store.get("karachi", max_age=60, now=1100.0)[0] == 1050.0
+
+
+def test_refresher_keeps_old_snapshot_when_a_location_fails(tmp_path):
+    store = SnapshotStore(str(tmp_path / "snapshots.db"))
+    store.put("lahore", ["old"], as_of=time.time())
+
+    def compute(location):
+        if location["location_id"] == "lahore":
+            raise RuntimeError("upstream down")
+        return ["new"]
+
+    refresher = SnapshotRefresher(compute, [KARACHI, {"location_id": "lahore"}], store, interval=60, jitter=0.1)
+    assert refresher.refresh_once() == 1
+    assert store.get("karachi")[1] == ["new"] and store.get("lahore")[1] == ["old"]
+    assert refresher.stats()["failures"] == 1
+    assert all(54 <= refresher.next_delay() <= 66 for _ in range(100))
+
+
+def test_forecast_serves_snapshot_for_configured_locations(tmp_path, monkeypatch, small_model):
+    calls = []
+    monkeypatch.setattr(app_module, "fetch_past_7_days_air_quality", lambda lat, lon: calls.append(lat) or fake_history())
+    store = SnapshotStore(str(tmp_path / "snapshots.db"))
+    monkeypatch.setattr(app_module, "snapshot_store", store)
+    monkeypatch.setattr(app_module, "LOCATIONS", [KARACHI])
+    app_module.forecast_cache.clear()
+
+    refresher = SnapshotRefresher(app_module.snapshot_refresher.compute, [KARACHI], store)
+    assert refresher.refresh_once() == 1
+    client = app_module.app.test_client()
+
+    data = client.get("/forecast?lat=24.8607&lon=67.0011").get_json()
+    assert "as_of" in data and data["pollutants_history"] == fake_history()
+    assert len(data["predictions"]) == 3
+    assert len(calls) == 1   # only the refresher computed
+
+    # Ad-hoc coordinates are computed live, without as_of
+    live = client.get("/forecast?lat=10&lon=10").get_json()
+    assert "as_of" not in live
+    assert set(live) == set(data) - {"as_of"}
+    assert len(calls) == 2
+
+
+
+def test_upstream_outage_keeps_previous_snapshot(tmp_path, monkeypatch, small_model):
+    store = SnapshotStore(str(tmp_path / "snapshots.db"))
+    real_fetch = app_module.fetch_past_7_days_air_quality
+    monkeypatch.setattr(app_module, "fetch_past_7_days_air_quality", lambda lat, lon: fake_history())
+    refresher = SnapshotRefresher(app_module.snapshot_refresher.compute, [KARACHI], store)
+    assert refresher.refresh_once() == 1
+    before = store.get("karachi")
+
+    # Every provider failing must not overwrite the good snapshot with the zero fallback
+    monkeypatch.setattr(app_module, "fetch_past_7_days_air_quality", real_fetch)
+    monkeypatch.setattr(app_module.upstream, "fetch", lambda *args: None)
+    assert refresher.refresh_once() == 0
+    assert store.get("karachi") == before and refresher.stats()["failures"] == 1
+
+
+def test_batch_takes_the_same_path_as_forecast(tmp_path, monkeypatch, small_model):
+    calls = []
+    monkeypatch.setattr(app_module, "fetch_past_7_days_air_quality", lambda lat, lon: calls.append(lat) or fake_history())
+    store = SnapshotStore(str(tmp_path / "snapshots.db"))
+    monkeypatch.setattr(app_module, "snapshot_store", store)
+    monkeypatch.setattr(app_module, "LOCATIONS", [KARACHI])
+    app_module.forecast_cache.clear()
+    SnapshotRefresher(app_module.snapshot_refresher.compute, [KARACHI], store).refresh_once()
+    client = app_module.app.test_client()
+
+    live = client.get("/forecast?lat=10&lon=10").get_json()
+    locations = [{"city": "Karachi", "lat": 24.87, "lon": 67.01}, {"lat": 10.01, "lon": 10.02}]
+    karachi, grid = client.post("/forecast/batch", json={"locations": locations}).get_json()["results"]
+    # The configured location is served from its snapshot, the grid tile from the entry /forecast cached
+    assert karachi == client.get("/forecast?lat=24.8607&lon=67.0011").get_json()
+    assert grid["predictions"] == live["predictions"] and len(calls) == 2
@@ -0,0 +1,65 @@
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import numpy as np
+import pytest
+
+import app as app_module
+from src.spatial import SpatialIndex, blend, grid_neighbors, haversine_km, idw_weights, snap
+from tests.test_app import fake_history, small_model  # noqa: F401  (fixture)
+
+KARACHI = {"location_id": "karachi", "lat": 24.8607, "lon": 67.0011}
+
+
+def test_locate_snaps_to_station_or_grid():
+    index = SpatialIndex([KARACHI], grid=0.1, radius_km=5)
+
+    near = index.locate(24.88, 67.02)
+    assert (near.lat, near.lon, near.location_id) == (24.8607, 67.0011, "karachi")
+    assert near.point == (24.88, 67.02)
+    far = index.locate(25.123, 67.456)
+    assert (far.lat, far.lon, far.location_id) == (25.15, 67.45, None)
+    assert index.locate(1, 2, location_id="lahore").location_id == "lahore"
+    assert haversine_km(24.88, 67.02, 24.8607, 67.0011) < 5
+
+    # 10k map requests over a 1° box share 100 tiles instead of ~10k rounded keys
+    rng = np.random.default_rng(0)
+    points = rng.uniform([30, 70], [31, 71], (10_000, 2))
+    assert len({snap(lat, lon, 0.1) for lat, lon in points}) == 100
+    assert len(set(grid_neighbors(30.05, 70.05, 0.1))) == 8
+
+
+def test_idw_blends_numbers_and_keeps_structure():
+    weights = idw_weights((0, 0.5), [(0, 0), (0, 1)])
+    assert weights == pytest.approx([0.5, 0.5])
+    assert idw_weights((0, 0), [(0, 0), (0, 1)]) == pytest.approx([1, 0])
+    a = {"pm10": [10, 20], "day": [{"day": "Day 1", "predicted_AQI": 100}]}
+    b = {"pm10": [30, 40], "day": [{"day": "Day 1", "predicted_AQI": 200}]}
+    assert blend([a, b], np.array([0.75, 0.25])) == {"pm10": [15.0, 25.0], "day": [{"day": "Day 1", "predicted_AQI": 125.0}]}
+
+
+def test_forecast_interpolates_between_cached_tiles(monkeypatch, small_model):
+    calls = []
+    monkeypatch.setattr(app_module, "fetch_past_7_days_air_quality", lambda lat, lon: calls.append((lat, lon)) or fake_history())
+    monkeypatch.setattr(app_module, "LOCATIONS", [])
+    app_module.forecast_cache.clear()
+    client = app_module.app.test_client()
+
+    # Requests within one 0.1° cell share a single computation at its centre
+    client.get("/forecast?lat=40.01&lon=50.01")
+    client.get("/forecast?lat=40.09&lon=50.09")
+    assert calls == [(40.05, 50.05)]
+
+    for lat, lon in [(40.05, 50.15), (40.15, 50.05), (40.25, 50.25)]:
+        client.get(f"/forecast?lat={lat}&lon={lon}")
+    assert len(calls) == 4
+
+    # The cell centred on (40.15, 50.15) has those 4 cells as cached neighbours, so it is interpolated
+    data = client.get("/forecast?lat=40.12&lon=50.11").get_json()
+    assert len(calls) == 4
+    assert data["engine"] == "interpolated" and len(data["interpolated_from"]) == 4
+    assert data["predictions"][0]["day"] == "Day 1"
+    computed = client.get("/forecast?lat=40.05&lon=50.05").get_json()
+    assert data["pollutants"] == computed["pollutants"]   # identical neighbours blend to the same values
+    assert app_module.forecast_cache.peek(app_module.cache_key(40.15, 50.15) + (None,)) is None
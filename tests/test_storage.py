@@ -0,0 +1,55 @@
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import numpy as np
+import pandas as pd
+
+from src.storage import read_partitioned, upsert_partitioned, write_partitioned
+
+
+def hourly(start, periods, value=1.0):
+    return pd.DataFrame({
+        "time": pd.date_range(start, periods=periods, freq="h"),
+        "pm2_5": value,
+        "ozone": np.arange(periods, dtype=float),
+    })
+
+
+def test_round_trip_is_partitioned_and_typed(tmp_path):
+    root = str(tmp_path / "store")
+    df = hourly("2025-01-30", 24 * 5)
+    write_partitioned(df, root, "Karachi")
+
+    assert sorted(os.listdir(tmp_path / "store" / "karachi" / "2025")) == ["1", "2"]
+    out = read_partitioned(root, city="Karachi")
+    pd.testing.assert_frame_equal(out, df, check_dtype=False)
+    assert pd.api.types.is_datetime64_any_dtype(out["time"])
+
+
+def test_column_and_date_range_pushdown(tmp_path):
+    root = str(tmp_path / "store")
+    write_partitioned(hourly("2025-01-01", 24 * 90), root, "Karachi")
+    write_partitioned(hourly("2025-01-01", 24 * 90, value=9.0), root, "Lahore")
+
+    out = read_partitioned(root, columns=["pm2_5"], start="2025-02-10", end="2025-02-10 23:00", city="Lahore")
+    assert list(out.columns) == ["time", "pm2_5"]
+    assert len(out) == 24
+    assert (out["pm2_5"] == 9.0).all()
+    assert read_partitioned(root, start="2026-01-01", city="Karachi") is None
+
+
+def test_upsert_only_rewrites_touched_partitions(tmp_path):
+    root = str(tmp_path / "store")
+    write_partitioned(hourly("2025-01-01", 24 * 60), root, "Karachi")
+    january = tmp_path / "store" / "karachi" / "2025" / "1" / "part-0.parquet"
+    mtime = january.stat().st_mtime_ns
+
+    upsert_partitioned(hourly("2025-03-01", 48, value=5.0), root, "Karachi")
+
+    out = read_partitioned(root, city="Karachi")
+    assert out["time"].is_unique
+    assert len(out) == 24 * 60 + 24  # 2025-03-02 is new, 2025-03-01 overlapped
+    assert (out.loc[out["time"] >= "2025-03-01", "pm2_5"] == 5.0).all()
+    assert (out.loc[out["time"] < "2025-03-01", "pm2_5"] == 1.0).all()
+    assert january.stat().st_mtime_ns == mtime
@@ -0,0 +1,77 @@
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from src import data_preprocessing as dp
+from src.storage import read_partitioned, write_partitioned
+from src.streaming_preprocessing import ExactQuantiles, preprocess_data_streaming, raw_store_chunks
+from src.transform import Transform
+
+
+def make_raw(n=3000, seed=0):
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({
+        "time": pd.date_range("2024-12-20", periods=n, freq="h"),
+        "pm2_5": rng.gamma(2, 20, n),
+        "pm10": rng.gamma(2, 40, n),
+        "carbon_monoxide": rng.gamma(2, 500, n),
+        "nitrogen_dioxide": rng.gamma(2, 15, n),
+        "sulphur_dioxide": rng.gamma(2, 10, n),
+        "ozone": rng.gamma(2, 30, n),
+        "temperature_2m": rng.normal(25, 5, n),
+        "relative_humidity_2m": rng.uniform(10, 90, n),
+    })
+    # Leading gaps (back-filled), scattered gaps (forward-filled) and repeated values (quantile ties)
+    df.loc[:40, "ozone"] = np.nan
+    df.loc[rng.choice(n, n // 10, replace=False), "pm2_5"] = np.nan
+    df.loc[500:900, "sulphur_dioxide"] = 12.5
+    return df
+
+
+@pytest.mark.parametrize("chunk_rows", [97, 1000])
+def test_streaming_matches_in_memory(tmp_path, monkeypatch, chunk_rows):
+    monkeypatch.chdir(tmp_path)
+    raw = make_raw()
+    write_partitioned(raw, dp.RAW_STORE_DIR, "Karachi")
+
+    in_memory = dp.preprocess_data(read_partitioned(dp.RAW_STORE_DIR, city="Karachi"), compact=False)
+    expected = read_partitioned(dp.PROCESSED_STORE, city="Karachi")
+    assert list(expected.columns) == ["time"] + list(in_memory.columns) + ["location_id"]
+    expected_transform = Transform.load(dp.TRANSFORM_PATH)
+    expected_scaled = dp.load_scaled()
+
+    rows = preprocess_data_streaming(raw_store_chunks(chunk_rows=chunk_rows))
+    result = read_partitioned(dp.PROCESSED_STORE, city="Karachi")
+
+    assert rows == len(expected)
+    # Rolling means keep a running sum, so chunk boundaries only change float noise
+    pd.testing.assert_frame_equal(result, expected, rtol=1e-12)
+    # partial_fit accumulates mean/variance incrementally, so only float noise may differ
+    transform = Transform.load(dp.TRANSFORM_PATH)
+    assert transform.columns == expected_transform.columns
+    np.testing.assert_allclose(transform.mean, expected_transform.mean, rtol=1e-9)
+    np.testing.assert_allclose(transform.scale, expected_transform.scale, rtol=1e-9)
+    pd.testing.assert_frame_equal(dp.load_scaled(), expected_scaled, rtol=1e-9)
+
+
+def test_exact_quantiles_match_pandas():
+    rng = np.random.default_rng(1)
+    values = np.concatenate([rng.normal(0, 1, 20_000), np.full(5_000, 0.25), [np.nan] * 10])
+    rng.shuffle(values)
+    chunks = np.array_split(values, 13)
+
+    quantiles = ExactQuantiles(["x"], bins=16, max_candidates=100)
+    while not quantiles.done:
+        quantiles.begin_pass()
+        for chunk in chunks:
+            quantiles.update("x", chunk)
+        quantiles.end_pass()
+
+    series = pd.Series(values)
+    for q in (0.25, 0.75):
+        assert quantiles.result("x", q) == series.quantile(q)
+    assert quantiles.passes > 2
@@ -0,0 +1,99 @@
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import json
+
+import joblib
+import numpy as np
+import pytest
+from sklearn.model_selection import TimeSeriesSplit
+
+from src import data_preprocessing as dp
+from src import forecasting, training
+from src.metrics import RunReport
+from src.transform import Transform
+from tests.test_forecasting import recent_raw
+
+HORIZONS = [1, 6, 24]
+
+
+def test_walk_forward_folds_leave_a_horizon_gap():
+    for train_idx, test_idx in TimeSeriesSplit(n_splits=3, gap=24).split(np.zeros(200)):
+        assert test_idx[0] - train_idx[-1] == 25
+
+
+def test_train_versions_and_warm_starts(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    raw = recent_raw(24 * 20)
+    dp.preprocess_data(raw.iloc[:24 * 15])
+    path = str(tmp_path / "models" / "forecaster.pkl")
+    kwargs = dict(path=path, horizons=HORIZONS, n_folds=3, initial_trees=5, trees_per_run=3, max_trees=10, n_jobs=2)
+
+    with RunReport("train", trace_memory=False) as report:
+        first = training.train_location("karachi", **kwargs)
+    assert first["mode"] == "full" and first["version"] == 1 and first["n_estimators"] == 5
+    assert [f["fold"] for f in first["cv"]["folds"]] == [0, 1, 2]
+    assert {"mae", "rmse", "mae_24h"} <= set(first["cv"]["mean"])
+    assert Transform.load(first["transform"]) == Transform.load(dp.TRANSFORM_PATH)
+    assert {"train_prepare", "train_cv", "train_fit", "train_save"} <= {s["stage"] for s in report.stages}
+    assert forecasting.load_meta(path) == first
+
+    # Nothing new since the last run: keep the model
+    assert training.train_location("karachi", **kwargs) is None
+
+    # New hours with the same scaling (as incremental runs leave it): only new trees are fitted
+    with open(dp.TRANSFORM_PATH) as f:
+        kept = f.read()
+    dp.preprocess_data(raw)
+    with open(dp.TRANSFORM_PATH, "w") as f:
+        f.write(kept)
+    second = training.train_location("karachi", **kwargs)
+    assert second["mode"] == "warm_start" and second["version"] == 2
+    assert second["n_estimators"] == 8 and second["fit_rows"] < second["rows"]
+    # No CV of forests that are never served; the extended model is scored on the hours it had not seen
+    assert second["cv"] is None and second["holdout"]["model_version"] == 1
+    assert second["holdout"]["rows"] == second["fit_rows"] and "mae_24h" in second["holdout"]
+    assert joblib.load(path).n_estimators == 8
+    assert os.path.exists(training.versioned_path(path, 1)) and os.path.exists(training.versioned_path(path, 2))
+
+    # A refitted transform means the old trees no longer match: rebuild from scratch
+    first_transform = Transform.load(first["transform"])
+    dp.preprocess_data(raw)
+    third = training.train_location("karachi", **kwargs, keep_versions=2)
+    assert third["mode"] == "full" and third["n_estimators"] == 5 and third["cv"]["folds"]
+    # Earlier versions keep the scaling they were trained with
+    assert first_transform != Transform.load(dp.TRANSFORM_PATH)
+    assert Transform.load(third["transform"]) == Transform.load(dp.TRANSFORM_PATH)
+    # Only the newest versions are kept
+    assert not any(os.path.exists(f) for f in training.version_files(path, 1))
+    assert all(os.path.exists(f) for v in (2, 3) for f in training.version_files(path, v))
+
+    log = [json.loads(line) for line in open(tmp_path / "models" / "training_log.jsonl")]
+    assert [entry["version"] for entry in log] == [1, 2, 3]
+    assert all(entry["total_seconds"] > 0 for entry in log)
+
+
+def test_train_pools_every_location(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    raw = recent_raw(24 * 15)
+    dp.preprocess_data(raw, city="karachi")
+    dp.preprocess_data(raw.assign(pm2_5=raw["pm2_5"] * 2), city="lahore")
+    path = str(tmp_path / "models" / "forecaster.pkl")
+    kwargs = dict(path=path, horizons=HORIZONS, n_folds=3, initial_trees=5, n_jobs=2)
+
+    single = training.train_location("karachi", **kwargs)
+    pooled = training.train_locations(["karachi", "lahore", "nowhere"], **kwargs)
+    assert single["locations"] == ["karachi"] and pooled["locations"] == ["karachi", "lahore"]
+    assert pooled["rows"] == 2 * single["rows"]
+    # Each location's transform only fits its own history, so the shared model is trained unscaled
+    assert pooled["transform"] is None and pooled["mode"] == "full"
+    with pytest.raises(ValueError):
+        training.train_locations(["nowhere", "elsewhere"], **kwargs)
+
+
+def test_train_needs_enough_history(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    processed = dp.preprocess_data(recent_raw(24 * 3))
+    with pytest.raises(ValueError):
+        training.train(processed, path=str(tmp_path / "f.pkl"), n_folds=4)
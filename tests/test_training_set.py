@@ -0,0 +1,64 @@
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import numpy as np
+import pandas as pd
+
+from src.storage import write_partitioned
+from src.training_set import build_training_set
+
+
+def write_history(root, location, start, n):
+    df = pd.DataFrame({
+        "time": pd.date_range(start, periods=n, freq="h"),
+        "location_id": location,
+        "aqi": np.arange(n, dtype=float),
+        "pm10": np.arange(n, dtype=float) * 2,
+    })
+    write_partitioned(df, root, location)
+    return df
+
+
+def test_asof_join_is_point_in_time_correct(tmp_path):
+    root = str(tmp_path / "store")
+    write_history(root, "karachi", "2025-01-30", 72)   # spans a month boundary
+    write_history(root, "lahore", "2025-01-01", 24)
+
+    entity_df = pd.DataFrame({
+        "location_id": ["lahore", "karachi", "karachi", "karachi", "lahore", "quetta"],
+        "event_timestamp": pd.to_datetime([
+            "2025-01-01 05:30", "2025-02-01 00:00", "2025-01-29 23:00",
+            "2025-02-08 22:00", "2025-01-20 00:00", "2025-01-01 00:00",
+        ]),
+        "label": [1, 2, 3, 4, 5, 6],
+    }, index=list("abcdef"))
+
+    out = build_training_set(entity_df, features=["aqi"], store_dir=root)
+
+    assert list(out.index) == list("abcdef")
+    assert out["label"].tolist() == [1, 2, 3, 4, 5, 6]
+    # 05:30 sees the 05:00 row, never the 06:00 one
+    assert out.loc["a", "aqi"] == 5.0
+    assert out.loc["b", "aqi"] == 48.0
+    # Before the first feature row, beyond the 7-day TTL, or no history at all -> NaN
+    assert np.isnan(out.loc["c", "aqi"])
+    assert out.loc["d", "aqi"] == 71.0
+    assert np.isnan(out.loc["e", "aqi"])
+    assert np.isnan(out.loc["f", "aqi"])
+    assert "pm10" not in out.columns
+    assert out.loc["b", "feature_timestamp"] == pd.Timestamp("2025-02-01 00:00")
+
+
+def test_ttl_expires_stale_features(tmp_path):
+    root = str(tmp_path / "store")
+    write_history(root, "karachi", "2025-01-01", 24)
+    entity_df = pd.DataFrame({
+        "location_id": ["karachi", "karachi"],
+        "event_timestamp": ["2025-01-08 23:00", "2025-01-09 00:00"],
+    })
+
+    out = build_training_set(entity_df, store_dir=root)
+    assert out["aqi"].tolist()[0] == 23.0
+    assert np.isnan(out["aqi"].tolist()[1])
+    assert {"aqi", "pm10", "feature_timestamp"} <= set(out.columns)
@@ -0,0 +1,36 @@
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import numpy as np
+import pandas as pd
+from sklearn.preprocessing import StandardScaler
+
+from src.transform import Transform
+
+
+def test_transform_matches_standard_scaler_and_round_trips(tmp_path):
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame({
+        "time": pd.date_range("2025-01-01", periods=50, freq="h"),
+        "aqi": rng.uniform(0, 300, 50),
+        "pm10": rng.uniform(0, 200, 50),
+        "flat": np.full(50, 3.0),
+        "hour": np.arange(50, dtype=np.int64) % 24,
+        "dominant_pollutant": "pm10",
+    })
+    transform = Transform.fit(df)
+    assert transform.columns == ["aqi", "pm10", "flat", "hour"]
+
+    path = transform.save(str(tmp_path / "transform.json"))
+    loaded = Transform.load(path)
+    expected = StandardScaler().fit_transform(df[transform.columns])
+    scaled = loaded.apply(df)
+    np.testing.assert_allclose(scaled[transform.columns].to_numpy(), expected)
+    assert scaled["dominant_pollutant"].tolist() == df["dominant_pollutant"].tolist()
+    assert (scaled["flat"] == 0).all()
+
+    # Arrays in another column order; unknown columns pass through
+    X = df[["pm10", "aqi"]].to_numpy()
+    np.testing.assert_allclose(loaded.transform_array(X, ["pm10", "aqi"]), expected[:, [1, 0]])
+    assert loaded.transform_array([[7.0]], ["unknown"]).tolist() == [[7.0]]
@@ -0,0 +1,87 @@
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import time
+from datetime import date, timedelta
+
+import pytest
+
+from benchmarks.upstream_stub import StubUpstream
+from src.upstream import CircuitBreaker, HedgedFetcher, open_meteo_provider, openaq_provider
+
+END = date(2025, 1, 8)
+START = END - timedelta(days=7)
+
+
+@pytest.fixture
+def stub():
+    with StubUpstream() as server:
+        yield server
+
+
+def make_fetcher(stub, hedge_after=0.2, timeout=2):
+    return HedgedFetcher(
+        [open_meteo_provider(stub.open_meteo_url, timeout), openaq_provider(stub.openaq_url, timeout)],
+        hedge_after=hedge_after,
+    )
+
+
+def test_primary_answers(stub):
+    result = make_fetcher(stub).fetch(24.86, 67.0, START, END)
+    assert result["pm2_5"] == [40.0] * 7
+    assert stub.calls["/v3/measurements"] == 0
+
+
+def test_failed_primary_falls_back_immediately(stub):
+    stub.routes["/v1/air-quality"]["status"] = 500
+    start = time.perf_counter()
+    result = make_fetcher(stub, hedge_after=5).fetch(24.86, 67.0, START, END)
+    assert result["pm2_5"] == [25.0] * 7
+    assert time.perf_counter() - start < 1
+
+
+def test_slow_primary_is_hedged(stub):
+    stub.routes["/v1/air-quality"]["delay"] = 1.5
+    start = time.perf_counter()
+    result = make_fetcher(stub, hedge_after=0.1).fetch(24.86, 67.0, START, END)
+    elapsed = time.perf_counter() - start
+    assert result["pm2_5"] == [25.0] * 7
+    assert elapsed < 1.0
+
+
+def test_open_breaker_skips_provider(stub):
+    stub.routes["/v1/air-quality"]["status"] = 503
+    fetcher = make_fetcher(stub)
+    for _ in range(3):
+        fetcher.fetch(24.86, 67.0, START, END)
+    assert fetcher.stats()["open-meteo"]["breaker"] == "open"
+
+    fetcher.fetch(24.86, 67.0, START, END)
+    assert stub.calls["/v1/air-quality"] == 3
+    assert stub.calls["/v3/measurements"] == 4
+
+
+def test_all_providers_down(stub):
+    for route in stub.routes.values():
+        route["status"] = 500
+    assert make_fetcher(stub).fetch(24.86, 67.0, START, END) is None
+
+
+def test_breaker_half_open_probe():
+    now = [0.0]
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=10, clock=lambda: now[0])
+    breaker.record_failure()
+    breaker.record_failure()
+    assert not breaker.allow()
+
+    now[0] = 10
+    assert breaker.allow()
+    assert not breaker.allow()  # only one probe at a time
+    breaker.record_failure()
+    assert breaker.state == "open"
+
+    now[0] = 20
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == "closed"